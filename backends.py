@@ -0,0 +1,498 @@
+import csv
+import functools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import metrics
+from db_pool import ConnectionPool
+from sql_results import DEFAULT_COUNT_LIMIT, DEFAULT_MAX_ROWS, build_envelope, error_envelope, iter_cursor_rows
+
+logger = logging.getLogger("txt2sql.backends")
+
+
+# ============================================================
+# EXECUTION BACKENDS
+# ============================================================
+# The executor runs SQL through an ExecutionBackend:
+#
+#   MySQLBackend          the production database, through the pool
+#   SQLiteReplicaBackend  an in-process copy of the 8 tables from data.py,
+#                         bulk-loaded from MySQL or from CSV/Parquet exports
+#                         and refreshed table by table when the source changes
+#
+# The generator always writes MySQL; other backends transpile it (sqlglot)
+# to their own dialect before running it.
+
+DEFAULT_REPLICA_PATH = os.path.join(".cache", "replica.sqlite3")
+
+
+class ExecutionBackend:
+    name = ""
+    dialect = "mysql"
+
+    def execute(self, sql_query: str, max_rows: int = DEFAULT_MAX_ROWS,
+                count_limit: int = DEFAULT_COUNT_LIMIT, timeout_s: float = 0.0,
+                profile_limit: int = 0) -> dict:
+        """Result envelope (sql_results.build_envelope); errors become error envelopes."""
+        raise NotImplementedError
+
+    def explain(self, sql_query: str) -> list[dict] | None:
+        """MySQL-style EXPLAIN rows for the cost guard, or None if unavailable."""
+        return None
+
+    def stream(self, sql_query: str, batch_size: int = 500):
+        """Generator over every row of the query."""
+        raise NotImplementedError
+
+    def table_versions(self, tables: list[str]) -> dict:
+        """{table: version} that changes when the table's data changes; missing or None if unknown."""
+        return {}
+
+    def stats(self) -> dict:
+        return {}
+
+
+# ------------------------------------------------------------
+# MySQL
+# ------------------------------------------------------------
+class MySQLBackend(ExecutionBackend):
+    name = "mysql"
+    dialect = "mysql"
+
+    def __init__(self, pool: ConnectionPool, connection_factory=None):
+        self.pool = pool
+        # Opens the side connection used for KILL QUERY on timeouts.
+        self.connection_factory = connection_factory or pool.factory
+
+    def kill_query(self, conn):
+        """KILL QUERY for the statement running on conn, sent from a separate connection."""
+        thread_id = getattr(conn, "connection_id", None)
+        if thread_id is None:
+            return
+        try:
+            killer = self.connection_factory()
+            try:
+                cursor = killer.cursor()
+                cursor.execute(f"KILL QUERY {int(thread_id)}")
+                cursor.close()
+            finally:
+                killer.close()
+        except Exception as e:
+            logger.warning("Could not cancel query on connection %s: %s", thread_id, e)
+
+    def execute(self, sql_query: str, max_rows: int = DEFAULT_MAX_ROWS,
+                count_limit: int = DEFAULT_COUNT_LIMIT, timeout_s: float = 0.0,
+                profile_limit: int = 0) -> dict:
+        """
+        Runs the query on an unbuffered cursor. SELECTs get a
+        MAX_EXECUTION_TIME hint of timeout_s; if the statement is still
+        running a second later it is killed from the client and the
+        connection dropped.
+        """
+        from mysql.connector import FieldType, ProgrammingError
+        from sql_guard import add_time_limit_hint
+
+        try:
+            conn = self.pool.acquire()
+        except Exception as e:
+            return error_envelope(e)
+
+        discard = False
+        killer = None
+        killed = threading.Event()
+        if timeout_s > 0:
+            sql_query = add_time_limit_hint(sql_query, int(timeout_s * 1000))
+
+            def cancel():
+                killed.set()
+                self.kill_query(conn)
+
+            killer = threading.Timer(timeout_s + 1.0, cancel)
+            killer.daemon = True
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            if killer is not None:
+                killer.start()
+            cursor.execute(sql_query)
+            envelope = build_envelope(cursor, max_rows, count_limit, FieldType.get_info,
+                                      profile_limit=profile_limit)
+            if envelope["row_count_exact"]:
+                cursor.close()
+            else:
+                # Rows past count_limit are still on the wire; dropping the
+                # connection is cheaper than draining them.
+                discard = True
+            return envelope
+        except Exception as e:
+            # Server-side SQL errors leave the connection usable; anything
+            # else (lost connection, client errors) gets it dropped.
+            discard = not (isinstance(e, ProgrammingError) and e.errno is not None)
+            if killed.is_set():
+                metrics.increment("sql_statements_killed")
+                return error_envelope(TimeoutError(f"Query cancelled after {timeout_s:g}s: {e}"))
+            return error_envelope(e)
+        finally:
+            if killer is not None:
+                killer.cancel()
+            # A kill that fired may have landed after the statement ended.
+            discard = discard or killed.is_set()
+            self.pool.release(conn, discard=discard)
+
+    def explain(self, sql_query: str) -> list[dict] | None:
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute(f"EXPLAIN {sql_query}")
+                    return cursor.fetchall()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logger.debug("EXPLAIN failed: %s", e)
+            return None
+
+    def stream(self, sql_query: str, batch_size: int = 500):
+        """The pooled connection is held until the generator is exhausted or closed."""
+        conn = self.pool.acquire()
+        finished = False
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(sql_query)
+            yield from iter_cursor_rows(cursor, batch_size)
+            cursor.close()
+            finished = True
+        finally:
+            # Abandoned mid-stream (or failed): unread rows make the connection unusable.
+            self.pool.release(conn, discard=not finished)
+
+    def table_versions(self, tables: list[str]) -> dict:
+        """
+        information_schema UPDATE_TIME per table, read with the session's
+        statistics cache disabled (MySQL 8 otherwise serves values up to
+        information_schema_stats_expiry, 24h by default, old). InnoDB keeps
+        UPDATE_TIME in memory only, so it is NULL after a restart until the
+        next write; those tables have no version (None).
+        """
+        from mysql.connector import ProgrammingError
+
+        if not tables:
+            return {}
+        placeholders = ", ".join(["%s"] * len(tables))
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    try:
+                        cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+                    except ProgrammingError as e:
+                        # 1193: unknown variable, MySQL 5.7 has no statistics cache.
+                        if e.errno != 1193:
+                            raise
+                    cursor.execute(
+                        "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES "
+                        f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})",
+                        list(tables),
+                    )
+                    return {name.lower(): str(updated) if updated is not None else None
+                            for name, updated in cursor.fetchall()}
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logger.debug("Table versions unavailable: %s", e)
+            return {}
+
+    def stats(self) -> dict:
+        return self.pool.stats()
+
+
+# ------------------------------------------------------------
+# Local SQLite replica
+# ------------------------------------------------------------
+@functools.lru_cache(maxsize=1024)
+def transpile(sql_query: str, dialect: str) -> str:
+    """MySQL SQL in the target dialect; unchanged if sqlglot cannot handle it."""
+    import sqlglot
+    from sqlglot.errors import ParseError, TokenError
+
+    try:
+        statements = sqlglot.transpile(sql_query, read="mysql", write=dialect)
+    except (ParseError, TokenError) as e:
+        logger.debug("Could not transpile to %s: %s", dialect, e)
+        return sql_query
+    return ";\n".join(statements)
+
+
+def _column_type(mysql_type: str) -> str:
+    """SQLite column type for a data.py column type. Text compares case-insensitively, like MySQL."""
+    kind = mysql_type.upper()
+    if re.match(r"(TINY|SMALL|MEDIUM|BIG)?INT|DEC|NUMERIC|FLOAT|DOUBLE|REAL", kind):
+        return "NUMERIC COLLATE NOCASE"
+    return "TEXT COLLATE NOCASE"
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _row_dict(cursor, row):
+    return {d[0]: value for d, value in zip(cursor.description, row)}
+
+
+class SQLiteReplicaBackend(ExecutionBackend):
+    """
+    The tables of table_metadata (default: data.py) in a local SQLite file.
+
+    Each load writes the new rows into a staging table and swaps it in with
+    one transaction, so queries keep reading the previous copy until then.
+    _replica_meta records where every table came from and its source
+    version (MySQL CHECKSUM TABLE, or file size and mtime); incremental
+    loads skip tables whose version did not change.
+    """
+
+    name = "sqlite"
+    dialect = "sqlite"
+
+    def __init__(self, path: str = DEFAULT_REPLICA_PATH, table_metadata: list | None = None):
+        if table_metadata is None:
+            from schema_registry import get_registry
+            table_metadata = get_registry().tables
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        else:
+            # One shared in-memory database for every thread.
+            path = "file:replica_%x?mode=memory&cache=shared" % id(self)
+        self.path = path
+        self.tables = {m["table_name"]: m for m in table_metadata}
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._keeper = self._connect()
+        self._keeper.execute(
+            "CREATE TABLE IF NOT EXISTS _replica_meta ("
+            "table_name TEXT PRIMARY KEY, source TEXT, version TEXT, row_count INTEGER, loaded_at REAL)"
+        )
+        self._keeper.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, uri=self.path.startswith("file:"),
+                               timeout=30, check_same_thread=False)
+        if not self.path.startswith("file:"):
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # --------------------------------------------------------
+    # Queries
+    # --------------------------------------------------------
+    def execute(self, sql_query: str, max_rows: int = DEFAULT_MAX_ROWS,
+                count_limit: int = DEFAULT_COUNT_LIMIT, timeout_s: float = 0.0,
+                profile_limit: int = 0) -> dict:
+        """Runs the transpiled query; a statement over timeout_s is interrupted in-process."""
+        conn = self._conn()
+        deadline = time.perf_counter() + timeout_s if timeout_s > 0 else None
+        if deadline is not None:
+            conn.set_progress_handler(lambda: int(time.perf_counter() > deadline), 1000)
+        cursor = conn.cursor()
+        cursor.row_factory = _row_dict
+        try:
+            cursor.execute(transpile(sql_query, self.dialect))
+            return build_envelope(cursor, max_rows, count_limit, profile_limit=profile_limit)
+        except sqlite3.OperationalError as e:
+            if deadline is not None and time.perf_counter() > deadline:
+                metrics.increment("sql_statements_killed")
+                return error_envelope(TimeoutError(f"Query cancelled after {timeout_s:g}s: {e}"))
+            return error_envelope(e)
+        except Exception as e:
+            return error_envelope(e)
+        finally:
+            cursor.close()
+            if deadline is not None:
+                conn.set_progress_handler(None, 0)
+
+    def stream(self, sql_query: str, batch_size: int = 500):
+        cursor = self._conn().cursor()
+        cursor.row_factory = _row_dict
+        try:
+            cursor.execute(transpile(sql_query, self.dialect))
+            yield from iter_cursor_rows(cursor, batch_size)
+        finally:
+            cursor.close()
+
+    def table_versions(self, tables: list[str]) -> dict:
+        """Source version and load time of each table: every (re)load is a new version."""
+        wanted = {t.lower() for t in tables}
+        return {
+            name.lower(): f"{meta['version']}@{meta['loaded_at']}"
+            for name, meta in self.loaded_tables().items() if name.lower() in wanted
+        }
+
+    def stats(self) -> dict:
+        rows = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(row_count), 0) FROM _replica_meta").fetchone()
+        return {"tables_loaded": rows[0], "rows": rows[1]}
+
+    def loaded_tables(self) -> dict:
+        """{table: {"source", "version", "row_count", "loaded_at"}}"""
+        cursor = self._conn().execute("SELECT table_name, source, version, row_count, loaded_at FROM _replica_meta")
+        return {
+            name: {"source": source, "version": version, "row_count": count, "loaded_at": loaded_at}
+            for name, source, version, count, loaded_at in cursor
+        }
+
+    # --------------------------------------------------------
+    # Loading
+    # --------------------------------------------------------
+    def load_table(self, table: str, rows, columns: list[str] | None = None,
+                   source: str = "", version: str = "") -> int:
+        """
+        Replaces `table` with rows (dicts, or tuples in `columns` order).
+        Returns the number of rows loaded.
+        """
+        meta = self.tables[table]
+        declared = [c["name"] for c in meta["columns"]]
+        columns = columns or declared
+        definitions = [f"{_quote(c['name'])} {_column_type(c.get('type', ''))}" for c in meta["columns"]]
+        # Columns the source has but data.py does not describe are kept as-is.
+        definitions += [f"{_quote(c)} TEXT COLLATE NOCASE" for c in columns if c not in declared]
+        staging = f"{table}__staging"
+        placeholders = ", ".join("?" for _ in columns)
+        insert = f"INSERT INTO {_quote(staging)} ({', '.join(map(_quote, columns))}) VALUES ({placeholders})"
+
+        def values():
+            for row in rows:
+                if isinstance(row, dict):
+                    yield [row.get(c) for c in columns]
+                else:
+                    yield list(row)
+
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(staging)}")
+            conn.execute(f"CREATE TABLE {_quote(staging)} ({', '.join(definitions)})")
+            conn.executemany(insert, values())
+            count = conn.execute(f"SELECT COUNT(*) FROM {_quote(staging)}").fetchone()[0]
+            with conn:
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                conn.execute(f"ALTER TABLE {_quote(staging)} RENAME TO {_quote(table)}")
+                for col in declared:
+                    if col.endswith("_id"):
+                        conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(f'{table}_{col}')} "
+                                     f"ON {_quote(table)} ({_quote(col)})")
+                conn.execute(
+                    "INSERT OR REPLACE INTO _replica_meta VALUES (?, ?, ?, ?, ?)",
+                    (table, source, version, count, time.time()),
+                )
+        logger.info("Replica: loaded %d rows into %s from %s", count, table, source or "rows")
+        return count
+
+    def load_examples(self) -> list[str]:
+        """Loads every table with the `examples` rows from its metadata (offline runs and benchmarks)."""
+        for table, meta in self.tables.items():
+            self.load_table(table, meta.get("examples", []), source="examples")
+        return list(self.tables)
+
+    def _is_current(self, table: str, source: str, version: str) -> bool:
+        row = self._conn().execute(
+            "SELECT source, version FROM _replica_meta WHERE table_name = ?", (table,)
+        ).fetchone()
+        return row is not None and row[0] == source and row[1] == version
+
+    def load_from_mysql(self, pool: ConnectionPool, tables: list[str] | None = None,
+                        incremental: bool = False, batch_size: int = 5000) -> list[str]:
+        """
+        Copies tables from MySQL. With incremental=True only tables whose
+        CHECKSUM TABLE changed since their last load are copied. Returns the
+        tables that were (re)loaded.
+        """
+        loaded = []
+        for table in tables or list(self.tables):
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"CHECKSUM TABLE `{table}`")
+                checksum = cursor.fetchone()
+                cursor.close()
+                version = str(checksum[1] if checksum else "")
+                if incremental and version and self._is_current(table, "mysql", version):
+                    continue
+
+                cursor = conn.cursor(buffered=False)
+                try:
+                    cursor.execute(f"SELECT * FROM `{table}`")
+                    columns = [d[0] for d in cursor.description]
+                    self.load_table(table, iter_cursor_rows(cursor, batch_size), columns,
+                                    source="mysql", version=version)
+                finally:
+                    cursor.close()
+            loaded.append(table)
+        return loaded
+
+    def load_from_files(self, directory: str, tables: list[str] | None = None,
+                        incremental: bool = False) -> list[str]:
+        """
+        Loads <table>.parquet or <table>.csv exports from directory (tables
+        without an export are skipped). With incremental=True only files
+        whose size or mtime changed are loaded. Returns the tables loaded.
+        """
+        loaded = []
+        for table in tables or list(self.tables):
+            for ext in ("parquet", "csv"):
+                path = os.path.join(directory, f"{table}.{ext}")
+                if os.path.exists(path):
+                    break
+            else:
+                continue
+            stat = os.stat(path)
+            version = f"{stat.st_size}:{stat.st_mtime_ns}"
+            if incremental and self._is_current(table, path, version):
+                continue
+            columns, rows = _read_parquet(path) if ext == "parquet" else _read_csv(path)
+            self.load_table(table, rows, columns, source=path, version=version)
+            loaded.append(table)
+        return loaded
+
+
+def _read_csv(path: str):
+    """(columns, rows) from a CSV export with a header row; empty cells are NULL."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        rows = [[value if value != "" else None for value in row] for row in reader]
+    return columns, rows
+
+
+def _read_parquet(path: str):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet exports needs pyarrow: pip install pyarrow") from e
+    table = pq.read_table(path)
+    return table.column_names, table.to_pylist()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or refresh the local SQLite replica.")
+    parser.add_argument("--path", default=os.getenv("SQLITE_REPLICA_PATH", DEFAULT_REPLICA_PATH))
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-mysql", action="store_true", help="Copy the tables from MySQL")
+    source.add_argument("--from-dir", help="Directory of <table>.csv / <table>.parquet exports")
+    parser.add_argument("--incremental", action="store_true", help="Only reload tables whose source changed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    replica = SQLiteReplicaBackend(args.path)
+    if args.from_mysql:
+        import txt2sql
+        refreshed = replica.load_from_mysql(txt2sql.get_db_pool(), incremental=args.incremental)
+    else:
+        refreshed = replica.load_from_files(args.from_dir, incremental=args.incremental)
+    print(json.dumps({"refreshed": refreshed, "tables": replica.loaded_tables()}, indent=2))
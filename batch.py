@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic import BaseModel
+
+from limits import llm_limit, db_limit
+from txt2sql import invoke_graph, lookup_cached_answer, prepare_run, record_answer
+
+
+# ============================================================
+# ASYNC BATCH ENTRY POINT
+# ============================================================
+class BatchResult(BaseModel):
+    question: str
+    sql: str = ""
+    rows: list | None = None
+    valid: bool = False
+    issues: list[str] = []
+    attempts: int = 0
+    cached: bool = False
+    timings: dict = {}
+    error: str | None = None
+
+
+async def answer_question(question: str, executor: ThreadPoolExecutor | None = None) -> BatchResult:
+    """
+    Runs one question through the cache or the compiled graph on `executor`
+    (the loop's default executor if None); never raises.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+
+    def run(func, *args):
+        # Worker threads do not inherit the task's context: the batch's
+        # concurrency limits are context variables.
+        return loop.run_in_executor(executor, functools.partial(contextvars.copy_context().run, func, *args))
+
+    try:
+        graph_input = await run(prepare_run, question)
+        final_state = await run(lookup_cached_answer, graph_input)
+        cached = final_state is not None
+        if not cached:
+            # The SQLite checkpointer is synchronous; run the graph on a worker thread.
+            final_state = await run(invoke_graph, graph_input)
+            await run(record_answer, final_state)
+    except Exception as e:
+        return BatchResult(
+            question=question,
+            error=f"{type(e).__name__}: {e}",
+            timings={"total": time.perf_counter() - started},
+        )
+
+    return to_batch_result(question, final_state, cached, started)
+
+
+def to_batch_result(question: str, final_state: dict, cached: bool, started: float) -> BatchResult:
+    timings = dict(final_state.get("timings") or {})
+    timings["total"] = time.perf_counter() - started
+    return BatchResult(
+        question=question,
+        sql=final_state.get("sql_query", ""),
+        rows=final_state.get("sql_result"),
+        valid=final_state.get("valid", False),
+        issues=final_state.get("issues", []),
+        attempts=final_state.get("attempts", 0),
+        cached=cached,
+        timings=timings,
+    )
+
+
+async def run_agentic_batch(questions: list[str], max_llm_concurrency: int = 4,
+                            max_db_concurrency: int = 4) -> list[BatchResult]:
+    """
+    Answers many questions concurrently and returns one BatchResult per
+    question, in input order. A failing question is reported in its
+    result's `error` and does not stop the others.
+
+    LLM and DB calls of this batch are capped separately, with semaphores
+    of its own: other batches and server requests running at the same time
+    keep their limits.
+    Graph nodes are blocking and run on a thread pool owned by the batch,
+    with a worker for every question allowed in flight; at most
+    max_llm_concurrency + max_db_concurrency questions run at once, which
+    is enough to keep both limits saturated.
+    """
+    max_in_flight = max_llm_concurrency + max_db_concurrency
+    executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="txt2sql-batch")
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def bounded(question: str) -> BatchResult:
+        async with in_flight:
+            return await answer_question(question, executor)
+
+    try:
+        with llm_limit.limited(max_llm_concurrency), db_limit.limited(max_db_concurrency):
+            return await asyncio.gather(*(bounded(q) for q in questions))
+    finally:
+        executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    # Usage: python batch.py questions.txt   (one question per line)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        batch_questions = [line.strip() for line in f if line.strip()]
+    results = asyncio.run(run_agentic_batch(batch_questions))
+    for r in results:
+        print(json.dumps(r.model_dump(), default=str))
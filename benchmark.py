@@ -0,0 +1,722 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from data import get_table_metadata
+from metrics import estimate_tokens
+
+
+# ============================================================
+# OFFLINE BENCHMARK
+# ============================================================
+# Runs the agentic loop without Watsonx or MySQL:
+#   - StubLLM replays recorded responses with a configurable latency
+#   - queries run on a SQLite replica (backends.py) loaded with the
+#     `examples` rows
+#   - the question corpus is built from the `usuage` phrases
+# and writes per-node wall times, prompt sizes, attempts and end-to-end
+# percentiles to a JSON file so runs can be compared.
+
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+VALID_RESPONSE = '```json\n{"valid": true, "issues": [], "regenerate_sql": false}\n```'
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------------------
+# Question corpus
+# ------------------------------------------------------------
+def build_corpus() -> list[dict]:
+    """One entry per `usuage` phrase, with the table it was written for."""
+    tables = json.loads(get_table_metadata())
+    corpus = []
+    for table, meta in tables.items():
+        for phrase in meta.get("usuage", []):
+            corpus.append({
+                "question": phrase,
+                "table": table,
+                "sql": f"SELECT * FROM {table} LIMIT 20",
+            })
+    return corpus
+
+
+# ------------------------------------------------------------
+# Stub LLM
+# ------------------------------------------------------------
+class StubLLM:
+    """
+    Deterministic stand-in for WatsonxLLM. Responses are looked up by the
+    SHA-256 of the prompt in `recordings`; prompts that were not recorded
+    get a corpus SQL (generator) or an "all valid" verdict (validator),
+    followed by `trailing_text` (the explanation models tend to add).
+    A full response takes `latency` seconds; stream() spreads that over
+    ~4-character chunks. Prompt and completion sizes are recorded per call.
+    """
+
+    def __init__(self, recordings: dict | None = None, latency: float = 0.0,
+                 corpus: list[dict] | None = None, trailing_text: str = ""):
+        self.recordings = recordings or {}
+        self.latency = latency
+        self.trailing_text = trailing_text
+        self.sql_by_question = {c["question"]: c["sql"] for c in (corpus or [])}
+        self.calls = []
+
+    def _respond(self, prompt: str) -> tuple[dict, str]:
+        if "expert SQL validator" in prompt:
+            kind = "validator"
+        elif "FAILING SQL:" in prompt:
+            kind = "repair"
+        else:
+            kind = "generator"
+        response = self.recordings.get(prompt_key(prompt))
+        if response is None:
+            if kind == "validator":
+                response = VALID_RESPONSE + self.trailing_text
+            else:
+                response = "SELECT 1"
+                # Longest question first so a question that contains another wins.
+                for question, sql in sorted(self.sql_by_question.items(), key=lambda q: -len(q[0])):
+                    if question in prompt:
+                        response = f"```sql\n{sql}\n```" + self.trailing_text
+                        break
+        call = {
+            "kind": kind,
+            "chars": len(prompt),
+            "tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(response),
+            "received_tokens": 0,
+        }
+        self.calls.append(call)
+        return call, response
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        call, response = self._respond(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        call["received_tokens"] = call["completion_tokens"]
+        return response
+
+    def stream(self, prompt: str, **kwargs):
+        call, response = self._respond(prompt)
+        chunks = [response[i:i + 4] for i in range(0, len(response), 4)] or [""]
+        received = ""
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            received += chunk
+            call["received_tokens"] = estimate_tokens(received)
+            yield chunk
+
+
+class RecordingLLM:
+    """Wraps a real LLM and saves its responses in StubLLM's recording format."""
+
+    def __init__(self, llm, path: str):
+        self.llm = llm
+        self.path = path
+        self.recordings = load_recordings(path)
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        response = self.llm.invoke(prompt, **kwargs)
+        self.recordings[prompt_key(prompt)] = response
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.recordings, f, indent=2)
+        return response
+
+
+def load_recordings(path: str | None) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values),
+    }
+
+
+def offline_setup(latency: float = 0.0, recordings_path: str | None = None,
+                  db_path: str = os.path.join(".cache", "benchmark.sqlite3"), trailing_text: str = ""):
+    """Points txt2sql at a StubLLM and the SQLite replica; returns (txt2sql, corpus, stub)."""
+    import txt2sql
+    from backends import SQLiteReplicaBackend
+    from checkpoints import CheckpointStore
+    from example_store import ExampleStore
+    from sql_cache import QuestionCache
+
+    replica = SQLiteReplicaBackend(db_path)
+    replica.load_examples()
+    corpus = build_corpus()
+    stub = StubLLM(load_recordings(recordings_path), latency, corpus, trailing_text)
+
+    txt2sql.llm = stub
+    txt2sql.backend = replica
+    # Every question must go through the graph, not the persistent cache.
+    txt2sql._question_cache = QuestionCache(":memory:")
+    # Starts empty and fills as answers are accepted, so with --runs > 1
+    # later runs can retrieve examples (compare with FEW_SHOT_K=0).
+    txt2sql._example_store = ExampleStore(":memory:")
+    txt2sql._checkpoints = CheckpointStore(":memory:")
+    txt2sql._entity_index = None
+    txt2sql._result_cache = None
+    txt2sql._result_store = None
+    txt2sql._app = None
+    txt2sql._resumable_app = None
+    # Built before the first question, as the server's warm-up does, but
+    # waited for so every run resolves values the same way.
+    txt2sql.warm_entity_index(wait_s=None)
+    return txt2sql, corpus, stub
+
+
+def run_benchmark(latency: float = 0.0, runs: int = 1, recordings_path: str | None = None,
+                  db_path: str = os.path.join(".cache", "benchmark.sqlite3"), trailing_text: str = "") -> dict:
+    txt2sql, corpus, stub = offline_setup(latency, recordings_path, db_path, trailing_text)
+
+    questions = []
+    node_times = {}
+    for _ in range(runs):
+        for entry in corpus:
+            calls_before = len(stub.calls)
+            started = time.perf_counter()
+            final_state = txt2sql.invoke_graph(txt2sql.prepare_run(entry["question"]))
+            elapsed = time.perf_counter() - started
+            txt2sql.record_answer(final_state)
+
+            calls = stub.calls[calls_before:]
+            for node, seconds in (final_state.get("timings") or {}).items():
+                node_times.setdefault(node, []).append(seconds)
+            questions.append({
+                "question": entry["question"],
+                "seconds": elapsed,
+                "attempts": final_state["attempts"],
+                "valid": final_state["valid"],
+                "llm_calls": len(calls),
+                "prompt_chars": sum(c["chars"] for c in calls),
+                "prompt_tokens": sum(c["tokens"] for c in calls),
+            })
+
+    def prompt_stats(kind, field):
+        return summarize([c[field] for c in stub.calls if c["kind"] == kind])
+
+    return {
+        "config": {"latency": latency, "runs": runs, "questions": len(corpus)},
+        "end_to_end_seconds": summarize([q["seconds"] for q in questions]),
+        "node_seconds": {node: summarize(v) for node, v in node_times.items()},
+        "attempts": summarize([q["attempts"] for q in questions]),
+        "prompt_chars": {k: prompt_stats(k, "chars") for k in ("generator", "repair", "validator")},
+        "prompt_tokens": {k: prompt_stats(k, "tokens") for k in ("generator", "repair", "validator")},
+        "generation": txt2sql.generation_stats(),
+        "few_shot": txt2sql.few_shot_stats(),
+        "streaming": txt2sql.streaming_stats(),
+        "result_cache": txt2sql._result_cache.stats() if txt2sql._result_cache is not None else {},
+        "completion_tokens": {
+            "generated": sum(c["completion_tokens"] for c in stub.calls),
+            "received": sum(c["received_tokens"] for c in stub.calls),
+            "saved": sum(c["completion_tokens"] - c["received_tokens"] for c in stub.calls),
+        },
+        "valid_rate": sum(q["valid"] for q in questions) / len(questions) if questions else 0.0,
+        "questions": questions,
+    }
+
+
+# ------------------------------------------------------------
+# Resume after a crash vs full rerun
+# ------------------------------------------------------------
+def run_resume_benchmark(latency: float = 0.2, questions: int = 5,
+                         checkpoint_path: str = os.path.join(".cache", "benchmark_checkpoints.sqlite3"),
+                         interrupt_before: str = "validator") -> dict:
+    """
+    Stops each run right before `interrupt_before` (as if the process died
+    there), resumes it from a fresh CheckpointStore on the same file (as a
+    restarted process would) and compares that with rerunning the question.
+    """
+    from checkpoints import CheckpointStore
+
+    txt2sql, corpus, stub = offline_setup(latency)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    interrupted = txt2sql.build_app(CheckpointStore(checkpoint_path).saver, interrupt_before=[interrupt_before])
+    restarted = txt2sql.build_app(CheckpointStore(checkpoint_path).saver)
+    rerun = txt2sql.build_app()
+
+    samples = []
+    for entry in corpus[:questions]:
+        graph_input = txt2sql.prepare_run(entry["question"])
+        interrupted.invoke(graph_input, CheckpointStore.config(graph_input["run_id"]))
+
+        calls_before = len(stub.calls)
+        started = time.perf_counter()
+        resumed = restarted.invoke(None, CheckpointStore.config(graph_input["run_id"]))
+        resume_s = time.perf_counter() - started
+        resume_calls = len(stub.calls) - calls_before
+
+        calls_before = len(stub.calls)
+        started = time.perf_counter()
+        rerun.invoke(txt2sql.prepare_run(entry["question"]))
+        rerun_s = time.perf_counter() - started
+        samples.append({
+            "question": entry["question"],
+            "valid": resumed["valid"],
+            "resume_seconds": resume_s,
+            "rerun_seconds": rerun_s,
+            "resume_llm_calls": resume_calls,
+            "rerun_llm_calls": len(stub.calls) - calls_before,
+        })
+    return {
+        "config": {"latency": latency, "questions": len(samples), "interrupt_before": interrupt_before},
+        "resume_seconds": summarize([s["resume_seconds"] for s in samples]),
+        "rerun_seconds": summarize([s["rerun_seconds"] for s in samples]),
+        "resume_llm_calls": sum(s["resume_llm_calls"] for s in samples),
+        "rerun_llm_calls": sum(s["rerun_llm_calls"] for s in samples),
+        "questions": samples,
+    }
+
+
+# ------------------------------------------------------------
+# Validator result payload: json.dumps(rows) vs profile
+# ------------------------------------------------------------
+def synthetic_rows(table: str, count: int) -> list[dict]:
+    """`count` rows cycling through the table's `examples`, ids made unique."""
+    examples = json.loads(get_table_metadata())[table]["examples"]
+    rows = []
+    for i in range(count):
+        row = dict(examples[i % len(examples)])
+        first = next(iter(row))
+        row[first] = f"{row[first]}-{i}"
+        rows.append(row)
+    return rows
+
+
+def run_profile_benchmark(row_counts=(10, 100, 1000, 10000), table: str = "opt_recipe",
+                          repeats: int = 5) -> list[dict]:
+    """
+    Time and size of the old validator payload vs the profile summary. The
+    profile is built the way build_envelope does it: StreamingProfile fed
+    one row at a time, up to the default profile limit.
+    """
+    from result_profile import StreamingProfile, sample_rows
+    from sql_results import DEFAULT_PROFILE_LIMIT
+
+    results = []
+    for count in row_counts:
+        rows = synthetic_rows(table, count)
+        columns = [{"name": name, "type": ""} for name in rows[0]]
+
+        def dumps():
+            return json.dumps(rows, indent=4, default=str)
+
+        def profile():
+            profiler = StreamingProfile(columns)
+            for row in rows[:DEFAULT_PROFILE_LIMIT]:
+                profiler.add(row)
+            summary = {"profile": profiler.result(), "sample_rows": sample_rows(rows)}
+            return json.dumps(summary, separators=(",", ":"), default=str)
+
+        entry = {"rows": count}
+        for name, build in (("json_dumps", dumps), ("profile", profile)):
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                text = build()
+                timings.append(time.perf_counter() - started)
+            entry[name] = {"seconds_p50": percentile(timings, 50), "chars": len(text),
+                           "tokens": estimate_tokens(text)}
+        results.append(entry)
+    return results
+
+
+# ------------------------------------------------------------
+# Query result cache: repeated SQL with and without the cache
+# ------------------------------------------------------------
+class SlowBackend:
+    """Adds a fixed round-trip time to every execute() of another backend."""
+
+    def __init__(self, backend, latency: float):
+        self.backend = backend
+        self.latency = latency
+        self.name = backend.name
+        self.executed = 0
+
+    def execute(self, *args, **kwargs):
+        self.executed += 1
+        time.sleep(self.latency)
+        return self.backend.execute(*args, **kwargs)
+
+    def table_versions(self, tables):
+        return self.backend.table_versions(tables)
+
+
+def run_result_cache_benchmark(db_latency: float = 0.01, repeats: int = 5) -> dict:
+    """
+    Runs every corpus query `repeats` times, alternating two spellings of
+    the same SQL, with and without the result cache; then reloads one
+    table and runs the queries once more to show only its entries miss.
+    """
+    from backends import SQLiteReplicaBackend
+    from result_cache import ResultCache
+
+    replica = SQLiteReplicaBackend(":memory:")
+    replica.load_examples()
+    tables = sorted({entry["table"] for entry in build_corpus()})
+    spellings = [(f"SELECT * FROM {t} LIMIT 20", f"select *\n  from `{t}`  limit 20 -- again") for t in tables]
+
+    def run(cache):
+        backend = SlowBackend(replica, db_latency)
+        timings = []
+        for i in range(repeats):
+            for variants in spellings:
+                sql = variants[i % 2]
+                started = time.perf_counter()
+                if cache is None:
+                    backend.execute(sql, 20, 1000)
+                else:
+                    cache.get_or_execute(backend, sql, lambda: backend.execute(sql, 20, 1000), 20, 1000)
+                timings.append(time.perf_counter() - started)
+        return timings, backend
+
+    plain, plain_backend = run(None)
+    cache = ResultCache(version_ttl_s=0.0)
+    cached, cached_backend = run(cache)
+
+    # A reload changes the table's version: only its queries run again.
+    replica.load_table(tables[0], replica.tables[tables[0]].get("examples", []), source="reload")
+    before = cached_backend.executed
+    for sql, _ in spellings:
+        cache.get_or_execute(cached_backend, sql, lambda: cached_backend.execute(sql, 20, 1000), 20, 1000)
+    return {
+        "config": {"db_latency": db_latency, "repeats": repeats, "queries": len(spellings)},
+        "without_cache": {"seconds": summarize(plain), "executed": plain_backend.executed},
+        "with_cache": {"seconds": summarize(cached), "executed": before},
+        "after_reload_executed": cached_backend.executed - before,
+        "stats": cache.stats(),
+    }
+
+
+# ------------------------------------------------------------
+# Entity value index: build time, memory, lookup latency
+# ------------------------------------------------------------
+def run_entity_benchmark(row_counts=(100, 1000, 10000), repeats: int = 3) -> list[dict]:
+    """
+    Fills a SQLite replica with `count` rows per table whose categorical
+    values are all distinct, builds the EntityIndex from it and resolves
+    every corpus question against it.
+    """
+    from backends import SQLiteReplicaBackend
+    from entity_index import EntityIndex, categorical_columns
+    from schema_registry import get_registry
+
+    metadata = get_registry().tables
+    categorical = categorical_columns(metadata)
+    questions = [entry["question"] for entry in build_corpus()]
+
+    results = []
+    for count in row_counts:
+        replica = SQLiteReplicaBackend(":memory:", metadata)
+        for meta in metadata:
+            table = meta["table_name"]
+            rows = []
+            for i, row in enumerate(synthetic_rows(table, count)):
+                rows.append({c: f"{v} {i}" if c in categorical.get(table, ()) and v is not None else v
+                             for c, v in row.items()})
+            replica.load_table(table, rows, source="benchmark")
+
+        index = EntityIndex.from_backend(replica, metadata)
+        lookups = []
+        resolved = 0
+        for _ in range(repeats):
+            for question in questions:
+                started = time.perf_counter()
+                resolved += bool(index.resolve(question))
+                lookups.append(time.perf_counter() - started)
+        stats = index.stats()
+        results.append({
+            "rows_per_table": count,
+            "entries": stats["entries"],
+            "build_seconds": stats["build_seconds"],
+            "memory_bytes": stats["memory_bytes"],
+            "lookup_seconds": summarize(lookups),
+            "questions_with_matches": resolved / repeats,
+        })
+    return results
+
+
+# ------------------------------------------------------------
+# Graph state: by value (pydantic, rows and schema inside) vs by handle
+# ------------------------------------------------------------
+STATE_LAYOUTS = ("by_value", "lean")
+
+
+def state_worker(layout: str, rows: int, attempts: int, threads: int, table: str = "opt_recipe") -> dict:
+    """
+    Runs `threads` concurrent generate -> precheck -> execute -> validate
+    loops of `attempts` attempts, each execution returning `rows` rows, with
+    the state layout `layout` and checkpoints saved after every node (as
+    get_resumable_app() does). Per-transition overhead is measured on one
+    run alone, before the concurrent ones, so it does not include waiting
+    for the GIL. Meant for a fresh interpreter (peak RSS is per process);
+    see run_state_benchmark().
+    """
+    import resource
+    from concurrent.futures import ThreadPoolExecutor
+    from langgraph.graph import StateGraph, END
+    from pydantic import BaseModel
+    import txt2sql
+    from checkpoints import CheckpointStore
+    from schema_registry import get_registry
+
+    class ByValueState(BaseModel):
+        # GraphState before it moved rows and schema out of band.
+        run_id: str = ""
+        question: str = ""
+        full_metadata: list = []
+        sql_query: str = ""
+        sql_result: list | None = None
+        sql_result_meta: dict = {}
+        attempts: int = 0
+        valid: bool = False
+        issues: list[str] = []
+        timings: dict = {}
+
+    registry = get_registry()
+    store = txt2sql.get_result_store()
+    template = synthetic_rows(table, rows)
+    node_seconds = []
+
+    def timed(fn):
+        def node(state):
+            started = time.perf_counter()
+            update = fn(state)
+            node_seconds.append(time.perf_counter() - started)
+            return update
+        return node
+
+    def generate(state):
+        return {"sql_query": f"SELECT * FROM {table} -- attempt {state.attempts + 1}",
+                "attempts": state.attempts + 1}
+
+    def precheck(state):
+        return {"issues": []}
+
+    def execute(state):
+        # A fresh result per execution, as the database would return.
+        envelope = {"rows": [dict(r) for r in template], "row_count": rows, "truncated": False}
+        if layout == "lean":
+            store.release(state.result_handle)
+            return {"result_handle": store.put(envelope)}
+        return {"sql_result": envelope.pop("rows"), "sql_result_meta": envelope}
+
+    def validate(state):
+        if layout == "lean":
+            result = store.get(state.result_handle)["rows"]
+            metadata = state.metadata()
+        else:
+            result, metadata = state.sql_result, state.full_metadata
+        valid = state.attempts >= attempts and len(result) == rows and bool(metadata)
+        return {"valid": valid}
+
+    workflow = StateGraph(txt2sql.GraphState if layout == "lean" else ByValueState)
+    for name, fn in (("generate", generate), ("precheck", precheck), ("execute", execute), ("validate", validate)):
+        workflow.add_node(name, timed(fn))
+    workflow.set_entry_point("generate")
+    workflow.add_edge("generate", "precheck")
+    workflow.add_edge("precheck", "execute")
+    workflow.add_edge("execute", "validate")
+    workflow.add_conditional_edges("validate", lambda s: "done" if s.valid else "retry",
+                                   {"done": END, "retry": "generate"})
+    app = workflow.compile(checkpointer=CheckpointStore(":memory:").saver)
+
+    def graph_input(i):
+        if layout == "lean":
+            return {"run_id": str(i), "question": "recipes", "schema_hash": registry.content_hash,
+                    "tables": [m["table_name"] for m in registry.tables]}
+        return {"run_id": str(i), "question": "recipes", "full_metadata": registry.tables}
+
+    def run(i):
+        return app.invoke(graph_input(i), CheckpointStore.config(f"{layout}-{i}"))
+
+    # Time outside the node bodies: copying, validating, merging and
+    # checkpointing the state.
+    started = time.perf_counter()
+    warm = run(-1)
+    overhead = time.perf_counter() - started - sum(node_seconds)
+    transitions = len(node_seconds)
+    store.release(warm.get("result_handle", ""))
+
+    node_seconds.clear()
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        finals = list(pool.map(run, range(threads)))
+    wall = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "layout": layout,
+        "valid": all(f["valid"] for f in finals),
+        "transitions": len(node_seconds),
+        "wall_seconds": wall,
+        "transition_overhead_us": overhead / transitions * 1e6,
+        "baseline_rss_mb": baseline_kb / 1024,
+        "peak_rss_mb": peak_kb / 1024,
+        "result_store": store.stats() if layout == "lean" else {},
+    }
+
+
+def run_state_benchmark(rows: int = 20000, attempts: int = 3, threads: int = 8) -> list[dict]:
+    """state_worker() for each layout, each in its own interpreter."""
+    results = []
+    for layout in STATE_LAYOUTS:
+        statement = ("import json, benchmark; "
+                     f"print(json.dumps(benchmark.state_worker({layout!r}, {rows}, {attempts}, {threads})))")
+        proc = subprocess.run(
+            [sys.executable, "-c", statement],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+
+# ------------------------------------------------------------
+# Import time
+# ------------------------------------------------------------
+# What `import txt2sql` used to load eagerly, now deferred to first use.
+EAGER_IMPORTS = ("dotenv", "langchain_ibm", "ibm_watsonx_ai.metanames", "langgraph.graph", "mysql.connector")
+
+
+def import_seconds(statement: str) -> float:
+    """Cumulative import time of `statement` in a fresh interpreter (python -X importtime)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        # Top-level imports have no indentation in the package column.
+        if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith("  "):
+            total_us += int(parts[1])
+    return total_us / 1e6
+
+
+def run_import_benchmark(repeats: int = 5) -> dict:
+    eager = "import txt2sql; " + "; ".join(f"import {m}" for m in EAGER_IMPORTS)
+    results = {}
+    for name, statement in (("lazy", "import txt2sql"), ("eager", eager)):
+        results[name] = summarize([import_seconds(statement) for _ in range(repeats)])
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the agentic SQL loop.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub LLM latency per call, seconds")
+    parser.add_argument("--runs", type=int, default=1, help="Passes over the question corpus")
+    parser.add_argument("--recordings", default=None, help="JSON file of recorded LLM responses")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--profile", action="store_true",
+                        help="Only compare the validator result payload: json.dumps(rows) vs profile")
+    parser.add_argument("--import-time", action="store_true",
+                        help="Only compare `import txt2sql` with and without the deferred dependencies")
+    parser.add_argument("--trailing-words", type=int, default=0,
+                        help="Words of explanation the stub appends after each SQL/JSON block")
+    parser.add_argument("--resume", action="store_true",
+                        help="Only compare resuming interrupted runs from checkpoints with rerunning them")
+    parser.add_argument("--entities", action="store_true",
+                        help="Only measure the entity value index: build time, memory and lookup latency")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="Only compare repeated SQL with and without the result cache")
+    parser.add_argument("--state", action="store_true",
+                        help="Only compare peak RSS and per-transition overhead of by-value and lean graph state")
+    args = parser.parse_args()
+
+    if args.state:
+        for entry in run_state_benchmark():
+            print(f"{entry['layout']:<8} {entry['transitions']} transitions  "
+                  f"overhead {entry['transition_overhead_us']:.0f}us/transition  "
+                  f"peak RSS {entry['peak_rss_mb']:.0f} MB (baseline {entry['baseline_rss_mb']:.0f} MB)  "
+                  f"wall {entry['wall_seconds']:.2f}s")
+        raise SystemExit(0)
+
+    if args.result_cache:
+        results = run_result_cache_benchmark(args.latency or 0.01)
+        plain, cached = results["without_cache"], results["with_cache"]
+        print(f"{results['config']['queries']} queries x {results['config']['repeats']}, "
+              f"{results['config']['db_latency'] * 1000:.0f}ms per round trip")
+        print(f"without cache p50={plain['seconds']['p50'] * 1e3:.2f}ms ({plain['executed']} executed)  "
+              f"with cache p50={cached['seconds']['p50'] * 1e3:.2f}ms ({cached['executed']} executed)")
+        print(f"after reloading one table: {results['after_reload_executed']} of "
+              f"{results['config']['queries']} queries executed again")
+        raise SystemExit(0)
+
+    if args.entities:
+        for entry in run_entity_benchmark():
+            lookup = entry["lookup_seconds"]
+            print(f"{entry['rows_per_table']:>6} rows/table  {entry['entries']:>7} values  "
+                  f"build {entry['build_seconds']:.3f}s  {entry['memory_bytes'] / 1e6:.1f} MB  "
+                  f"lookup p50={lookup['p50'] * 1e3:.2f}ms p95={lookup['p95'] * 1e3:.2f}ms")
+        raise SystemExit(0)
+
+    if args.resume:
+        results = run_resume_benchmark(args.latency or 0.2)
+        resume, rerun = results["resume_seconds"], results["rerun_seconds"]
+        print(f"{results['config']['questions']} runs interrupted before {results['config']['interrupt_before']}")
+        print(f"resume p50={resume['p50']:.3f}s ({results['resume_llm_calls']} LLM calls)  "
+              f"rerun p50={rerun['p50']:.3f}s ({results['rerun_llm_calls']} LLM calls)")
+        raise SystemExit(0)
+
+    if args.import_time:
+        results = run_import_benchmark()
+        print(f"import txt2sql (lazy)                  p50={results['lazy']['p50']:.3f}s")
+        print(f"import txt2sql + deferred dependencies p50={results['eager']['p50']:.3f}s")
+        raise SystemExit(0)
+
+    if args.profile:
+        for entry in run_profile_benchmark():
+            dumps, profile = entry["json_dumps"], entry["profile"]
+            print(f"{entry['rows']:>6} rows  json.dumps {dumps['seconds_p50']:.4f}s {dumps['tokens']:>8} tokens"
+                  f"  |  profile {profile['seconds_p50']:.4f}s {profile['tokens']:>5} tokens")
+        raise SystemExit(0)
+
+    trailing = "\n\nThis query " + " ".join(["explains"] * args.trailing_words) if args.trailing_words else ""
+    results = run_benchmark(args.latency, args.runs, args.recordings, trailing_text=trailing)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    e2e = results["end_to_end_seconds"]
+    print(f"{results['config']['questions']} questions x {args.runs} runs")
+    print(f"end-to-end p50={e2e['p50']:.4f}s p95={e2e['p95']:.4f}s")
+    for node, stats in results["node_seconds"].items():
+        print(f"  {node:<10} p50={stats['p50']:.4f}s p95={stats['p95']:.4f}s")
+    tokens = results["completion_tokens"]
+    print(f"completion tokens generated={tokens['generated']} received={tokens['received']} saved={tokens['saved']}")
+    print(f"Results written to {args.output}")
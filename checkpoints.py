@@ -0,0 +1,149 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("txt2sql.checkpoints")
+
+
+# ============================================================
+# RESUMABLE RUNS
+# ============================================================
+# The graph is compiled with LangGraph's SQLite checkpointer, which saves
+# GraphState after every node under the run's thread id (GraphState.run_id).
+# A run that died (process killed, Watsonx timeout on attempt 4, ...) is
+# resumed with resume_run(run_id) and continues after the last node that
+# completed: SQL already generated, executed or validated is not paid for
+# again.
+#
+# A `runs` table next to LangGraph's own records when each run started and
+# whether it finished. gc() deletes the checkpoints of finished runs after
+# done_retention_s and of abandoned runs after retention_s.
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(".cache", "checkpoints.sqlite3")
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+DEFAULT_DONE_RETENTION_SECONDS = 3600
+
+# gc() runs on open and after this many finished runs.
+GC_EVERY_RUNS = 100
+
+
+class CheckpointStore:
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH,
+                 retention_s: float = DEFAULT_RETENTION_SECONDS,
+                 done_retention_s: float = DEFAULT_DONE_RETENTION_SECONDS):
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.retention_s = retention_s
+        self.done_retention_s = done_retention_s
+        self._lock = threading.Lock()
+        self._finished_since_gc = 0
+
+        # SqliteSaver serializes access to its connection itself; the runs
+        # table is written through the same connection under its lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.saver = SqliteSaver(self._conn)
+        self.saver.setup()
+        with self.saver.lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    question TEXT,
+                    status TEXT,
+                    started_at REAL,
+                    updated_at REAL
+                )
+            """)
+            self._conn.commit()
+        self.gc()
+
+    @staticmethod
+    def config(run_id: str) -> dict:
+        """LangGraph config that ties an invoke/stream to the run's checkpoints."""
+        return {"configurable": {"thread_id": run_id}}
+
+    def start(self, run_id: str, question: str):
+        now = time.time()
+        with self.saver.lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, question, status, started_at, updated_at) "
+                "VALUES (?, ?, 'running', ?, ?)",
+                (run_id, question, now, now),
+            )
+            self._conn.commit()
+
+    def finish(self, run_id: str):
+        with self.saver.lock:
+            self._conn.execute(
+                "UPDATE runs SET status = 'done', updated_at = ? WHERE run_id = ?", (time.time(), run_id)
+            )
+            self._conn.commit()
+        with self._lock:
+            self._finished_since_gc += 1
+            due = self._finished_since_gc >= GC_EVERY_RUNS
+            if due:
+                self._finished_since_gc = 0
+        if due:
+            self.gc()
+
+    def abort(self, run_id: str):
+        """Marks a run stopped before it finished (server deadline); it can still be resumed."""
+        with self.saver.lock:
+            self._conn.execute(
+                "UPDATE runs SET status = 'aborted', updated_at = ? WHERE run_id = ?", (time.time(), run_id)
+            )
+            self._conn.commit()
+
+    def unfinished(self) -> list[dict]:
+        """Runs that started but never finished (running or aborted), newest first."""
+        with self.saver.lock:
+            rows = self._conn.execute(
+                "SELECT run_id, question, status, started_at FROM runs "
+                "WHERE status IN ('running', 'aborted') ORDER BY started_at DESC"
+            ).fetchall()
+        return [{"run_id": r, "question": q, "status": st, "started_at": s} for r, q, st, s in rows]
+
+    def gc(self, now: float | None = None) -> int:
+        """Deletes the checkpoints of expired runs; returns how many runs were removed."""
+        now = now if now is not None else time.time()
+        with self.saver.lock:
+            expired = [r for (r,) in self._conn.execute(
+                "SELECT run_id FROM runs WHERE (status = 'done' AND updated_at < ?) OR updated_at < ?",
+                (now - self.done_retention_s, now - self.retention_s),
+            )]
+        for run_id in expired:
+            self.saver.delete_thread(run_id)
+        if expired:
+            with self.saver.lock:
+                self._conn.executemany("DELETE FROM runs WHERE run_id = ?", [(r,) for r in expired])
+                self._conn.commit()
+            logger.info("Checkpoint GC removed %d runs", len(expired))
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self.saver.lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM runs GROUP BY status").fetchall())
+            checkpoints = self._conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {"running": counts.get("running", 0), "aborted": counts.get("aborted", 0),
+                "done": counts.get("done", 0), "checkpoints": checkpoints}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="List unfinished runs or clean up old checkpoints.")
+    parser.add_argument("--path", default=os.getenv("CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH))
+    parser.add_argument("--gc", action="store_true", help="Only run garbage collection")
+    args = parser.parse_args()
+
+    store = CheckpointStore(args.path)
+    if not args.gc:
+        print(json.dumps({"stats": store.stats(), "unfinished": store.unfinished()}, indent=2))
@@ -16,10 +16,7 @@ def get_table_metadata():
             {"name": "price", "type": "INT", "description": "Market price of the product, expressed in USD per unit"},
             {"name": "process_type", "type": "VARCHAR(50)", "description": "Type of manufacturing process applied, determined by the product’s chemical structure, performance requirements, and intended application area"}
         ],
-        "relationships": {
-                "Foreign Key":"links master_product.product_id to master_product_limits.product_id",
-                "Foreign Key":"links master_product.product_id to opt_scenario.product_id"
-        },
+        "foreign_keys": [],
 
         "examples": [
             {"product_id":"CH-001", "product_name": "ChemAlloy B12", "stock":4500,"price":12.5, "process_type": "Alloy Blending"},
@@ -41,8 +38,9 @@ def get_table_metadata():
             {"name": "max_limit", "type": "INT", "description": "Maximum acceptable value"},
             {"name": "product_id", "type": "INT", "description": "Unique code for each product that the specification belongs to,Foreign key to master_product"}
         ],
-        "relationships": {
-            "Foreign Key":"links master_product_limits.product_id to master_product.product_id"},
+        "foreign_keys": [
+            {"column": "product_id", "references_table": "master_product", "references_column": "product_id"}
+        ],
       
         "examples": [
             {"id":"1", "property": "Viscocity (cP)", "min_limit":56.5,"max_limit":58.5, "product_id": "CH-001"},
@@ -69,11 +67,9 @@ def get_table_metadata():
             {"name": "stock_location", "type": "INT", "description": "Storage location identifier where the raw material is kept (city name),Foreign key to master_location"},
             {"name": "process_type", "type": "VARCHAR(100)", "description": "Type of  production process"}
         ],
-        "relationships": {
-            "Foreign Key":"links master_raw_material.stock_location to master_location.location_city",
-            "Foreign Key":"links to master_raw_material.raw_material_id to master_raw_material_properties.raw_material_id ",
-            "Foreign Key":"links master_raw_material.stock_location to opt_recipe.raw_material_id"
-            },
+        "foreign_keys": [
+            {"column": "stock_location", "references_table": "master_location", "references_column": "location_city"}
+        ],
         "examples": [
         {"raw_material_id":"H2", "raw_material_name": "Potassium Carbonate", "unit_cost":89.22,"stock_quantity":1250, "unit_process_cost": 27.1, "max_recipe_percentage":1,"min_recipe_percentage":0,"recipe_usage_coefficient":1,"supplier_name":"NovaChem","stock_location":"İstanbul","process_type":"Dry Mixing"},
         {"raw_material_id":"H1", "raw_material_name": "Sodium Silicate", "unit_cost":48.02,"stock_quantity":1900, "unit_process_cost": 2.62, "max_recipe_percentage":1,"min_recipe_percentage":0,"recipe_usage_coefficient":1,"supplier_name":"ChemSource Ltd.","stock_location":"Ankara","process_type":"Solution Preparation"}
@@ -92,11 +88,9 @@ def get_table_metadata():
             {"name": "value", "type": "INT", "description": "Measured value"},
             {"name": "raw_material_id", "type": "INT", "description": "Identifier of the raw material to which the property belongs,Foreign key linking to the raw materials table."}
         ],
-        "relationships": {
-            "Foreign Key":"links master_raw_material_properties.raw_material_id to master_raw_material.raw_material_id",
-            "Foreign Key":"links master_raw_material_properties.raw_material_id to opt_recipe.raw_material_id",
-
-        },
+        "foreign_keys": [
+            {"column": "raw_material_id", "references_table": "master_raw_material", "references_column": "raw_material_id"}
+        ],
         "examples": [
             {"id":"1", "property": "Viscocity (cP)", "value":56.5,"raw_material_id":'H1'},
             {"id":"1", "property": "Purity (%)", "value":30.08,"raw_material_id":'H1'}
@@ -123,12 +117,9 @@ def get_table_metadata():
             {"name": "number_of_raw_materials_used", "type": "INT", "description": "The number of distinct raw materials included in the optimal recipe"},
             {"name": "product_id", "type": "INT", "description": "Product code for which the recipe optimization scenario was generated. Foreign key to master_product"}
         ],
-        "relationships": {
-        "Foreign Key":"links opt_scenario.product_id to master_product.product_id",
-        "Foreign Key":"links opt_scenario.scenario_id to opt_recipe.scenario_id",
-        "Foreign Key":"links opt_scenario.scenario_id to opt_recipe_properties.scenario_id",
-
-        },
+        "foreign_keys": [
+            {"column": "product_id", "references_table": "master_product", "references_column": "product_id"}
+        ],
         "examples": [
         {"scenario_id":"SC-1", "status": "Optimal", "user_approval":0,"what_if_from":None, "target_recipe_amount": 400,"total_cost":21355.97, "total_raw_material_cost": 19226.84, "total_process_cost":2129.13,"number_of_raw_materials_used":6, "product_id": "CH-001"},
         {"scenario_id":"SC-2", "status": "Optimal", "user_approval":1,"what_if_from":'SC-1', "target_recipe_amount": 400,"total_cost":21357.35, "total_raw_material_cost": 19228.74, "total_process_cost":2128.61,"number_of_raw_materials_used":5, "product_id": "CH-002"}
@@ -147,11 +138,10 @@ def get_table_metadata():
             {"name": "raw_material_id", "type": "INT", "description": "Identifier of the raw material used in the optimized recipe. Foreign key to master_raw_material"},
             {"name": "scenario_id", "type": "INT", "description": "Identifier of the optimization scenario to which this recipe composition belongs. Foreign key to opt_scenario"}
         ],
-        "relationships": {
-            
-            "Foreign Key":"links opt_recipe.raw_material_id to master_raw_material.raw_material_id",
-            "Foreign Key":"links opt_recipe.scenario_id to opt_scenario.scenario_id",
-            },
+        "foreign_keys": [
+            {"column": "raw_material_id", "references_table": "master_raw_material", "references_column": "raw_material_id"},
+            {"column": "scenario_id", "references_table": "opt_scenario", "references_column": "scenario_id"}
+        ],
         "examples": [
             {"record_id":"1", "recipe_quantity": 1, "recipe_percentage":0,"raw_material_id":'H1',"scenario_id":"SC-1"},
             {"record_id":"3", "recipe_quantity": 300, "recipe_percentage":0.13,"raw_material_id":'H1',"scenario_id":"SC-2"},
@@ -173,9 +163,9 @@ def get_table_metadata():
             {"name": "max_limit", "type": "INT", "description": "Max allowed value"},
             {"name": "scenario_id", "type": "INT", "description": "Identifier of the optimization scenario for which the property values were computed. Foreign key to opt_scenario"}
         ],
-        "relationships": {  
-        "Foreign Key":"links opt_recipe_properties.scenario_id to opt_scenario.scenario_id",
-        },
+        "foreign_keys": [
+            {"column": "scenario_id", "references_table": "opt_scenario", "references_column": "scenario_id"}
+        ],
 
         "examples": [
         {"record_id":"1", "property": "Viscocity (cP)", "value":56.52,"min_limit":56.5,"max_limit":58.5,"scenario_id":"SC-1"},
@@ -196,9 +186,7 @@ def get_table_metadata():
             {"name": "weather_lower_limit", "type": "INT", "description": "Min allowed temperature"},
             {"name": "weather_upper_limit", "type": "INT", "description": "Max allowed temperature"}
         ],
-        "relationships": {
-            "Foreign Key":"links master_location.location_city to master_raw_material.stock_location",
-        },
+        "foreign_keys": [],
         "examples": [
         {"location_id":"1", "location_city": "İstanbul", "location_latitude":32.52,"location_longitude":35.33,"weather_lower_limit":8,"weather_upper_limit":22},
         {"location_id":"3", "location_city": "Bursa", "location_latitude":29.52,"location_longitude":56.5,"weather_lower_limit":10,"weather_upper_limit":25},
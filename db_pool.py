@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# ============================================================
+# CONNECTION POOL
+# ============================================================
+# A small thread-safe pool for DB-API connections. Connections are
+# created lazily by a factory callable, health-checked when borrowed,
+# evicted after sitting idle too long, and always handed back through
+# the `connection()` context manager.
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the borrow timeout."""
+
+
+def default_health_check(conn) -> bool:
+    """Uses mysql-connector's is_connected() (a server ping) when available."""
+    check = getattr(conn, "is_connected", None)
+    return bool(check()) if callable(check) else True
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    def __init__(self, factory, size: int = 5, max_idle_seconds: float = 300.0,
+                 borrow_timeout: float = 30.0, health_check=default_health_check):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.factory = factory
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self.borrow_timeout = borrow_timeout
+        self.health_check = health_check
+
+        self._idle = deque()        # (conn, returned_at), most recent on the right
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._metrics = {
+            "borrows": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "borrow_seconds_total": 0.0,
+            "borrow_seconds_max": 0.0,
+            "created": 0,
+            "closed": 0,
+            "evicted_idle": 0,
+            "failed_health_checks": 0,
+            "timeouts": 0,
+        }
+
+    # --------------------------------------------------------
+    # Borrow / release
+    # --------------------------------------------------------
+    def acquire(self, timeout: float | None = None):
+        """Borrows a healthy connection, creating one if the pool has room."""
+        timeout = self.borrow_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                self._evict_idle_locked()
+
+                while not self._idle and self._in_use >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No connection available after {timeout:.1f}s "
+                            f"(pool size {self.size})."
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+                conn = self._idle.pop()[0] if self._idle else None
+                # Reserve the slot before doing any I/O outside the lock.
+                self._in_use += 1
+
+            try:
+                if conn is None:
+                    conn = self.factory()
+                    self._count("created")
+                elif not self._is_healthy(conn):
+                    self._count("failed_health_checks")
+                    self._count("closed")
+                    _close_quietly(conn)
+                    conn = self.factory()
+                    self._count("created")
+            except BaseException:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                m = self._metrics
+                m["borrows"] += 1
+                m["borrow_seconds_total"] += elapsed
+                m["borrow_seconds_max"] = max(m["borrow_seconds_max"], elapsed)
+                if waited:
+                    m["waits"] += 1
+                    m["wait_seconds"] += elapsed
+            return conn
+
+    def release(self, conn, discard: bool = False):
+        """Returns a connection to the pool, or closes it when discarded."""
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._metrics["closed"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            _close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        """
+        Borrows a connection for the duration of the block. It is always
+        released; if the block raised and the connection cannot even be
+        rolled back, it is discarded instead of going back to the pool.
+        """
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    # --------------------------------------------------------
+    # Maintenance
+    # --------------------------------------------------------
+    def evict_idle(self) -> int:
+        """Closes connections idle for longer than max_idle_seconds."""
+        with self._cond:
+            return self._evict_idle_locked()
+
+    def close(self):
+        """Closes all idle connections; borrowed ones are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._metrics["closed"] += len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            _close_quietly(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._metrics)
+            stats["size"] = self.size
+            stats["in_use"] = self._in_use
+            stats["idle"] = len(self._idle)
+        borrows = stats["borrows"]
+        stats["borrow_seconds_avg"] = (stats["borrow_seconds_total"] / borrows) if borrows else 0.0
+        return stats
+
+    # --------------------------------------------------------
+    # Internals
+    # --------------------------------------------------------
+    def _evict_idle_locked(self) -> int:
+        cutoff = time.monotonic() - self.max_idle_seconds
+        evicted = 0
+        # Oldest connections sit on the left.
+        while self._idle and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.popleft()
+            _close_quietly(conn)
+            evicted += 1
+        self._metrics["evicted_idle"] += evicted
+        self._metrics["closed"] += evicted
+        return evicted
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            return self.health_check(conn)
+        except Exception:
+            return False
+
+    def _count(self, key: str, n: int = 1):
+        with self._cond:
+            self._metrics[key] += n
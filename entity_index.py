@@ -0,0 +1,383 @@
+import contextlib
+import logging
+import math
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+
+from schema_graph import foreign_keys_from_metadata
+
+logger = logging.getLogger("txt2sql.entities")
+
+
+# ============================================================
+# ENTITY VALUE INDEX
+# ============================================================
+# Distinct values of the categorical columns (names, cities, suppliers,
+# ids such as CH-001 or H1) in memory, so mentions in the question can be
+# resolved to the exact stored value, and to the row's primary key, before
+# the SQL is written. The generator can then filter with = / IN, which
+# uses indexes, instead of a leading-wildcard LIKE that scans the table.
+#
+# Values are compared on a compact key (casefolded, letters and digits
+# only: "chem alloy b12" == "ChemAlloy B12", "ch001" == "CH-001"). Exact
+# keys are a dict lookup; near misses go through a character-trigram
+# inverted index and are accepted above a Dice-similarity threshold.
+
+DEFAULT_MAX_VALUES_PER_COLUMN = 10000
+DEFAULT_MIN_SCORE = 0.75
+DEFAULT_REFRESH_SECONDS = 900.0
+MAX_MENTION_WORDS = 4
+
+# Text column types; *_id and foreign-key columns are indexed whatever
+# their declared type (the metadata declares INT for 'CH-001' or 'Ankara').
+TEXT_TYPES = ("CHAR", "VARCHAR", "TEXT", "ENUM")
+
+# Words that never start or end a mention on their own.
+STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "at", "be", "by", "can",
+    "do", "does", "for", "from", "give", "has", "have", "how", "i", "in", "is",
+    "it", "its", "me", "much", "of", "on", "or", "show", "that", "the", "their",
+    "there", "these", "this", "to", "what", "when", "where", "which", "who", "with",
+}
+
+
+def compact(text: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", str(text).casefold())
+
+
+def _trigrams(key: str) -> set:
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def entity_keys(table_metadata: list) -> dict:
+    """
+    {table: primary key} for the tables whose primary key other tables
+    reference (product_id, raw_material_id, ...). Surrogate row ids such as
+    record_id identify nothing the question could be about.
+    """
+    referenced = {(fk.ref_table, fk.ref_column) for meta in table_metadata
+                  for fk in foreign_keys_from_metadata(meta)}
+    keys = {}
+    for meta in table_metadata:
+        for col in meta.get("columns", []):
+            if "primary key" in col.get("description", "").lower():
+                if (meta["table_name"], col["name"]) in referenced:
+                    keys[meta["table_name"]] = col["name"]
+                break
+    return keys
+
+
+def categorical_columns(table_metadata: list) -> dict:
+    """{table: [column, ...]}: text columns, *_id columns and foreign-key columns."""
+    keyed = {(fk.table, fk.column) for meta in table_metadata for fk in foreign_keys_from_metadata(meta)}
+    columns = {}
+    for meta in table_metadata:
+        names = []
+        for col in meta.get("columns", []):
+            kind = col.get("type", "").upper()
+            if (kind.startswith(TEXT_TYPES) or col["name"].endswith("_id")
+                    or (meta["table_name"], col["name"]) in keyed):
+                names.append(col["name"])
+        if names:
+            columns[meta["table_name"]] = names
+    return columns
+
+
+class EntityIndex:
+    def __init__(self):
+        # Entry i: values[i] stored in columns[column_of[i]] = (table, column,
+        # primary key or None); keys[i] is the primary key of the one row
+        # holding the value, None when several rows do. Parallel lists and
+        # arrays keep ~235k entries in tens of MB.
+        self.values = []
+        self.compacts = []
+        self.column_of = array("H")
+        self.gram_counts = array("H")
+        self.keys = []
+        self.columns = []
+        self._column_ids = {}
+        self.by_key = {}                    # compact key -> entry id, or list of ids
+        self.by_trigram = defaultdict(lambda: array("I"))   # trigram -> ascending entry ids
+        self.build_seconds = 0.0
+        self.built_at = 0.0
+        self.skipped_columns = []
+        self._lookups = 0
+        self._lookup_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _ids(self, key: str) -> list[int]:
+        found = self.by_key.get(key)
+        if found is None:
+            return []
+        return found if isinstance(found, list) else [found]
+
+    def add(self, table: str, column: str, value, key_value=None, pk: str | None = None):
+        key = compact(value)
+        if not key:
+            return
+        column_id = self._column_ids.get((table, column))
+        if column_id is None:
+            column_id = self._column_ids[(table, column)] = len(self.columns)
+            self.columns.append((table, column, pk))
+        for i in self._ids(key):
+            if self.column_of[i] == column_id:
+                # "Ankara" and "ankara": one entry, no longer a single row.
+                if self.keys[i] != key_value:
+                    self.keys[i] = None
+                return
+
+        entry_id = len(self.values)
+        grams = _trigrams(key)
+        self.values.append(value)
+        self.compacts.append(key)
+        self.column_of.append(column_id)
+        self.gram_counts.append(len(grams))
+        self.keys.append(key_value)
+        found = self.by_key.get(key)
+        if found is None:
+            self.by_key[key] = entry_id
+        elif isinstance(found, list):
+            found.append(entry_id)
+        else:
+            self.by_key[key] = [found, entry_id]
+        for gram in grams:
+            self.by_trigram[gram].append(entry_id)
+
+    def entry(self, entry_id: int) -> dict:
+        table, column, pk = self.columns[self.column_of[entry_id]]
+        key_value = self.keys[entry_id]
+        return {"value": self.values[entry_id], "table": table, "column": column,
+                "key": {pk: key_value} if pk and key_value is not None else {}}
+
+    @classmethod
+    def from_backend(cls, backend, table_metadata: list,
+                     max_values: int = DEFAULT_MAX_VALUES_PER_COLUMN,
+                     timeout_s: float = 0.0, slot=contextlib.nullcontext) -> "EntityIndex":
+        """
+        Reads the distinct values of every categorical column through an
+        execution backend, with the entity key of the row (entity_keys())
+        when exactly one row holds the value. Each column is one query
+        holding slot() and cut at timeout_s, reading at most max_values + 1
+        rows. Columns with more than max_values distinct values are free
+        text, not categories, and are skipped, as are columns whose query
+        timed out.
+        """
+        index = cls()
+        started = time.perf_counter()
+        primary_keys = entity_keys(table_metadata)
+        for table, columns in categorical_columns(table_metadata).items():
+            pk = primary_keys.get(table)
+            for column in columns:
+                with_key = pk and pk != column
+                keys = f", MIN(`{pk}`) AS pk, COUNT(DISTINCT `{pk}`) AS pk_rows" if with_key else ""
+                sql = (f"SELECT `{column}` AS value{keys} FROM `{table}` "
+                       f"WHERE `{column}` IS NOT NULL GROUP BY `{column}` LIMIT {max_values + 1}")
+                with slot():
+                    envelope = backend.execute(sql, max_rows=max_values + 1, count_limit=max_values + 1,
+                                               timeout_s=timeout_s)
+                if envelope.get("error_class") == "TimeoutError":
+                    logger.warning("Entity index: %s.%s skipped: %s", table, column, envelope["error"])
+                    index.skipped_columns.append(f"{table}.{column}")
+                    continue
+                if "error" in envelope:
+                    raise RuntimeError(f"{table}.{column}: {envelope['error']}")
+                rows = envelope["rows"]
+                if len(rows) > max_values:
+                    index.skipped_columns.append(f"{table}.{column}")
+                    continue
+                for row in rows:
+                    key_value = row["pk"] if with_key and row["pk_rows"] == 1 else None
+                    index.add(table, column, row["value"], key_value, pk if with_key else None)
+        index.build_seconds = time.perf_counter() - started
+        index.built_at = time.time()
+        return index
+
+    # --------------------------------------------------------
+    # Lookup
+    # --------------------------------------------------------
+    def match(self, text: str, min_score: float = DEFAULT_MIN_SCORE,
+              limit: int = 5) -> list[tuple[float, int]]:
+        """(score, entry id) for up to `limit` values matching text, best first."""
+        key = compact(text)
+        if len(key) < 2:
+            return []
+        exact = self._ids(key)
+        if exact:
+            return [(1.0, i) for i in exact]
+        if len(key) < 4:
+            return []
+
+        # Dice >= t needs at least t*q/(2-t) of the q query trigrams in
+        # common, so every match contains one of the q - that + 1 rarest
+        # trigrams: only their postings are read. The same bound limits
+        # the candidate's own trigram count.
+        grams = _trigrams(key)
+        q = len(grams)
+        needed = math.ceil(min_score * q / (2 - min_score))
+        shortest, longest = needed, int(q * (2 - min_score) / min_score)
+        postings = sorted((self.by_trigram[g] for g in grams if g in self.by_trigram), key=len)
+        if len(postings) < needed:
+            return []
+        candidates = set()
+        for ids in postings[:len(postings) - needed + 1]:
+            candidates.update(ids)
+
+        # Few candidates: compare their trigram sets. Many (thousands of
+        # "Viscosity N"): counting every posting in C is cheaper.
+        if len(candidates) > 64:
+            shared = Counter()
+            for ids in postings:
+                shared.update(ids)
+        else:
+            shared = None
+        matches = []
+        for i in candidates:
+            other = self.gram_counts[i]
+            if other < shortest or other > longest:
+                continue
+            common = shared[i] if shared is not None else len(grams & _trigrams(self.compacts[i]))
+            score = 2 * common / (q + other)
+            if score >= min_score:
+                matches.append((score, i))
+        matches.sort(key=lambda m: -m[0])
+        return matches[:limit]
+
+    def resolve(self, question: str, min_score: float = DEFAULT_MIN_SCORE) -> list[dict]:
+        """
+        Mentions in the question resolved to stored values:
+        [{"mention", "value", "table", "column", "key", "score"}], where key is
+        {primary key: value} when a single row holds the value. Longer and
+        better-scoring spans win; spans do not overlap.
+        """
+        started = time.perf_counter()
+        words = re.findall(r"[\w.\-]+", question)
+        candidates = []
+        for size in range(MAX_MENTION_WORDS, 0, -1):
+            for start in range(len(words) - size + 1):
+                span = words[start:start + size]
+                if span[0].lower() in STOPWORDS or span[-1].lower() in STOPWORDS:
+                    continue
+                for score, entry_id in self.match(" ".join(span), min_score):
+                    candidates.append((score, size, start, entry_id))
+
+        candidates.sort(key=lambda c: (-c[0], -c[1], c[2]))
+        taken = set()
+        span_scores = {}
+        resolved = []
+        for score, size, start, entry_id in candidates:
+            positions = set(range(start, start + size))
+            # An overlapping span is only kept when it is the same span with
+            # an equally good match (the same value in another column).
+            if positions & taken and span_scores.get((start, size)) != score:
+                continue
+            taken |= positions
+            span_scores[(start, size)] = score
+            resolved.append({
+                "mention": " ".join(words[start:start + size]),
+                **self.entry(entry_id),
+                "score": round(score, 3),
+            })
+        with self._lock:
+            self._lookups += 1
+            self._lookup_seconds += time.perf_counter() - started
+        return resolved
+
+    # --------------------------------------------------------
+    # Reporting
+    # --------------------------------------------------------
+    def memory_bytes(self) -> int:
+        """Approximate size of the index structures (containers and their strings)."""
+        seen = set()
+
+        def size(obj) -> int:
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            total = sys.getsizeof(obj)
+            if isinstance(obj, (int, float)) and -5 <= obj <= 256:
+                return 0    # shared small ints
+            if isinstance(obj, dict):
+                total += sum(size(k) + size(v) for k, v in obj.items())
+            elif isinstance(obj, (list, set, tuple)):
+                total += sum(size(v) for v in obj)
+            return total
+
+        return sum(size(part) for part in (self.values, self.compacts, self.column_of, self.gram_counts,
+                                           self.keys, self.columns, self.by_key, self.by_trigram))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups, seconds = self._lookups, self._lookup_seconds
+        return {
+            "entries": len(self.values),
+            "trigrams": len(self.by_trigram),
+            "build_seconds": self.build_seconds,
+            "memory_bytes": self.memory_bytes(),
+            "lookups": lookups,
+            "lookup_seconds_avg": seconds / lookups if lookups else 0.0,
+            "skipped_columns": list(self.skipped_columns),
+            "age_seconds": time.time() - self.built_at if self.built_at else None,
+        }
+
+
+class RefreshingEntityIndex:
+    """
+    Holds the current EntityIndex, always built on a background thread so
+    no request waits for it: get() returns None until the first build
+    finishes, and once the index is older than refresh_s it keeps
+    returning it while the replacement is built. start() begins the first
+    build ahead of time and wait() blocks until it is done. A failed build
+    leaves the previous index (or None) in place until refresh_s passes.
+    """
+
+    def __init__(self, build, refresh_s: float = DEFAULT_REFRESH_SECONDS):
+        self.build = build
+        self.refresh_s = refresh_s
+        self.index = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._failed_at = 0.0
+        self._built = threading.Event()
+
+    def _rebuild(self):
+        try:
+            index = self.build()
+            logger.info("Entity index: %d values in %.3fs", len(index), index.build_seconds)
+            self.index = index
+        except Exception as e:
+            logger.warning("Entity index build failed: %s", e)
+            self._failed_at = time.time()
+        finally:
+            with self._lock:
+                self._refreshing = False
+            self._built.set()
+
+    def start(self):
+        """Starts a build in the background unless one is running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._rebuild, name="entity-index-build", daemon=True).start()
+
+    def wait(self, timeout_s: float | None = None) -> EntityIndex | None:
+        """Waits up to timeout_s (None: no limit) for the first build to finish."""
+        self._built.wait(timeout_s)
+        return self.index
+
+    def get(self) -> EntityIndex | None:
+        index = self.index
+        now = time.time()
+        if index is not None and now - index.built_at < self.refresh_s:
+            return index
+        if now - self._failed_at >= self.refresh_s:
+            self.start()
+        return index
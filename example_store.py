@@ -0,0 +1,183 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from schema_retrieval import tokenize
+from sql_cache import normalize_question
+
+
+# ============================================================
+# FEW-SHOT EXAMPLE STORE
+# ============================================================
+# Every question/SQL pair the validator accepts is stored here, and the
+# generator prompt gets the few stored pairs most similar to the new
+# question instead of relying on one fixed example.
+#
+# Similarity is TF-IDF cosine over the normalized question words (the
+# same tokenizer as schema retrieval). The index lives in memory and is
+# rebuilt from SQLite after the store changes. Pairs are deduplicated by
+# normalized question and by SQL, capped at max_entries (least recently
+# retrieved evicted first) and dropped when the table metadata changes.
+
+DEFAULT_EXAMPLES_PATH = os.path.join(".cache", "few_shot_examples.sqlite3")
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_SCORE = 0.2
+
+
+def sql_fingerprint(sql: str) -> str:
+    """SQL with case, whitespace and a trailing ';' ignored, for deduplication."""
+    return re.sub(r"\s+", " ", sql.strip().rstrip(";")).lower()
+
+
+class ExampleStore:
+    def __init__(self, path: str = DEFAULT_EXAMPLES_PATH, schema_hash: str = "",
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.schema_hash = None
+        self.stats_counters = {"searches": 0, "retrieved": 0, "stores": 0,
+                               "duplicates": 0, "evicted": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+        self._index = None      # (keys, vectors, idf), rebuilt when None
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS examples (
+                key TEXT PRIMARY KEY,
+                question TEXT,
+                sql TEXT,
+                fingerprint TEXT,
+                created_at REAL,
+                last_used_at REAL,
+                uses INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS examples_fingerprint ON examples(fingerprint);
+            CREATE INDEX IF NOT EXISTS examples_last_used ON examples(last_used_at);
+        """)
+        self.set_schema_hash(schema_hash)
+
+    def key(self, question: str) -> str:
+        return normalize_question(question)
+
+    def add(self, question: str, sql: str) -> bool:
+        """Stores an accepted pair; False if the question or the SQL is already stored."""
+        key = self.key(question)
+        fingerprint = sql_fingerprint(sql)
+        now = time.time()
+        with self._lock:
+            duplicate = self._conn.execute(
+                "SELECT 1 FROM examples WHERE key = ? OR fingerprint = ?", (key, fingerprint)
+            ).fetchone()
+            if duplicate:
+                self.stats_counters["duplicates"] += 1
+                return False
+            self._conn.execute(
+                "INSERT INTO examples (key, question, sql, fingerprint, created_at, last_used_at, uses) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, question, sql, fingerprint, now, now),
+            )
+            self.stats_counters["stores"] += 1
+            self._evict_locked()
+            self._conn.commit()
+            self._index = None
+            return True
+
+    def search(self, question: str, k: int = DEFAULT_TOP_K,
+               min_score: float = DEFAULT_MIN_SCORE) -> list[dict]:
+        """Up to k stored pairs most similar to the question: [{"question", "sql", "score"}]."""
+        with self._lock:
+            self.stats_counters["searches"] += 1
+            if self._index is None:
+                self._index = self._build_index_locked()
+            keys, vectors, idf = self._index
+            query = self._vector(Counter(tokenize(self.key(question))), idf)
+            if not query or k <= 0:
+                return []
+
+            scored = []
+            for key, vector in zip(keys, vectors):
+                score = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+                if score >= min_score:
+                    scored.append((score, key))
+            scored.sort(key=lambda s: (-s[0], s[1]))
+
+            examples = []
+            now = time.time()
+            for score, key in scored[:k]:
+                question_text, sql = self._conn.execute(
+                    "SELECT question, sql FROM examples WHERE key = ?", (key,)
+                ).fetchone()
+                self._conn.execute(
+                    "UPDATE examples SET last_used_at = ?, uses = uses + 1 WHERE key = ?", (now, key)
+                )
+                examples.append({"question": question_text, "sql": sql, "score": round(score, 3)})
+            self._conn.commit()
+            self.stats_counters["retrieved"] += len(examples)
+            return examples
+
+    def _build_index_locked(self):
+        keys, documents = [], []
+        for key, in self._conn.execute("SELECT key FROM examples"):
+            keys.append(key)
+            documents.append(Counter(tokenize(key)))
+        df = Counter(term for doc in documents for term in doc)
+        n = len(documents)
+        idf = {term: math.log((n + 1) / (count + 1)) + 1.0 for term, count in df.items()}
+        return keys, [self._vector(doc, idf) for doc in documents], idf
+
+    @staticmethod
+    def _vector(term_counts: Counter, idf: dict) -> dict:
+        """L2-normalized TF-IDF weights; terms unknown to the index are dropped."""
+        weights = {t: c * idf[t] for t, c in term_counts.items() if t in idf}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {t: w / norm for t, w in weights.items()} if norm else {}
+
+    def _evict_locked(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM examples WHERE key IN "
+                "(SELECT key FROM examples ORDER BY last_used_at ASC LIMIT ?)",
+                (excess,),
+            )
+            self.stats_counters["evicted"] += excess
+
+    def clear(self):
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM examples")
+            self.stats_counters["invalidated"] += cur.rowcount
+            self._conn.commit()
+            self._index = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+        return stats
+
+    def set_schema_hash(self, schema_hash: str):
+        """Drops the stored SQL when the table metadata changed since it was written."""
+        # No hash says nothing about the schema: keep what is stored.
+        if not schema_hash or schema_hash == self.schema_hash:
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'schema_hash'").fetchone()
+            if row is not None and row[0] != schema_hash:
+                cur = self._conn.execute("DELETE FROM examples")
+                self.stats_counters["invalidated"] += cur.rowcount
+                self._index = None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_hash', ?)",
+                (schema_hash,),
+            )
+            self._conn.commit()
+            self.schema_hash = schema_hash
@@ -0,0 +1,124 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+
+# ============================================================
+# CONCURRENCY LIMITS
+# ============================================================
+# Graph nodes are synchronous and run in worker threads (also under
+# app.ainvoke), so the LLM and DB limits are thread semaphores. They are
+# unlimited until configured: set_limit() for the whole process (server
+# mode), limited() for the code run inside a block (run_agentic_batch).
+# A limited() scope is a context variable, like the run deadline below:
+# it covers the threads that run in the block's context (asyncio tasks,
+# run_in_executor calls given a context copy, speculative candidates), so
+# two batches at once, or a batch inside the server, each keep their own.
+
+class ConcurrencyLimit:
+    def __init__(self, name: str, max_concurrency: int | None = None):
+        self.name = name
+        self._base = (None, None)   # (max_concurrency, semaphore)
+        self._scoped = contextvars.ContextVar(f"txt2sql_{name}_limit", default=None)
+        self.set_limit(max_concurrency)
+
+    def _semaphore_for(self, max_concurrency: int | None):
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"{self.name} concurrency must be at least 1.")
+        return threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def _current(self) -> tuple:
+        scoped = self._scoped.get()
+        return scoped if scoped is not None else self._base
+
+    @property
+    def max_concurrency(self) -> int | None:
+        """The limit in force for the calling context; None means unlimited."""
+        return self._current()[0]
+
+    def set_limit(self, max_concurrency: int | None):
+        """Process-wide limit; None means unlimited. Only change this between runs."""
+        self._base = (max_concurrency, self._semaphore_for(max_concurrency))
+
+    @contextmanager
+    def limited(self, max_concurrency: int | None):
+        """
+        Applies max_concurrency, with a semaphore of its own, to the code
+        running in this context inside the block; other contexts keep
+        theirs. Scopes nest: the innermost one applies.
+        """
+        token = self._scoped.set((max_concurrency, self._semaphore_for(max_concurrency)))
+        try:
+            yield
+        finally:
+            self._scoped.reset(token)
+
+    @contextmanager
+    def slot(self):
+        """Holds a slot for the block; waits no longer than the run's deadline."""
+        semaphore = self._current()[1]
+        if semaphore is None:
+            check_deadline(f"taking a {self.name} slot")
+            yield
+            return
+        started = time.perf_counter()
+        timeout = remaining_s()
+        if not semaphore.acquire(timeout=max(0.0, timeout) if timeout is not None else None):
+            raise DeadlineExceeded(f"deadline passed waiting for a {self.name} slot")
+        metrics.increment(f"{self.name}_slot_wait_seconds", time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+llm_limit = ConcurrencyLimit("llm")
+db_limit = ConcurrencyLimit("db")
+
+
+# ============================================================
+# RUN DEADLINES
+# ============================================================
+# server.py gives each question a deadline. It is held in a context
+# variable while the graph runs (LangGraph runs sync nodes in the caller's
+# context; speculative candidates copy it), so the nodes can bound what
+# they wait for: slot waits above, statement timeouts (bounded_timeout)
+# and LLM streams (llm_stream.call_llm).
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+_deadline = contextvars.ContextVar("txt2sql_deadline", default=None)
+
+
+@contextmanager
+def run_deadline(deadline: float | None):
+    """Code inside the block runs against `deadline`, a time.perf_counter() value (None: no deadline)."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_s() -> float | None:
+    """Seconds left before the current run's deadline, None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.perf_counter()
+
+
+def check_deadline(doing: str):
+    remaining = remaining_s()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"deadline passed before {doing}")
+
+
+def bounded_timeout(timeout_s: float) -> float:
+    """timeout_s, cut down to the time left before the run's deadline."""
+    check_deadline("running the query")
+    remaining = remaining_s()
+    return timeout_s if remaining is None else min(timeout_s, remaining)
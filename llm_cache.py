@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+
+# ============================================================
+# CONTENT-ADDRESSED LLM RESPONSE CACHE
+# ============================================================
+# Both agents run at temperature 0, so the same model, parameters and
+# prompt give the same answer. Responses are stored in SQLite under the
+# SHA-256 of those three, survive restarts and reruns of a batch, and are
+# evicted least-recently-used once the stored responses exceed max_bytes.
+#
+# On disk the database runs in WAL mode and every thread gets its own
+# connection: readers never wait for each other or for a writer. An
+# in-memory cache (":memory:", for tests and benchmarks) is one connection
+# behind a lock.
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(".cache", "llm_responses.sqlite3")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Reads refresh last_used_at at most this often, so hot entries do not
+# turn every read into a write.
+TOUCH_INTERVAL_SECONDS = 60.0
+
+
+def response_key(model_id: str, params: dict | None, prompt: str) -> str:
+    header = json.dumps({"model_id": model_id, "params": params or {}},
+                        sort_keys=True, default=str)
+    return hashlib.sha256(f"{header}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path: str = DEFAULT_LLM_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats_counters = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memory_lock = threading.Lock() if path == ":memory:" else None
+        self._shared = self._connect()
+        self._shared.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT,
+                size INTEGER,
+                created_at REAL,
+                last_used_at REAL,
+                hits INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used_at);
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._memory_lock is not None:
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats_counters[name] += value
+
+    def _guard(self):
+        return self._memory_lock if self._memory_lock is not None else nullcontext()
+
+    def get(self, key: str) -> str | None:
+        with self._guard():
+            return self._get(key)
+
+    def _get(self, key: str) -> str | None:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT response, last_used_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        response, last_used_at = row
+        now = time.time()
+        if now - last_used_at > TOUCH_INTERVAL_SECONDS:
+            conn.execute("UPDATE responses SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            conn.commit()
+        self._count("hits")
+        return response
+
+    def put(self, key: str, response: str):
+        with self._guard():
+            self._put(key, response)
+
+    def _put(self, key: str, response: str):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used_at, hits) "
+            "VALUES (?, ?, ?, ?, ?, 0)",
+            (key, response, size, now, now),
+        )
+        conn.commit()
+        self._count("stores")
+        self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from the least recently used entry until enough bytes are freed.
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used_at ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        conn.commit()
+        self._count("evicted", len(victims))
+
+    def clear(self):
+        with self._guard():
+            conn = self._conn()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats_counters)
+        with self._guard():
+            entries, size = self._conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        stats["entries"] = entries
+        stats["bytes"] = size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] / lookups) if lookups else 0.0
+        return stats
+
+
+class CachedLLM:
+    """
+    Wraps an LLM client (anything with invoke(prompt) and, like WatsonxLLM,
+    model_id and params attributes) with an LLMResponseCache. Calls with a
+    non-zero temperature are sampled and go straight to the client.
+    """
+
+    def __init__(self, llm, cache: LLMResponseCache):
+        self.llm = llm
+        self.cache = cache
+
+    def _params(self, kwargs: dict) -> dict:
+        params = dict(getattr(self.llm, "params", None) or {})
+        params.update(kwargs.get("params") or {})
+        if kwargs.get("stop"):
+            params["stop_sequences"] = list(kwargs["stop"])
+        return params
+
+    @staticmethod
+    def _sampled(params: dict) -> bool:
+        return bool(params.get("temperature", 0)) or params.get("decoding_method") == "sample"
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        params = self._params(kwargs)
+        if self._sampled(params):
+            return self.llm.invoke(prompt, **kwargs)
+
+        key = response_key(getattr(self.llm, "model_id", ""), params, prompt)
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        response = self.llm.invoke(prompt, **kwargs)
+        self.cache.put(key, response)
+        return response
+
+    def stream(self, prompt: str, complete=None, **kwargs):
+        """
+        Yields the cached response as one chunk, or streams from the client.
+        Only a finished stream is stored, or one the caller closed once
+        complete(text so far) returned the usable output (llm_stream's
+        early stop): an identical call then stops at the same point. A
+        stream abandoned for any other reason (deadline, error) is not
+        stored, since its text is cut short.
+        """
+        if not hasattr(self.llm, "stream"):
+            yield self.invoke(prompt, **kwargs)
+            return
+        params = self._params(kwargs)
+        if self._sampled(params):
+            yield from self.llm.stream(prompt, **kwargs)
+            return
+
+        key = response_key(getattr(self.llm, "model_id", ""), params, prompt)
+        response = self.cache.get(key)
+        if response is not None:
+            yield response
+            return
+        chunks = []
+        try:
+            for chunk in self.llm.stream(prompt, **kwargs):
+                chunks.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            text = "".join(chunks)
+            if complete is not None and complete(text) is not None:
+                self.cache.put(key, text)
+            raise
+        self.cache.put(key, "".join(chunks))
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
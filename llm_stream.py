@@ -0,0 +1,203 @@
+import json
+import os
+import time
+
+import metrics
+from limits import check_deadline
+from llm_cache import CachedLLM
+from metrics import estimate_tokens
+
+
+# ============================================================
+# STREAMED LLM CALLS WITH EARLY STOP
+# ============================================================
+# The agents only use the first SQL statement or JSON object the model
+# writes; anything after it (explanations, a second variant) is paid for
+# and thrown away. call_llm() streams the completion, watches it with a
+# detector and closes the stream as soon as the usable part is complete,
+# which ends generation on the server.
+#
+# Each node also gets its own token budget and stop sequences instead of
+# the client-wide MAX_NEW_TOKENS, overridable per node with
+# LLM_MAX_NEW_TOKENS_<NODE> and LLM_STOP_<NODE> (a JSON list).
+
+NODE_DEFAULTS = {
+    "generator": {"max_new_tokens": 1024, "stop": ["\n\nExplanation", "\n\n**Explanation"]},
+    "repair": {"max_new_tokens": 1024, "stop": ["\n\nExplanation", "\n\n**Explanation"]},
+    "validator": {"max_new_tokens": 512, "stop": ["\n\nExplanation", "\n\n**Explanation"]},
+}
+
+
+def node_settings(node: str) -> dict:
+    """{"max_new_tokens", "stop"} for the node, with environment overrides."""
+    defaults = NODE_DEFAULTS.get(node, NODE_DEFAULTS["generator"])
+    stop = os.getenv(f"LLM_STOP_{node.upper()}")
+    return {
+        "max_new_tokens": int(os.getenv(f"LLM_MAX_NEW_TOKENS_{node.upper()}", defaults["max_new_tokens"])),
+        "stop": json.loads(stop) if stop else list(defaults["stop"]),
+    }
+
+
+# ------------------------------------------------------------
+# Completion detectors: usable text, or None while incomplete
+# ------------------------------------------------------------
+def _scan_sql(text: str, start: int):
+    """Index of the first ';' at top level outside quotes and comments, else None."""
+    quote = None
+    depth = 0
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in ("'", '"', "`"):
+            quote = ch
+        elif text.startswith("--", i) or ch == "#":
+            end = text.find("\n", i)
+            if end < 0:
+                return None
+            i = end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end < 0:
+                return None
+            i = end + 1
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == ";" and depth <= 0:
+            return i
+        i += 1
+    return None
+
+
+def complete_sql(text: str) -> str | None:
+    """
+    The SQL once one statement is complete: a fenced block whose closing
+    fence arrived, or a statement ended by a top-level ';'.
+    """
+    fence = text.find("```")
+    if fence >= 0:
+        body_start = text.find("\n", fence)
+        if body_start < 0:
+            return None
+        closing = text.find("```", body_start)
+        semicolon = _scan_sql(text, body_start + 1)
+        if semicolon is not None and (closing < 0 or semicolon < closing):
+            return text[body_start + 1:semicolon + 1].strip()
+        if closing >= 0:
+            return text[body_start + 1:closing].strip()
+        return None
+    semicolon = _scan_sql(text, 0)
+    return text[:semicolon + 1].strip() if semicolon is not None else None
+
+
+def complete_json(text: str) -> str | None:
+    """The first JSON object once its braces balance (strings and escapes respected)."""
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+# ------------------------------------------------------------
+# Calls
+# ------------------------------------------------------------
+def call_llm(llm, prompt: str, node: str, detector=None, streaming: bool = True) -> str:
+    """
+    Runs the prompt with the node's token budget and stop sequences. With
+    streaming (and a client that has stream()), stops reading as soon as
+    detector(text) returns the usable output and returns that; otherwise
+    returns the whole completion.
+
+    Counts per node: llm_{node}_calls, _early_stops, _completion_tokens
+    (received) and _first_usable_seconds (prompt sent to usable output).
+
+    Raises limits.DeadlineExceeded when the run's deadline has passed
+    before the call or between streamed chunks (the stream is closed).
+    """
+    settings = node_settings(node)
+    params = dict(getattr(llm, "params", None) or {})
+    params["max_new_tokens"] = settings["max_new_tokens"]
+    kwargs = {"params": params, "stop": settings["stop"]}
+
+    started = time.perf_counter()
+    check_deadline(f"the {node} LLM call")
+    metrics.increment(f"llm_{node}_calls")
+    if not streaming or detector is None or not hasattr(llm, "stream"):
+        response = llm.invoke(prompt, **kwargs)
+        metrics.increment(f"llm_{node}_first_usable_seconds", time.perf_counter() - started)
+        metrics.increment(f"llm_{node}_completion_tokens", estimate_tokens(response))
+        # Responses cached from an early-stopped stream end mid-fence.
+        usable = detector(response) if detector is not None else None
+        return usable if usable is not None else response
+
+    received = []
+    usable = None
+    # A CachedLLM stores an early-stopped stream only if the detector
+    # accepts it, never one cut short by the deadline or an error.
+    if isinstance(llm, CachedLLM):
+        stream = llm.stream(prompt, complete=detector, **kwargs)
+    else:
+        stream = llm.stream(prompt, **kwargs)
+    try:
+        for chunk in stream:
+            received.append(chunk)
+            usable = detector("".join(received))
+            if usable is not None:
+                break
+            check_deadline(f"the {node} LLM call finished")
+    finally:
+        # Closing the generator closes the HTTP stream: generation stops.
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+    text = "".join(received)
+    metrics.increment(f"llm_{node}_first_usable_seconds", time.perf_counter() - started)
+    metrics.increment(f"llm_{node}_completion_tokens", estimate_tokens(text))
+    if usable is None:
+        return text
+    metrics.increment(f"llm_{node}_early_stops")
+    return usable
+
+
+def streaming_stats(nodes=("generator", "repair", "validator")) -> dict:
+    """Per node: calls, early-stop rate, mean received tokens and time to usable output."""
+    counters = metrics.get_counters()
+    stats = {}
+    for node in nodes:
+        calls = counters.get(f"llm_{node}_calls", 0)
+        if not calls:
+            continue
+        stats[node] = {
+            "calls": calls,
+            "early_stop_rate": counters.get(f"llm_{node}_early_stops", 0) / calls,
+            "completion_tokens_avg": counters.get(f"llm_{node}_completion_tokens", 0) / calls,
+            "first_usable_seconds_avg": counters.get(f"llm_{node}_first_usable_seconds", 0) / calls,
+        }
+    return stats
@@ -0,0 +1,30 @@
+import re
+import threading
+from collections import Counter
+
+
+# ============================================================
+# PROCESS-WIDE COUNTERS
+# ============================================================
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def increment(name: str, value: float = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def get_counters() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def reset_counters():
+    with _lock:
+        _counters.clear()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: words and punctuation marks."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
@@ -0,0 +1,89 @@
+import re
+from typing import NamedTuple
+
+
+# ============================================================
+# RULE-BASED RESULT RELEVANCE
+# ============================================================
+# The validator prompt's relevance rules are keyword -> required column
+# mappings. When a result ran cleanly, has rows and carries every column
+# those rules ask for, the LLM validator has nothing left to decide and is
+# skipped. Anything the rules cannot judge goes to the LLM.
+
+class RelevanceRule(NamedTuple):
+    name: str
+    pattern: re.Pattern
+    # At least one of these columns must be present in the result.
+    any_of: tuple
+
+
+def _rule(name: str, pattern: str, *columns: str) -> RelevanceRule:
+    return RelevanceRule(name, re.compile(pattern, re.IGNORECASE), tuple(columns))
+
+
+# Mirrors "### 2. RESULT RELEVANCE" in validator_agent's prompt.
+RULES = [
+    _rule("stock", r"\b(stock|inventory|shortages?)\b", "stock_quantity", "stock"),
+    _rule("recipe usage", r"\brecipe (usage|quantity|quantities|percentage|share)\b",
+          "recipe_quantity", "recipe_percentage"),
+    _rule("scenario", r"\bscenarios?\b|\bSC-\d+\b", "scenario_id"),
+    _rule("cost", r"\b(cost|costs|costing)\b",
+          "unit_cost", "total_cost", "total_raw_material_cost", "total_process_cost", "unit_process_cost"),
+    _rule("price", r"\bprices?\b", "price"),
+]
+
+# Questions about property values (density, moisture, viscosity, ...) need
+# rows for specific properties, which only the LLM can judge.
+AMBIGUOUS = re.compile(
+    r"\b(density|moisture|viscocity|viscosity|purity|ph|propert(y|ies)|compare|why|explain)\b",
+    re.IGNORECASE,
+)
+
+# Column names too generic to imply a requirement on their own.
+GENERIC_COLUMNS = {"id", "record_id", "value", "property", "status"}
+
+
+def schema_rules(table_metadata: list) -> list[RelevanceRule]:
+    """One rule per multi-word column name, e.g. "process type" -> process_type."""
+    rules = {}
+    for meta in table_metadata:
+        for col in meta.get("columns", []):
+            name = col["name"].lower()
+            words = name.split("_")
+            if name in GENERIC_COLUMNS or len(words) < 2 or words[-1] == "id":
+                continue
+            pattern = r"\b" + r"[\s_]+".join(map(re.escape, words)) + r"s?\b"
+            rules.setdefault(name, _rule(name, pattern, name))
+    return list(rules.values())
+
+
+def result_columns(result: list, result_meta: dict | None) -> set:
+    columns = {c["name"].lower() for c in (result_meta or {}).get("columns", [])}
+    if not columns and result and isinstance(result[0], dict):
+        columns = {k.lower() for k in result[0]}
+    return columns
+
+
+def fast_validate(question: str, result: list, result_meta: dict | None = None,
+                  rules: list[RelevanceRule] | None = None) -> tuple[bool, str]:
+    """
+    Returns (accepted, reason). accepted is True only when the result
+    clearly passes: no error, at least one row, at least one rule applies
+    and every applicable rule's columns are present.
+    """
+    result_meta = result_meta or {}
+    if result_meta.get("error") or (result and isinstance(result[0], dict) and "error" in result[0]):
+        return False, "query returned an error"
+    if not result:
+        return False, "no rows"
+    if AMBIGUOUS.search(question):
+        return False, "question needs semantic judgement"
+
+    columns = result_columns(result, result_meta)
+    matched = [r for r in (rules if rules is not None else RULES) if r.pattern.search(question)]
+    if not matched:
+        return False, "no relevance rule applies"
+    missing = [r.name for r in matched if not any(c in columns for c in r.any_of)]
+    if missing:
+        return False, f"missing columns for: {', '.join(missing)}"
+    return True, f"rules satisfied: {', '.join(r.name for r in matched)}"
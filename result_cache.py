@@ -0,0 +1,248 @@
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+# ============================================================
+# QUERY RESULT CACHE
+# ============================================================
+# Retries, speculative candidates and repeated dashboard questions often
+# run exactly the same SELECT. Result envelopes are kept in memory under
+# the canonical form of the SQL, so those repeats skip the database:
+#
+#   - canonical form: parsed with sqlglot and printed back, so whitespace,
+#     keyword and identifier case (except output column names), comments
+#     and quoting do not matter, and table aliases are renamed t0, t1, ...
+#     in order of appearance
+#   - each entry remembers the version of every table it read
+#     (ExecutionBackend.table_versions(): MySQL UPDATE_TIME, replica load
+#     version) and is dropped when one of them changed; versions are
+#     polled at most every version_ttl_s, which bounds how stale a hit
+#     can be. bump(table) invalidates at once, e.g. after an ETL load.
+#   - a table without a known version (the backend returned None, or the
+#     poll failed) makes the query uncacheable: nothing is served or
+#     stored for it until the version is known again
+#   - bounded by max_bytes (JSON size of the envelopes), least recently
+#     used evicted first
+#
+# Queries calling NOW(), RAND() and similar functions, and error
+# envelopes, are never cached.
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_VERSION_TTL_SECONDS = 5.0
+
+NON_DETERMINISTIC = {
+    "now", "sysdate", "curdate", "curtime", "current_date", "current_time", "current_timestamp",
+    "currentdate", "currenttime", "currenttimestamp", "localtime", "localtimestamp",
+    "utc_date", "utc_time", "utc_timestamp", "unix_timestamp", "rand", "random", "uuid",
+    "uuid_short", "connection_id", "last_insert_id", "found_rows", "row_count", "user",
+    "current_user", "database", "sleep",
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def canonical_sql(sql_query: str, dialect: str = "mysql") -> tuple[str, frozenset] | None:
+    """
+    (canonical SQL, tables read) for a cacheable SELECT, None if the query
+    does not parse, is not a single SELECT or is not deterministic.
+    """
+    import sqlglot
+    from sqlglot import exp
+
+    try:
+        statements = [s for s in sqlglot.parse(sql_query, read=dialect) if s is not None]
+    except Exception:
+        return None
+    if len(statements) != 1 or not isinstance(statements[0], (exp.Select, exp.Union, exp.Intersect, exp.Except)):
+        return None
+    tree = statements[0].copy()
+
+    for func in tree.find_all(exp.Func):
+        name = (func.name if isinstance(func, exp.Anonymous) else func.sql_name()).lower()
+        if name in NON_DETERMINISTIC:
+            return None
+    ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    tables = frozenset(t.name.lower() for t in tree.find_all(exp.Table) if t.name.lower() not in ctes)
+
+    # MySQL identifiers are case-insensitive apart from table names on some
+    # file systems; only the output column names keep their case, because
+    # they become the keys of the result rows.
+    first = tree
+    while isinstance(first, (exp.Union, exp.Intersect, exp.Except)):
+        first = first.left
+    output_names = set()
+    for projection in getattr(first, "expressions", []):
+        if isinstance(projection, exp.Alias):
+            output_names.add(id(projection.args["alias"]))
+        elif isinstance(projection, exp.Column):
+            output_names.add(id(projection.this))
+    for identifier in tree.find_all(exp.Identifier):
+        identifier.set("quoted", False)
+        if id(identifier) not in output_names:
+            identifier.set("this", identifier.name.lower())
+
+    # Table aliases are invisible in the result, so `p` and `prod` agree.
+    aliases = {}
+    for table in tree.find_all(exp.Table):
+        if table.alias and table.alias.lower() not in aliases:
+            aliases[table.alias.lower()] = f"t{len(aliases)}"
+    if aliases:
+        for table in tree.find_all(exp.Table):
+            if table.alias:
+                table.set("alias", exp.TableAlias(this=exp.to_identifier(aliases[table.alias.lower()])))
+        for column in tree.find_all(exp.Column):
+            if column.table and column.table.lower() in aliases:
+                column.set("table", exp.to_identifier(aliases[column.table.lower()]))
+
+    return tree.sql(dialect=dialect, comments=False), tables
+
+
+def envelope_size(envelope: dict) -> int:
+    return len(json.dumps(envelope, default=str).encode("utf-8"))
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES,
+                 version_ttl_s: float = DEFAULT_VERSION_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.version_ttl_s = version_ttl_s
+        self.bytes = 0
+        self.stats_counters = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0,
+                               "evicted": 0, "invalidated": 0, "too_large": 0,
+                               "unversioned": 0}
+        # key -> (envelope, {table: version}, size)
+        self._entries = OrderedDict()
+        self._by_table = {}         # table -> set(keys)
+        self._bumps = {}            # table -> explicit bump counter
+        self._polled = {}           # (backend name, table) -> (version, polled_at)
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------------
+    # Versions
+    # --------------------------------------------------------
+    def _versions(self, backend, tables: frozenset) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            stale = [t for t in tables
+                     if now - self._polled.get((backend.name, t), (None, float("-inf")))[1] > self.version_ttl_s]
+        if stale:
+            polled = backend.table_versions(sorted(stale))
+            metrics.increment("result_cache_version_polls")
+            with self._lock:
+                for table in stale:
+                    self._polled[(backend.name, table)] = (polled.get(table), now)
+        with self._lock:
+            return {t: (self._polled[(backend.name, t)][0], self._bumps.get(t, 0)) for t in tables}
+
+    def bump(self, *tables: str):
+        """Marks tables as changed: entries that read them are dropped now."""
+        with self._lock:
+            for table in tables:
+                table = table.lower()
+                self._bumps[table] = self._bumps.get(table, 0) + 1
+                for key in list(self._by_table.get(table, ())):
+                    self._drop_locked(key)
+                    self.stats_counters["invalidated"] += 1
+
+    # --------------------------------------------------------
+    # Lookup and store
+    # --------------------------------------------------------
+    def _lookup(self, backend, sql_query: str, params: tuple):
+        """
+        (key, tables, versions, cached envelope or None); key is None when
+        the query is uncacheable, with versions {} unless the reason is a
+        table without a known version.
+        """
+        canonical = canonical_sql(sql_query, "mysql")
+        if canonical is None:
+            return None, frozenset(), {}, None
+        text, tables = canonical
+        key = hashlib.sha256(json.dumps([backend.name, text, params], default=str).encode("utf-8")).hexdigest()
+        versions = self._versions(backend, tables)
+        with self._lock:
+            if any(version is None for version, _ in versions.values()):
+                # Changes cannot be detected without a version.
+                if key in self._entries:
+                    self._drop_locked(key)
+                    self.stats_counters["invalidated"] += 1
+                return None, tables, versions, None
+            entry = self._entries.get(key)
+            if entry is None:
+                return key, tables, versions, None
+            if entry[1] != versions:
+                self._drop_locked(key)
+                self.stats_counters["invalidated"] += 1
+                return key, tables, versions, None
+            self._entries.move_to_end(key)
+            self.stats_counters["hits"] += 1
+            return key, tables, versions, {**entry[0], "result_cache": "hit"}
+
+    def peek(self, backend, sql_query: str, *params) -> dict | None:
+        """The cached envelope, or None (not counted as a miss)."""
+        return self._lookup(backend, sql_query, params)[3]
+
+    def get_or_execute(self, backend, sql_query: str, execute, *params) -> dict:
+        """
+        The cached envelope for the query on this backend with these
+        execution parameters, else execute() and cache its envelope.
+        Hits carry "result_cache": "hit" in the envelope.
+        """
+        key, tables, versions, cached = self._lookup(backend, sql_query, params)
+        if cached is not None:
+            return cached
+        with self._lock:
+            if key is not None:
+                self.stats_counters["misses"] += 1
+            else:
+                self.stats_counters["unversioned" if versions else "uncacheable"] += 1
+        envelope = execute()
+        if key is None or envelope.get("error"):
+            return envelope
+
+        # Stored under the versions read before executing: a change while
+        # the query ran makes the entry stale on its next lookup.
+        size = envelope_size(envelope)
+        with self._lock:
+            if size > self.max_bytes:
+                self.stats_counters["too_large"] += 1
+                return envelope
+            if key in self._entries:
+                self._drop_locked(key)
+            self._entries[key] = (envelope, versions, size)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            self.bytes += size
+            self.stats_counters["stores"] += 1
+            while self.bytes > self.max_bytes:
+                self._drop_locked(next(iter(self._entries)))
+                self.stats_counters["evicted"] += 1
+        return envelope
+
+    def _drop_locked(self, key: str):
+        envelope, versions, size = self._entries.pop(key)
+        self.bytes -= size
+        for table in versions:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._polled.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self.bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,225 @@
+import datetime
+import decimal
+import functools
+from collections import Counter
+
+
+# ============================================================
+# RESULT PROFILER
+# ============================================================
+# Turns result rows into columns and summarises each one in bulk: null
+# count, distinct count, min/max and the most frequent values. The
+# validator sees this fixed-size profile plus a few sample rows instead of
+# the rows themselves, so its prompt does not grow with the result.
+#
+# Uses NumPy when installed (imported on first use); otherwise the same
+# profile is computed with plain Python.
+#
+# StreamingProfile builds the same profile while the executor reads the
+# cursor, without keeping the rows: per column it keeps counts of at most
+# MAX_TRACKED_VALUES distinct values (later new values are no longer
+# counted and "distinct" becomes a lower bound, flagged by
+# "distinct_exact": false) and running numeric min/max.
+
+DEFAULT_TOP_VALUES = 3
+DEFAULT_SAMPLE_ROWS = 5
+MAX_VALUE_CHARS = 60
+MAX_TRACKED_VALUES = 1000
+
+NUMERIC_TYPES = (int, float, decimal.Decimal)
+
+
+def _short(value):
+    """JSON-friendly, length-capped value for the prompt."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    text = value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 3] + "..."
+
+
+@functools.cache
+def _numpy():
+    try:
+        import numpy
+    except ImportError:     # optional: pure-Python fallback below
+        return None
+    return numpy
+
+
+def to_columns(rows: list, column_names: list[str] | None = None) -> dict:
+    """{column: [values]} from dict or tuple rows."""
+    if not rows:
+        return {name: [] for name in column_names or []}
+    if column_names is None:
+        column_names = list(rows[0].keys()) if isinstance(rows[0], dict) else [str(i) for i in range(len(rows[0]))]
+    if isinstance(rows[0], dict):
+        return {name: [row.get(name) for row in rows] for name in column_names}
+    return {name: [row[i] for row in rows] for i, name in enumerate(column_names)}
+
+
+def _profile_numpy(values: list, top_values: int) -> dict:
+    np = _numpy()
+    present = [v for v in values if v is not None]
+    nulls = len(values) - len(present)
+    if not present:
+        return {"nulls": nulls, "distinct": 0, "min": None, "max": None, "top": []}
+
+    if all(isinstance(v, NUMERIC_TYPES) and not isinstance(v, bool) for v in present):
+        array = np.asarray(present, dtype=np.float64)
+        low = _short(present[int(array.argmin())])
+        high = _short(present[int(array.argmax())])
+        uniques, counts = np.unique(array, return_counts=True)
+        as_value = lambda u: int(u) if float(u).is_integer() else float(u)
+    else:
+        array = np.asarray([_short(v) if not isinstance(v, str) else v for v in present], dtype=str)
+        uniques, counts = np.unique(array, return_counts=True)
+        low, high = _short(str(uniques[0])), _short(str(uniques[-1]))
+        as_value = lambda u: _short(str(u))
+
+    # Most frequent first; ties keep value order (np.unique sorts values).
+    order = np.argsort(-counts, kind="stable")[:top_values]
+    return {
+        "nulls": nulls,
+        "distinct": int(len(uniques)),
+        "min": low,
+        "max": high,
+        "top": [[as_value(uniques[i]), int(counts[i])] for i in order],
+    }
+
+
+def _profile_python(values: list, top_values: int) -> dict:
+    present = [v for v in values if v is not None]
+    nulls = len(values) - len(present)
+    if not present:
+        return {"nulls": nulls, "distinct": 0, "min": None, "max": None, "top": []}
+
+    if not all(isinstance(v, NUMERIC_TYPES) and not isinstance(v, bool) for v in present):
+        present = [v if isinstance(v, str) else str(_short(v)) for v in present]
+    counts = Counter(present)
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_values]
+    return {
+        "nulls": nulls,
+        "distinct": len(counts),
+        "min": _short(min(counts)),
+        "max": _short(max(counts)),
+        "top": [[_short(value), count] for value, count in ranked],
+    }
+
+
+def profile_column(values: list, top_values: int = DEFAULT_TOP_VALUES) -> dict:
+    if _numpy() is not None:
+        return _profile_numpy(values, top_values)
+    return _profile_python(values, top_values)
+
+
+def profile_result(rows: list, columns: list[dict] | None = None,
+                   top_values: int = DEFAULT_TOP_VALUES) -> dict:
+    """
+    Profile of the rows:
+
+    {
+        "profiled_rows": number of rows the statistics cover,
+        "columns": [{"name", "type", "nulls", "distinct", "min", "max",
+                     "top": [[value, count], ...]}],
+    }
+
+    columns is the envelope's [{"name", "type"}] list; without it the names
+    come from the first row.
+    """
+    names = [c["name"] for c in columns] if columns else None
+    types = {c["name"]: c.get("type", "") for c in columns or []}
+    profiled = []
+    for name, values in to_columns(rows, names).items():
+        profiled.append({"name": name, "type": types.get(name, ""), **profile_column(values, top_values)})
+    return {"profiled_rows": len(rows), "columns": profiled}
+
+
+class _ColumnCounts:
+    __slots__ = ("nulls", "counts", "numeric", "low", "high", "capped")
+
+    def __init__(self):
+        self.nulls = 0
+        self.counts = Counter()
+        self.numeric = True
+        self.low = self.high = None
+        self.capped = False
+
+    def add(self, value, max_tracked: int):
+        if value is None:
+            self.nulls += 1
+            return
+        if self.numeric:
+            if isinstance(value, NUMERIC_TYPES) and not isinstance(value, bool):
+                if self.low is None or value < self.low:
+                    self.low = value
+                if self.high is None or value > self.high:
+                    self.high = value
+            else:
+                self.numeric = False
+        if value in self.counts or len(self.counts) < max_tracked:
+            self.counts[value] += 1
+        else:
+            self.capped = True
+
+    def profile(self, top_values: int) -> dict:
+        if not self.counts:
+            return {"nulls": self.nulls, "distinct": 0, "min": None, "max": None, "top": []}
+        counts = self.counts
+        if self.numeric:
+            low, high = self.low, self.high
+        else:
+            # Same text form as _profile_python for mixed columns.
+            counts = Counter()
+            for value, count in self.counts.items():
+                counts[value if isinstance(value, str) else str(_short(value))] += count
+            low, high = min(counts), max(counts)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_values]
+        profile = {
+            "nulls": self.nulls,
+            "distinct": len(counts),
+            "min": _short(low),
+            "max": _short(high),
+            "top": [[_short(value), count] for value, count in ranked],
+        }
+        if self.capped:
+            profile["distinct_exact"] = False
+        return profile
+
+
+class StreamingProfile:
+    """profile_result() computed one row at a time: add(row) per row, then result()."""
+
+    def __init__(self, columns: list[dict], top_values: int = DEFAULT_TOP_VALUES,
+                 max_tracked: int = MAX_TRACKED_VALUES):
+        self.columns = columns
+        self.names = [c["name"] for c in columns]
+        self.top_values = top_values
+        self.max_tracked = max_tracked
+        self.rows = 0
+        self._counts = [_ColumnCounts() for _ in self.names]
+
+    def add(self, row):
+        values = [row.get(name) for name in self.names] if isinstance(row, dict) else row
+        for counts, value in zip(self._counts, values):
+            counts.add(value, self.max_tracked)
+        self.rows += 1
+
+    def result(self) -> dict:
+        profiled = [
+            {"name": c["name"], "type": c.get("type", ""), **counts.profile(self.top_values)}
+            for c, counts in zip(self.columns, self._counts)
+        ]
+        return {"profiled_rows": self.rows, "columns": profiled}
+
+
+def sample_rows(rows: list, count: int = DEFAULT_SAMPLE_ROWS) -> list:
+    """The first rows with long values shortened."""
+    sample = []
+    for row in rows[:count]:
+        if isinstance(row, dict):
+            sample.append({k: _short(v) for k, v in row.items()})
+        else:
+            sample.append([_short(v) for v in row])
+    return sample
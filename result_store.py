@@ -0,0 +1,120 @@
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+
+
+# ============================================================
+# OUT-OF-BAND RESULT STORE
+# ============================================================
+# LangGraph copies the graph state at every node transition and writes it
+# to the checkpointer, so GraphState does not carry result rows. The
+# executor puts each result envelope here and keeps only its handle in
+# the state; the validator and the final answer read it back by handle.
+#
+# Rows are kept column-wise (one list per column, no per-row dict), the
+# store is bounded by max_bytes with least recently used results evicted
+# first, and a run releases its previous result when it stores a new one.
+# An evicted handle, or one from before a restart (resumed runs), reads
+# as None: the caller re-executes the SQL (txt2sql.state_result).
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SIZE_SAMPLE = 256
+
+
+class ColumnarResult:
+    __slots__ = ("columns", "data", "meta", "size")
+
+    def __init__(self, envelope: dict):
+        rows = envelope.get("rows") or []
+        self.meta = {k: v for k, v in envelope.items() if k != "rows"}
+        names = rows[0].keys() if rows and isinstance(rows[0], dict) else None
+        if names and all(isinstance(r, dict) and r.keys() == names for r in rows):
+            self.columns = tuple(names)
+            self.data = tuple([r[n] for r in rows] for n in self.columns)
+        else:
+            # Ragged rows (error rows, ...) are kept as they are.
+            self.columns = None
+            self.data = list(rows)
+        self.size = self._estimate_size()
+
+    def _estimate_size(self) -> int:
+        """Approximate bytes, extrapolated from the first SIZE_SAMPLE values of each column (or rows)."""
+        size = sys.getsizeof(self.meta) + sys.getsizeof(self.data)
+        if self.columns is None:
+            sample = self.data[:SIZE_SAMPLE]
+            sampled = sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values())
+                          for r in sample if isinstance(r, dict))
+            return size + (sampled * len(self.data) // len(sample) if sample else 0)
+        for column in self.data:
+            sample = column[:SIZE_SAMPLE]
+            if sample:
+                size += sys.getsizeof(column) + sum(sys.getsizeof(v) for v in sample) * len(column) // len(sample)
+        return size
+
+    def rows(self) -> list[dict]:
+        if self.columns is None:
+            return [dict(r) for r in self.data]
+        return [dict(zip(self.columns, values)) for values in zip(*self.data)]
+
+    def envelope(self) -> dict:
+        return {"rows": self.rows(), **self.meta}
+
+
+class ResultStore:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.stats_counters = {"puts": 0, "gets": 0, "misses": 0, "released": 0, "evicted": 0}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, envelope: dict, handle: str | None = None) -> str:
+        """Stores the envelope and returns its handle (a new one unless given)."""
+        handle = handle or uuid.uuid4().hex
+        result = ColumnarResult(envelope)
+        with self._lock:
+            previous = self._results.pop(handle, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self._results[handle] = result
+            self.bytes += result.size
+            self.stats_counters["puts"] += 1
+            # The newest result always stays, even when it alone is over the bound.
+            while self.bytes > self.max_bytes and len(self._results) > 1:
+                _, evicted = self._results.popitem(last=False)
+                self.bytes -= evicted.size
+                self.stats_counters["evicted"] += 1
+        return handle
+
+    def get(self, handle: str) -> dict | None:
+        """The envelope stored under handle, or None if it was released or evicted."""
+        with self._lock:
+            result = self._results.get(handle)
+            if result is None:
+                self.stats_counters["misses"] += 1
+                return None
+            self._results.move_to_end(handle)
+            self.stats_counters["gets"] += 1
+        return result.envelope()
+
+    def meta(self, handle: str) -> dict | None:
+        """The envelope without its rows (row count, columns, profile, error), or None."""
+        with self._lock:
+            result = self._results.get(handle)
+        return dict(result.meta) if result is not None else None
+
+    def release(self, *handles: str):
+        with self._lock:
+            for handle in handles:
+                result = self._results.pop(handle, None) if handle else None
+                if result is not None:
+                    self.bytes -= result.size
+                    self.stats_counters["released"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["results"] = len(self._results)
+            stats["bytes"] = self.bytes
+        return stats
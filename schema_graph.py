@@ -0,0 +1,162 @@
+import re
+from collections import deque
+from typing import NamedTuple
+
+
+# ============================================================
+# FOREIGN-KEY JOIN GRAPH
+# ============================================================
+# Tables are nodes and the `foreign_keys` of the metadata are edges. The
+# shortest join path between every pair of tables is computed once when
+# the graph is built, so the generator prompt can be given the exact JOIN
+# chain for the selected tables and the pre-check can compare the JOINs of
+# the generated SQL against it.
+#
+# The chain is a hint, not a rule: prompts only carry it for a small,
+# connected selection (DEFAULT_JOIN_PATH_MAX_TABLES), since joining every
+# selected table is rarely what a question needs.
+#
+# Metadata that still uses the older free-text `relationships`
+# ("links a.col to b.col") is read as well.
+
+DEFAULT_JOIN_PATH_MAX_TABLES = 4
+
+
+class ForeignKey(NamedTuple):
+    table: str
+    column: str
+    ref_table: str
+    ref_column: str
+
+    def condition(self) -> str:
+        return f"{self.table}.{self.column} = {self.ref_table}.{self.ref_column}"
+
+
+_RELATIONSHIP = re.compile(r"(\w+)\.(\w+)\s+to\s+(\w+)\.(\w+)")
+
+
+def foreign_keys_from_metadata(meta: dict) -> list[ForeignKey]:
+    """ForeignKeys declared by one full_metadata entry."""
+    keys = []
+    for fk in meta.get("foreign_keys") or []:
+        keys.append(ForeignKey(meta["table_name"], fk["column"], fk["references_table"], fk["references_column"]))
+    relationships = meta.get("relationships") or {}
+    for text in relationships.values() if isinstance(relationships, dict) else relationships:
+        for table, column, ref_table, ref_column in _RELATIONSHIP.findall(str(text)):
+            keys.append(ForeignKey(table, column, ref_table, ref_column))
+    return keys
+
+
+class SchemaGraph:
+    def __init__(self, table_metadata: list):
+        self.tables = [m["table_name"] for m in table_metadata]
+        columns = {m["table_name"]: {c["name"] for c in m.get("columns", [])} for m in table_metadata}
+
+        # {table: {neighbour: [ForeignKey, ...]}}, both directions.
+        self.edges = {t: {} for t in self.tables}
+        self.foreign_keys = []
+        for meta in table_metadata:
+            for fk in foreign_keys_from_metadata(meta):
+                if fk in self.foreign_keys or fk.table == fk.ref_table:
+                    continue
+                if fk.column not in columns.get(fk.table, ()) or fk.ref_column not in columns.get(fk.ref_table, ()):
+                    continue
+                self.foreign_keys.append(fk)
+                self.edges[fk.table].setdefault(fk.ref_table, []).append(fk)
+                self.edges[fk.ref_table].setdefault(fk.table, []).append(fk)
+
+        # Each column mapped to the key it ultimately references, so two
+        # columns that point at the same parent key (opt_scenario.product_id
+        # and master_product_limits.product_id) count as joinable.
+        parent = {(fk.table, fk.column): (fk.ref_table, fk.ref_column) for fk in self.foreign_keys}
+        self._root_key = {}
+        for key in parent:
+            root, seen = key, set()
+            while root in parent and root not in seen:
+                seen.add(root)
+                root = parent[root]
+            self._root_key[key] = root
+
+        self.paths = {t: self._shortest_paths(t) for t in self.tables}
+
+    def _shortest_paths(self, start: str) -> dict:
+        """{table: [start, ..., table]} by BFS; neighbours in name order for stable paths."""
+        paths = {start: [start]}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for nxt in sorted(self.edges[node]):
+                if nxt not in paths:
+                    paths[nxt] = paths[node] + [nxt]
+                    queue.append(nxt)
+        return paths
+
+    def neighbours(self) -> dict:
+        """{table: set(tables with a direct foreign key)}"""
+        return {t: set(n) for t, n in self.edges.items()}
+
+    def referencing(self, table: str) -> list[str]:
+        """Tables with a foreign key to `table` (its detail tables), in name order."""
+        return sorted({fk.table for fk in self.foreign_keys if fk.ref_table == table})
+
+    def join_path(self, start: str, goal: str) -> list[str]:
+        """Shortest chain of tables from start to goal, [] if unreachable."""
+        return list(self.paths.get(start, {}).get(goal, []))
+
+    def root_key(self, table: str, column: str) -> tuple:
+        return self._root_key.get((table, column), (table, column))
+
+    def joinable(self, left: tuple, right: tuple) -> bool:
+        """True if (table, column) pairs left and right are linked by foreign keys."""
+        return self.root_key(*left) == self.root_key(*right)
+
+    def join_chain(self, tables: list[str]) -> list[ForeignKey]:
+        """
+        The foreign keys joining all the tables, in JOIN order: starting
+        from the first table, the closest table not yet joined is attached
+        along its shortest path, adding intermediate tables as needed.
+        Tables that cannot be reached are left out.
+        """
+        wanted = [t for t in dict.fromkeys(tables) if t in self.paths]
+        if not wanted:
+            return []
+        joined = [wanted[0]]
+        chain = []
+        remaining = wanted[1:]
+        while remaining:
+            best = None
+            for target in remaining:
+                for source in joined:
+                    path = self.paths[source].get(target)
+                    if path and (best is None or len(path) < len(best)):
+                        best = path
+            if best is None:
+                break
+            for a, b in zip(best, best[1:]):
+                if b not in joined:
+                    chain.append(self.edges[a][b][0])
+                    joined.append(b)
+            remaining = [t for t in remaining if t not in joined]
+        return chain
+
+    def connects(self, tables: list[str]) -> bool:
+        """True if every table is in the graph and one join chain reaches them all."""
+        wanted = list(dict.fromkeys(tables))
+        if not wanted or any(t not in self.paths for t in wanted):
+            return False
+        start = self.paths[wanted[0]]
+        return all(t in start for t in wanted)
+
+    def render_join_chain(self, tables: list[str]) -> str:
+        """Prompt text: one `JOIN table ON condition` line per foreign key of join_chain()."""
+        wanted = [t for t in tables if t in self.paths]
+        chain = self.join_chain(wanted)
+        if not chain:
+            return ""
+        joined = {wanted[0]}
+        lines = [f"FROM {wanted[0]}"]
+        for fk in chain:
+            new_table = fk.ref_table if fk.table in joined else fk.table
+            joined.add(new_table)
+            lines.append(f"JOIN {new_table} ON {fk.condition()}")
+        return "\n".join(lines)
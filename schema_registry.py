@@ -0,0 +1,206 @@
+import hashlib
+import json
+import re
+import threading
+
+from data import get_table_metadata
+from schema_graph import foreign_keys_from_metadata
+
+
+# ============================================================
+# SCHEMA REGISTRY
+# ============================================================
+# get_table_metadata() is parsed and validated once per distinct content.
+# Each registry precomputes compact per-table prompt renderings so the
+# agents never re-serialize the metadata on an attempt.
+
+PROMPT_FORMATS = ("ddl", "json")
+DEFAULT_PROMPT_FORMAT = "ddl"
+
+
+def content_hash(raw_metadata) -> str:
+    """Hash of the metadata content, independent of key order and indentation."""
+    data = json.loads(raw_metadata) if isinstance(raw_metadata, str) else raw_metadata
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def validate_metadata(table_desc: dict):
+    """Raises ValueError if a table entry is missing what the agents rely on."""
+    if not isinstance(table_desc, dict) or not table_desc:
+        raise ValueError("Table metadata must be a non-empty mapping of table name to description.")
+    for table, meta in table_desc.items():
+        columns = meta.get("columns")
+        if not isinstance(columns, list) or not columns:
+            raise ValueError(f"Table '{table}' has no columns.")
+        for col in columns:
+            if not col.get("name") or not col.get("type"):
+                raise ValueError(f"Table '{table}' has a column without a name or type: {col}")
+
+
+def _minified(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def render_table_ddl(meta: dict) -> str:
+    """Terse DDL-like text for one full_metadata entry."""
+    lines = [f"-- {meta['table_name']}: {meta.get('table_description', '')}".rstrip()]
+    lines.append(f"CREATE TABLE {meta['table_name']} (")
+    columns = meta.get("columns", [])
+    for i, col in enumerate(columns):
+        comma = "," if i < len(columns) - 1 else ""
+        desc = f" -- {col['description']}" if col.get("description") else ""
+        lines.append(f"  {col['name']} {col.get('type', '')}{comma}{desc}")
+    lines.append(");")
+    for fk in foreign_keys_from_metadata(meta):
+        lines.append(f"-- FK: {fk.condition()}")
+    for example in meta.get("examples", []):
+        lines.append(f"-- example: {_minified(example)}")
+    if meta.get("usuage"):
+        lines.append(f"-- usage: {' | '.join(meta['usuage'])}")
+    return "\n".join(lines)
+
+
+def render_table_json(meta: dict) -> str:
+    return _minified(meta)
+
+
+class SchemaRegistry:
+    def __init__(self, raw_metadata):
+        table_desc = json.loads(raw_metadata) if isinstance(raw_metadata, str) else raw_metadata
+        validate_metadata(table_desc)
+        self.content_hash = content_hash(table_desc)
+        self.tables = []
+        for tbl, meta in table_desc.items():
+            self.tables.append({
+                "table_name": tbl,
+                "table_description": meta.get("description", ""),
+                "columns": meta.get("columns", []),
+                "foreign_keys": meta.get("foreign_keys", []),
+                "relationships": meta.get("relationships", {}),
+                "examples": meta.get("examples", []),
+                "usuage": meta.get("usuage", []),
+            })
+        self.by_name = {m["table_name"]: m for m in self.tables}
+        self.fragments = {
+            "ddl": {m["table_name"]: render_table_ddl(m) for m in self.tables},
+            "json": {m["table_name"]: render_table_json(m) for m in self.tables},
+        }
+        self._renderings = {}
+        self._selections = {}
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def render(self, table_metadata: list, prompt_format: str = DEFAULT_PROMPT_FORMAT) -> str:
+        """
+        Prompt text for the given full_metadata entries. Tables known to the
+        registry reuse their precomputed fragment; the joined text is cached
+        per table selection.
+        """
+        if prompt_format not in PROMPT_FORMATS:
+            raise ValueError(f"Unknown prompt format '{prompt_format}'. Use one of {PROMPT_FORMATS}.")
+        known = all(self._is_registered(m) for m in table_metadata)
+        key = (prompt_format, tuple(m.get("table_name", "") for m in table_metadata))
+        if known:
+            text = self._renderings.get(key)
+            if text is not None:
+                return text
+
+        renderer = render_table_ddl if prompt_format == "ddl" else render_table_json
+        parts = [
+            self.fragments[prompt_format][m["table_name"]] if self._is_registered(m) else renderer(m)
+            for m in table_metadata
+        ]
+        if prompt_format == "json":
+            text = "[" + ",".join(parts) + "]"
+        else:
+            text = "\n\n".join(parts)
+
+        # Custom metadata is rendered every time; registry tables are cached per selection.
+        if known:
+            with self._lock:
+                self._renderings[key] = text
+        return text
+
+    def derived(self, name: str, factory):
+        """
+        Caches a value computed from this schema (a search index, a parsed
+        column map, ...) for the lifetime of the registry.
+        """
+        value = self._derived.get(name)
+        if value is None:
+            value = factory(self)
+            with self._lock:
+                value = self._derived.setdefault(name, value)
+        return value
+
+    def select(self, table_names) -> list:
+        """full_metadata entries for the named tables, in that order; the list is shared, do not modify it."""
+        key = tuple(table_names)
+        selected = self._selections.get(key)
+        if selected is None:
+            selected = [self.by_name[name] for name in key if name in self.by_name]
+            with self._lock:
+                selected = self._selections.setdefault(key, selected)
+        return selected
+
+    def mentioned_tables(self, *texts: str) -> list:
+        """
+        full_metadata entries of the tables named in the texts (SQL, error
+        messages, ...), in order of first mention. Plain word matching, so
+        it also works on SQL that does not parse.
+        """
+        lower_names = {name.lower(): name for name in self.by_name}
+        found = {}
+        for text in texts:
+            for word in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", text or ""):
+                name = lower_names.get(word.lower())
+                if name is not None:
+                    found.setdefault(name, self.by_name[name])
+        return list(found.values())
+
+    def _is_registered(self, meta: dict) -> bool:
+        registered = self.by_name.get(meta.get("table_name"))
+        return registered is not None and (registered is meta or registered == meta)
+
+
+_registries = {}
+_current = None
+_registry_lock = threading.Lock()
+
+
+def load_registry(raw_metadata) -> SchemaRegistry:
+    """Returns the registry for this metadata content, building it only once."""
+    key = content_hash(raw_metadata)
+    with _registry_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = SchemaRegistry(raw_metadata)
+            _registries[key] = registry
+        return registry
+
+
+def get_registry() -> SchemaRegistry:
+    """Registry for data.get_table_metadata(), loaded on first use."""
+    global _current
+    if _current is None:
+        _current = load_registry(get_table_metadata())
+    return _current
+
+
+def registry_for(schema_hash: str) -> SchemaRegistry:
+    """
+    The loaded registry with this content hash (GraphState refers to its
+    schema this way). KeyError if no metadata with that content was loaded
+    in this process.
+    """
+    get_registry()
+    with _registry_lock:
+        return _registries[schema_hash]
+
+
+def reload_registry() -> SchemaRegistry:
+    """Re-reads get_table_metadata(), e.g. after the schema changed."""
+    global _current
+    _current = load_registry(get_table_metadata())
+    return _current
@@ -0,0 +1,214 @@
+import math
+import re
+from collections import Counter
+
+from schema_graph import SchemaGraph
+
+
+# ============================================================
+# SCHEMA RETRIEVAL
+# ============================================================
+# A small BM25 index over the table metadata. Only the tables relevant to
+# the question (plus the tables needed to join them) are handed to the
+# agents; when nothing matches well enough the full schema is used.
+#
+# Values the question mentions (entity index hits) pin the tables they
+# live in, together with those tables' detail tables. The selection is
+# kept only if it explains enough of the question: terms that match none
+# of the selected tables and no resolved value (an unknown product name,
+# a property the schema does not describe) mean retrieval may have missed
+# a table, so the full schema is used instead.
+
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_SCORE = 1.5
+DEFAULT_MIN_COVERAGE = 0.6
+MAX_WEAK_MATCH_HOPS = 2
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# How often each metadata field is repeated in a table's document.
+FIELD_WEIGHTS = {
+    "table_name": 3,
+    "table_description": 1,
+    "column_name": 2,
+    "column_description": 1,
+    "usuage": 2,
+}
+
+STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "at", "be", "by",
+    "can", "do", "does", "for", "from", "give", "has", "have", "how", "i",
+    "in", "is", "it", "its", "me", "much", "of", "on", "or", "show", "that",
+    "the", "their", "them", "there", "these", "this", "to", "used",
+    "what", "when", "where", "which", "who", "with", "you", "table",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercases, splits on anything that is not a letter or digit
+    (snake_case names become separate words), drops stopwords and
+    strips a plural 's'.
+    """
+    tokens = []
+    for word in re.split(r"[^0-9a-z]+", str(text).lower()):
+        if not word or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _table_document(meta: dict) -> list[str]:
+    tokens = []
+    tokens += tokenize(meta.get("table_name", "")) * FIELD_WEIGHTS["table_name"]
+    tokens += tokenize(meta.get("table_description", "")) * FIELD_WEIGHTS["table_description"]
+    for col in meta.get("columns", []):
+        tokens += tokenize(col.get("name", "")) * FIELD_WEIGHTS["column_name"]
+        tokens += tokenize(col.get("description", "")) * FIELD_WEIGHTS["column_description"]
+    for phrase in meta.get("usuage", []):
+        tokens += tokenize(phrase) * FIELD_WEIGHTS["usuage"]
+    return tokens
+
+
+class SchemaIndex:
+    """BM25 index with one document per table."""
+
+    def __init__(self, table_metadata: list):
+        self.table_metadata = table_metadata
+        self.names = [m["table_name"] for m in table_metadata]
+        self.term_freqs = [Counter(_table_document(m)) for m in table_metadata]
+        self.doc_lens = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_len = (sum(self.doc_lens) / len(self.doc_lens)) if self.doc_lens else 0.0
+
+        doc_freq = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(self.term_freqs)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+        self.schema_graph = SchemaGraph(table_metadata)
+
+    def score(self, question: str) -> list[tuple[str, float]]:
+        """Returns (table_name, score) pairs, best first."""
+        query = set(tokenize(question))
+        scores = []
+        for name, tf, length in zip(self.names, self.term_freqs, self.doc_lens):
+            score = 0.0
+            for term in query:
+                freq = tf.get(term, 0)
+                if not freq:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_len)
+                score += self.idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            scores.append((name, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+    def join_closure(self, tables: list[str]) -> list[str]:
+        """Adds the tables needed to join the selected tables together."""
+        if not tables:
+            return []
+        selected = list(dict.fromkeys(tables))
+        anchor = selected[0]
+        for table in selected[1:]:
+            for hop in self.schema_graph.join_path(anchor, table):
+                if hop not in selected:
+                    selected.append(hop)
+        return selected
+
+    def coverage(self, question: str, tables, explained: str = "") -> float:
+        """
+        Share of the question's terms (numbers aside) that occur in the
+        documents of `tables` or in `explained` (resolved value mentions).
+        """
+        terms = {t for t in tokenize(question) if not t.isdigit()}
+        if not terms:
+            return 1.0
+        known = set(tokenize(explained))
+        for name, tf in zip(self.names, self.term_freqs):
+            if name in tables:
+                known.update(tf)
+        return len(terms & known) / len(terms)
+
+    def _ranked_picks(self, ranked: list, anchors: list, top_k: int) -> list:
+        """
+        The anchors plus the top_k tables that score at least a third of
+        the best match. Weak matches (under half the best) that sit more
+        than MAX_WEAK_MATCH_HOPS joins away from every anchor are dropped
+        rather than dragging a long join chain into the prompt.
+        """
+        best = ranked[0][1]
+        picked = list(anchors)
+        for name, s in ranked[:top_k]:
+            if name in picked or s <= 0 or s < best / 3:
+                continue
+            paths = [self.schema_graph.join_path(a, name) for a in anchors]
+            hops = min((len(path) - 1 for path in paths if path), default=-1)
+            if s >= best / 2 or 0 < hops <= MAX_WEAK_MATCH_HOPS:
+                picked.append(name)
+        return picked
+
+    def value_tables(self, mentions: list, matched: list) -> tuple[list, list]:
+        """
+        (tables to pin, tables whose detail tables to add) for resolved
+        value mentions ({"mention", "table", "key", ...} dicts from the
+        entity index). A value stored in several tables (a property name)
+        pins the ones the question's words matched, else the table it is
+        a key of; otherwise it pins nothing.
+        """
+        by_mention = {}
+        for hit in mentions:
+            if hit["table"] in self.names:
+                by_mention.setdefault(hit["mention"], []).append(hit)
+        pinned, entities = [], []
+        for hits in by_mention.values():
+            tables = list(dict.fromkeys(h["table"] for h in hits))
+            keyed = [h["table"] for h in hits if h.get("key")]
+            if len(tables) == 1:
+                chosen = tables
+            else:
+                chosen = [t for t in tables if t in matched] or keyed
+            pinned += chosen
+            entities += [t for t in keyed if t in chosen]
+        return list(dict.fromkeys(pinned)), list(dict.fromkeys(entities))
+
+    def retrieve(self, question: str, top_k: int = DEFAULT_TOP_K,
+                 min_score: float = DEFAULT_MIN_SCORE, mentions=(),
+                 min_coverage: float = DEFAULT_MIN_COVERAGE) -> list:
+        """
+        Returns the metadata entries of the top_k tables for the question
+        plus any join tables, in the original metadata order.
+
+        mentions: question mentions resolved to stored values (entity
+        index); the tables holding them (see value_tables()) are always
+        included, and for values that identify a row, the tables
+        referencing that row's table too.
+
+        Falls back to the full metadata when the best score is below
+        min_score and no value pins a table, or when less than
+        min_coverage of the question's terms are explained by the
+        selection (see coverage()).
+        """
+        mentions = list(mentions)
+        ranked = self.score(question)
+        confident = bool(ranked) and ranked[0][1] >= min_score
+        matched = self._ranked_picks(ranked, [ranked[0][0]], top_k) if confident else []
+        required, entities = self.value_tables(mentions, matched)
+        if not confident and not required:
+            return self.table_metadata
+
+        picked = self._ranked_picks(ranked, required, top_k) if required else matched
+        for table in entities:
+            picked += self.schema_graph.referencing(table)
+        picked = set(self.join_closure(picked))
+
+        explained = " ".join(m["mention"] for m in mentions)
+        if self.coverage(question, picked, explained) < min_coverage:
+            return self.table_metadata
+        return [m for m in self.table_metadata if m["table_name"] in picked]
+
@@ -0,0 +1,285 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tracing
+from batch import to_batch_result
+from limits import DeadlineExceeded, llm_limit, db_limit, run_deadline
+from txt2sql import (
+    get_backend, get_checkpoint_store, get_llm, get_result_store, get_resumable_app, load_environment,
+    lookup_cached_answer, materialize_result, prepare_run, record_answer, run_config,
+    warm_entity_index,
+)
+
+logger = logging.getLogger("txt2sql.server")
+
+
+# ============================================================
+# SERVICE MODE
+# ============================================================
+# Keeps the compiled graph, the LLM client and the DB pool warm between
+# questions.
+#
+# POST /ask      {"question": "...", "deadline_s": 60, "stream": true,
+#                 "speculative_candidates": 1, "time_budget_s": 0}
+#                streams one JSON line per event (queued, started, node,
+#                result / error); "stream": false returns only the last one
+# GET  /health   {"status": "ok", ...server stats}
+# GET  /metrics  Prometheus text (tracing.render_prometheus)
+#
+# At most max_concurrency questions run at once and max_queue more wait;
+# beyond that /ask answers 429. A question still queued or running when its
+# deadline passes stops with a "deadline" error: the cached-answer check
+# and the graph run under limits.run_deadline, so slot waits, statement
+# timeouts and LLM streams inside a node are cut to the time left, and the graph stops at the next
+# node boundary at the latest. The run's checkpoints are marked aborted.
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_DEADLINE_SECONDS = 120.0
+
+
+class AgentService:
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_queue: int = DEFAULT_MAX_QUEUE,
+                 default_deadline_s: float = DEFAULT_DEADLINE_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.default_deadline_s = default_deadline_s
+        self._admission = threading.BoundedSemaphore(max_concurrency + max_queue)
+        self._workers = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.counters = {"accepted": 0, "rejected": 0, "completed": 0,
+                         "failed": 0, "deadline_exceeded": 0, "queued": 0, "running": 0}
+
+    def warm_up(self):
+        """
+        Builds the LLM client, execution backend and compiled graph before
+        the first request, and starts the entity index build in the
+        background (questions run without it until it is ready).
+        """
+        load_environment()
+        get_llm()
+        get_backend()
+        get_resumable_app()
+        warm_entity_index()
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["max_concurrency"] = self.max_concurrency
+        stats["max_queue"] = self.max_queue
+        return stats
+
+    def try_admit(self) -> bool:
+        """Reserves a queue slot; False means the server is saturated (429)."""
+        if not self._admission.acquire(blocking=False):
+            self._count("rejected")
+            return False
+        self._count("accepted")
+        return True
+
+    def answer(self, request: dict, emit) -> dict:
+        """
+        Runs an admitted question, calling emit(event) for each progress
+        event, and returns the final event. Releases the admission slot.
+        """
+        started = time.perf_counter()
+        question = request["question"]
+        deadline_s = float(request.get("deadline_s") or self.default_deadline_s)
+        deadline = started + deadline_s
+
+        def remaining() -> float:
+            return deadline - time.perf_counter()
+
+        running = False
+        self._count("queued")
+        try:
+            emit({"event": "queued"})
+            if not self._workers.acquire(timeout=max(0.0, remaining())):
+                raise DeadlineExceeded(f"deadline of {deadline_s:g}s passed while queued")
+            running = True
+            self._count("queued", -1)
+            self._count("running")
+            emit({"event": "started", "queued_s": time.perf_counter() - started})
+
+            # SQL run to check a cached answer is bounded by the deadline too.
+            with run_deadline(deadline):
+                graph_input = prepare_run(
+                    question,
+                    int(request.get("speculative_candidates") or 1),
+                    float(request.get("time_budget_s") or 0.0),
+                )
+                final_state = lookup_cached_answer(graph_input)
+                cached = final_state is not None
+                if not cached:
+                    final_state = self._run_graph(graph_input, emit, remaining, deadline_s, started)
+            if not cached:
+                record_answer(final_state)
+
+            event = {"event": "result", **to_batch_result(question, final_state, cached, started).model_dump()}
+            self._count("completed")
+        except DeadlineExceeded as e:
+            event = {"event": "error", "error": "deadline", "detail": str(e)}
+            self._count("deadline_exceeded")
+        except Exception as e:
+            logger.exception("Question failed: %s", question)
+            event = {"event": "error", "error": "internal", "detail": f"{type(e).__name__}: {e}"}
+            self._count("failed")
+        finally:
+            if running:
+                self._count("running", -1)
+                self._workers.release()
+            else:
+                self._count("queued", -1)
+            self._admission.release()
+        emit(event)
+        return event
+
+    def _run_graph(self, graph_input: dict, emit, remaining, deadline_s: float, started: float) -> dict:
+        """Runs the graph under the caller's run_deadline scope."""
+        final_state = graph_input
+        stream = get_resumable_app().stream(graph_input, run_config(graph_input), stream_mode=["updates", "values"])
+        try:
+            # The generator runs the nodes in this context on each next().
+            for mode, chunk in stream:
+                if mode == "values":
+                    final_state = chunk
+                    continue
+                for node, update in chunk.items():
+                    update = update or {}
+                    event = {"event": "node", "node": node, "elapsed_s": time.perf_counter() - started}
+                    event.update({k: update[k] for k in ("attempts", "valid", "issues") if k in update})
+                    emit(event)
+                if remaining() <= 0:
+                    raise DeadlineExceeded(f"deadline of {deadline_s:g}s passed after node {', '.join(chunk)}")
+        except DeadlineExceeded:
+            get_result_store().release(final_state.get("result_handle", ""))
+            store = get_checkpoint_store()
+            if store is not None:
+                store.abort(graph_input["run_id"])
+            raise
+        finally:
+            # Stops the graph before its next node.
+            stream.close()
+        return materialize_result(final_state)
+
+
+def make_handler(service: AgentService):
+    class AgentHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: dict, headers: dict | None = None):
+            data = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/health":
+                self._send_json(200, {"status": "ok", **service.stats()})
+            elif path == "/metrics":
+                data = tracing.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/ask":
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict) or not str(request.get("question", "")).strip():
+                    raise ValueError('body must be a JSON object with a non-empty "question"')
+            except ValueError as e:
+                self._send_json(400, {"error": "bad_request", "detail": str(e)})
+                return
+
+            if not service.try_admit():
+                self._send_json(429, {"error": "busy", "detail": "too many questions queued"},
+                                headers={"Retry-After": "1"})
+                return
+
+            if request.get("stream", True):
+                # One JSON object per line, flushed as it happens; the
+                # response ends when the connection closes.
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                def emit(event: dict):
+                    try:
+                        self.wfile.write((json.dumps(event, default=str) + "\n").encode("utf-8"))
+                        self.wfile.flush()
+                    except OSError:
+                        pass   # client went away; the question still finishes
+
+                service.answer(request, emit)
+            else:
+                event = service.answer(request, lambda event: None)
+                status = 200
+                if event["event"] == "error":
+                    status = 504 if event["error"] == "deadline" else 500
+                self._send_json(status, event)
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return AgentHandler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080,
+          max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_queue: int = DEFAULT_MAX_QUEUE,
+          default_deadline_s: float = DEFAULT_DEADLINE_SECONDS, warm: bool = True) -> ThreadingHTTPServer:
+    """Starts the server; call serve_forever() on the result."""
+    service = AgentService(max_concurrency, max_queue, default_deadline_s)
+    if warm:
+        service.warm_up()
+    llm_limit.set_limit(max_concurrency)
+    db_limit.set_limit(max_concurrency)
+    tracing.register_collector("server", service.stats)
+
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the agentic SQL loop over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="Questions running at once")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="Questions waiting before /ask answers 429")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE_SECONDS,
+                        help="Default per-question deadline, seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    httpd = serve(args.host, args.port, args.max_concurrency, args.max_queue, args.deadline)
+    logger.info("Listening on http://%s:%d", args.host, args.port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
@@ -0,0 +1,85 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# ============================================================
+# SPECULATIVE CANDIDATE RACE
+# ============================================================
+# Runs N candidate attempts concurrently and keeps the first one that
+# passes. Losers are cancelled: queued ones never start, running ones see
+# `cancelled` set and stop at their next stage boundary (a blocking LLM or
+# DB call already in flight finishes in the background and is ignored).
+
+def _timed(candidate_fn, index: int, cancelled: threading.Event):
+    started = time.perf_counter()
+    result = candidate_fn(index, cancelled)
+    return result, time.perf_counter() - started
+
+
+def race(candidate_fn, n: int, time_budget_s: float | None = None,
+         is_winner=lambda result: bool(result.get("valid"))) -> dict:
+    """
+    candidate_fn(index, cancelled) -> result dict, called for index 0..n-1.
+
+    Returns {
+        "winner": index of the first winning candidate, or None,
+        "result": the winner's result, else the lowest-index finished one (or None),
+        "finished": {index: result} for candidates that completed,
+        "wall_s": time spent racing,
+        "serial_estimate_s": time the same candidates would have taken one after another,
+        "saved_s": serial_estimate_s - wall_s, floored at 0,
+    }
+    """
+    cancelled = threading.Event()
+    started = time.perf_counter()
+    deadline = started + time_budget_s if time_budget_s else None
+    pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="txt2sql-speculative")
+    # Candidates see the caller's context variables (the run's deadline).
+    futures = {pool.submit(contextvars.copy_context().run, _timed, candidate_fn, i, cancelled): i
+               for i in range(n)}
+
+    winner = None
+    finished = {}
+    durations = {}
+    try:
+        pending = set(futures)
+        while pending and winner is None:
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break   # time budget exhausted
+            for future in sorted(done, key=futures.get):
+                index = futures[future]
+                try:
+                    result, duration = future.result()
+                except Exception as e:
+                    result = {"valid": False, "issues": [f"Candidate {index} failed: {type(e).__name__}: {e}"]}
+                    duration = time.perf_counter() - started
+                finished[index] = result
+                durations[index] = duration
+                if winner is None and is_winner(result):
+                    winner = index
+    finally:
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    wall = time.perf_counter() - started
+    # A serial loop would have tried candidates in index order up to the
+    # winner (or all of them). Unfinished ones ran for at least `wall`.
+    considered = range(winner + 1) if winner is not None else range(n)
+    serial = sum(durations.get(i, wall) for i in considered)
+
+    if winner is not None:
+        result = finished[winner]
+    else:
+        result = finished[min(finished)] if finished else None
+    return {
+        "winner": winner,
+        "result": result,
+        "finished": finished,
+        "wall_s": wall,
+        "serial_estimate_s": serial,
+        "saved_s": max(0.0, serial - wall),
+    }
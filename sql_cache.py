@@ -0,0 +1,173 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+# ============================================================
+# QUESTION -> VALIDATED SQL CACHE
+# ============================================================
+# Stores the SQL that validator_agent accepted for a question so a repeat
+# question can go straight to the executor. Entries live in SQLite (they
+# survive restarts), expire after a TTL, are evicted least-recently-used
+# beyond max_entries, and are dropped wholesale when the table metadata
+# changes.
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "question_sql.sqlite3")
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# Words that mean the same thing for our schema, mapped to one spelling.
+SYNONYMS = {
+    "inventory": "stock",
+    "stocks": "stock",
+    "shortages": "shortage",
+    "short": "shortage",
+    "materials": "material",
+    "products": "product",
+    "scenarios": "scenario",
+    "recipes": "recipe",
+    "costs": "cost",
+    "viscosity": "viscocity",
+}
+
+
+def normalize_question(question: str, use_synonyms: bool = True) -> str:
+    """
+    Lowercases, drops punctuation (but keeps '-', '.', '_' inside tokens
+    such as CH-001 or 12.5), collapses whitespace and optionally maps
+    synonyms to a single spelling.
+    """
+    text = question.lower()
+    text = re.sub(r"(?<![0-9a-z])[-._]|[-._](?![0-9a-z])", " ", text)
+    text = re.sub(r"[^\w\s.\-]", " ", text)
+    words = text.split()
+    if use_synonyms:
+        words = [SYNONYMS.get(w, w) for w in words]
+    return " ".join(words)
+
+
+class QuestionCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, schema_hash: str = "",
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 use_synonyms: bool = True):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.use_synonyms = use_synonyms
+        self.schema_hash = None
+        self.stats_counters = {"hits": 0, "misses": 0, "expired": 0,
+                               "evicted": 0, "invalidated": 0, "stores": 0}
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                question TEXT,
+                sql TEXT,
+                created_at REAL,
+                last_used_at REAL,
+                hits INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used_at);
+        """)
+        self.set_schema_hash(schema_hash)
+
+    def key(self, question: str) -> str:
+        return normalize_question(question, self.use_synonyms)
+
+    def get(self, question: str) -> str | None:
+        """Returns the cached SQL for the question, or None."""
+        key = self.key(question)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats_counters["misses"] += 1
+                return None
+            sql, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats_counters["expired"] += 1
+                self.stats_counters["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_used_at = ?, hits = hits + 1 WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            self.stats_counters["hits"] += 1
+            return sql
+
+    def put(self, question: str, sql: str):
+        """Stores SQL that the validator accepted for the question."""
+        key = self.key(question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, question, sql, created_at, last_used_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, question, sql, now, now),
+            )
+            self.stats_counters["stores"] += 1
+            self._evict_locked()
+            self._conn.commit()
+
+    def invalidate(self, question: str | None = None):
+        """Drops one question, or every entry when question is None."""
+        with self._lock:
+            if question is None:
+                cur = self._conn.execute("DELETE FROM entries")
+            else:
+                cur = self._conn.execute("DELETE FROM entries WHERE key = ?", (self.key(question),))
+            self.stats_counters["invalidated"] += cur.rowcount
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] / lookups) if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def set_schema_hash(self, schema_hash: str):
+        """Clears the cache when the table metadata changed since it was filled."""
+        # No hash says nothing about the schema: keep what is stored.
+        if not schema_hash or schema_hash == self.schema_hash:
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'schema_hash'").fetchone()
+            if row is not None and row[0] != schema_hash:
+                cur = self._conn.execute("DELETE FROM entries")
+                self.stats_counters["invalidated"] += cur.rowcount
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_hash', ?)",
+                (schema_hash,),
+            )
+            self._conn.commit()
+            self.schema_hash = schema_hash
+
+    def _evict_locked(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY last_used_at ASC LIMIT ?)",
+                (excess,),
+            )
+            self.stats_counters["evicted"] += excess
@@ -0,0 +1,423 @@
+import sqlglot
+from sqlglot import exp
+from sqlglot.dialects.mysql import MySQL
+from sqlglot.errors import ParseError, TokenError
+from sqlglot.optimizer.scope import Scope, traverse_scope
+from sqlglot.tokens import TokenType
+
+
+# ============================================================
+# STATIC SQL PRE-VALIDATION
+# ============================================================
+# Deterministic checks run on the generated SQL before it reaches MySQL
+# and the LLM validator. Everything here is answerable from the SQL text
+# and the table metadata alone: parse errors, clause order, unknown
+# tables/columns, ambiguous columns, GROUP BY completeness and JOIN keys
+# that no foreign key supports.
+
+DIALECT = "mysql"
+
+# Order in which top-level clauses may appear inside one SELECT.
+CLAUSE_RANK = {
+    TokenType.SELECT: 0,
+    TokenType.FROM: 1,
+    TokenType.JOIN: 1,
+    TokenType.WHERE: 2,
+    TokenType.GROUP_BY: 3,
+    TokenType.HAVING: 4,
+    TokenType.WINDOW: 5,
+    TokenType.ORDER_BY: 6,
+    TokenType.LIMIT: 7,
+}
+CLAUSE_NAMES = {
+    TokenType.SELECT: "SELECT",
+    TokenType.FROM: "FROM",
+    TokenType.JOIN: "JOIN",
+    TokenType.WHERE: "WHERE",
+    TokenType.GROUP_BY: "GROUP BY",
+    TokenType.HAVING: "HAVING",
+    TokenType.WINDOW: "WINDOW",
+    TokenType.ORDER_BY: "ORDER BY",
+    TokenType.LIMIT: "LIMIT",
+}
+SET_OPERATORS = {TokenType.UNION, TokenType.EXCEPT, TokenType.INTERSECT}
+
+
+def schema_from_metadata(table_metadata: list) -> dict:
+    """
+    Returns {table: {"columns": {name: type}, "primary_key": name | None}}
+    from the full_metadata list used by the agents.
+    """
+    schema = {}
+    for meta in table_metadata:
+        columns = {}
+        primary_key = None
+        for col in meta.get("columns", []):
+            columns[col["name"].lower()] = col.get("type", "")
+            if primary_key is None and "primary key" in col.get("description", "").lower():
+                primary_key = col["name"].lower()
+        schema[meta["table_name"].lower()] = {"columns": columns, "primary_key": primary_key}
+    return schema
+
+
+# ------------------------------------------------------------
+# Token level: statement count and clause order
+# ------------------------------------------------------------
+def _check_tokens(sql: str) -> list[str]:
+    try:
+        tokens = MySQL().tokenize(sql)
+    except TokenError as e:
+        return [f"SQL could not be tokenized: {e}"]
+
+    issues = []
+    statements = 1
+    # Last clause rank seen at each parenthesis depth.
+    last_rank = [None]
+    last_name = [None]
+    for i, tok in enumerate(tokens):
+        tt = tok.token_type
+        if tt == TokenType.L_PAREN:
+            last_rank.append(None)
+            last_name.append(None)
+        elif tt == TokenType.R_PAREN:
+            if len(last_rank) > 1:
+                last_rank.pop()
+                last_name.pop()
+        elif tt == TokenType.SEMICOLON:
+            if any(t.token_type != TokenType.SEMICOLON for t in tokens[i + 1:]):
+                statements += 1
+            last_rank[-1] = None
+        elif tt in SET_OPERATORS:
+            last_rank[-1] = None
+        elif tt in CLAUSE_RANK:
+            rank = CLAUSE_RANK[tt]
+            if tt == TokenType.SELECT:
+                last_rank[-1] = rank
+                last_name[-1] = "SELECT"
+                continue
+            if last_rank[-1] is not None and rank < last_rank[-1]:
+                issues.append(
+                    f"Clause order error: {CLAUSE_NAMES[tt]} appears after {last_name[-1]}. "
+                    "Use SELECT, FROM/JOIN, WHERE, GROUP BY, HAVING, ORDER BY, LIMIT."
+                )
+            if last_rank[-1] is None or rank >= last_rank[-1]:
+                last_rank[-1] = rank
+                last_name[-1] = CLAUSE_NAMES[tt]
+
+    if statements > 1:
+        issues.append("Multiple SQL statements found. Return exactly one SELECT statement.")
+    return issues
+
+
+# ------------------------------------------------------------
+# AST level: tables, columns, GROUP BY
+# ------------------------------------------------------------
+def _source_columns(source, schema: dict):
+    """Column names exposed by a scope source, or None if they cannot be known."""
+    if isinstance(source, exp.Table):
+        table = schema.get(source.name.lower())
+        return set(table["columns"]) if table else None
+    if isinstance(source, Scope):
+        if any(isinstance(p, exp.Star) for p in source.expression.selects):
+            return None
+        return {name.lower() for name in source.expression.named_selects}
+    return None
+
+
+def _is_aggregate(node) -> bool:
+    """True if node contains an aggregate that is not inside a window function."""
+    for agg in node.find_all(exp.AggFunc):
+        if not agg.find_ancestor(exp.Window):
+            return True
+    return False
+
+
+def _scope_source_columns(scope: Scope, schema: dict) -> dict:
+    return {alias.lower(): _source_columns(source, schema) for alias, source in scope.sources.items()}
+
+
+def _is_alias_reference(column: exp.Column, select: exp.Select) -> bool:
+    """MySQL lets GROUP BY, HAVING and ORDER BY refer to select-list aliases."""
+    if column.table:
+        return False
+    aliases = {p.alias.lower() for p in select.expressions if isinstance(p, exp.Alias)}
+    return column.name.lower() in aliases and column.find_ancestor(exp.Group, exp.Having, exp.Order) is not None
+
+
+def _check_scope(scope: Scope, schema: dict) -> list[str]:
+    issues = []
+    known_tables = ", ".join(sorted(schema))
+
+    for source in scope.sources.values():
+        if isinstance(source, exp.Table) and source.name.lower() not in schema:
+            issues.append(f"Unknown table '{source.name}'. Known tables: {known_tables}.")
+    source_columns = _scope_source_columns(scope, schema)
+
+    select = scope.expression
+    if not isinstance(select, exp.Select):
+        return issues
+    if not select.expressions:
+        issues.append("SELECT has no columns.")
+
+    # Resolve every column written in this SELECT to the alias of the source
+    # that provides it. Columns of nested subqueries are handled in their own
+    # scope; unresolved ones may still be correlated references to a parent.
+    resolved = {}
+    for column in scope.columns:
+        if column.find_ancestor(exp.Select) is not select:
+            continue
+        name = column.name.lower()
+        qualifier = column.table.lower()
+        if qualifier:
+            if qualifier not in source_columns:
+                if not _resolves_in_parent(scope, qualifier, name, schema):
+                    issues.append(f"Unknown table alias '{column.table}' in '{column.sql(dialect=DIALECT)}'.")
+                continue
+            columns = source_columns[qualifier]
+            if columns is not None and name not in columns:
+                table = scope.sources[qualifier]
+                table_name = table.name if isinstance(table, exp.Table) else qualifier
+                issues.append(
+                    f"Unknown column '{column.name}' in table '{table_name}' (alias '{qualifier}'). "
+                    f"Valid columns: {', '.join(sorted(columns))}."
+                )
+                continue
+            resolved[id(column)] = (qualifier, name)
+            continue
+
+        owners = [a for a, cols in source_columns.items() if cols is not None and name in cols]
+        unknown_sources = any(cols is None for cols in source_columns.values())
+        if len(owners) == 1:
+            resolved[id(column)] = (owners[0], name)
+        elif len(owners) > 1:
+            issues.append(
+                f"Column '{column.name}' is ambiguous; it exists in {', '.join(owners)}. "
+                "Qualify it with a table alias."
+            )
+        elif unknown_sources or _is_alias_reference(column, select):
+            continue
+        elif not _resolves_in_parent(scope, "", name, schema):
+            issues.append(f"Unknown column '{column.name}'; it is not in any table of the FROM clause.")
+
+    issues += _check_group_by(scope, select, resolved, schema)
+    return issues
+
+
+def _resolves_in_parent(scope: Scope, qualifier: str, name: str, schema: dict) -> bool:
+    """True if a correlated reference resolves in an enclosing scope."""
+    parent = scope.parent
+    while parent is not None:
+        source_columns = _scope_source_columns(parent, schema)
+        if qualifier:
+            if qualifier in source_columns:
+                columns = source_columns[qualifier]
+                return columns is None or name in columns
+        elif any(cols is None or name in cols for cols in source_columns.values()):
+            return True
+        parent = parent.parent
+    return False
+
+
+def _check_group_by(scope: Scope, select: exp.Select, resolved: dict, schema: dict) -> list[str]:
+    """MySQL ONLY_FULL_GROUP_BY: every non-aggregated select column must be grouped."""
+    group = select.args.get("group")
+    has_aggregate = any(_is_aggregate(p) for p in select.expressions)
+    if not group and not has_aggregate:
+        return []
+
+    grouped = set()          # (alias, column) pairs in GROUP BY
+    grouped_names = set()    # select aliases / positions used in GROUP BY
+    grouped_sql = set()
+    if group:
+        for g in group.expressions:
+            grouped_sql.add(g.sql(dialect=DIALECT).lower())
+            if isinstance(g, exp.Literal) and g.is_int:
+                index = int(g.this) - 1
+                if 0 <= index < len(select.expressions):
+                    grouped_sql.add(select.expressions[index].unalias().sql(dialect=DIALECT).lower())
+            for column in g.find_all(exp.Column):
+                if id(column) in resolved:
+                    grouped.add(resolved[id(column)])
+                else:
+                    grouped_names.add(column.name.lower())
+
+    # Functional dependencies MySQL recognises: columns equated in an inner
+    # JOIN ... ON or WHERE follow each other, and a grouped primary key makes
+    # every column of its table dependent.
+    primary_keys = {}
+    for alias, source in scope.sources.items():
+        if isinstance(source, exp.Table):
+            pk = schema.get(source.name.lower(), {}).get("primary_key")
+            if pk:
+                primary_keys[alias.lower()] = pk
+    equalities = _column_equalities(select, resolved)
+    grouped_sources = set()
+    changed = True
+    while changed:
+        changed = False
+        for a, b in equalities:
+            for x, y in ((a, b), (b, a)):
+                if x in grouped and y not in grouped:
+                    grouped.add(y)
+                    changed = True
+        for alias, pk in primary_keys.items():
+            if alias not in grouped_sources and (alias, pk) in grouped:
+                grouped_sources.add(alias)
+
+    issues = []
+    for projection in select.expressions:
+        if _is_aggregate(projection) or isinstance(projection, exp.Star):
+            continue
+        if projection.unalias().sql(dialect=DIALECT).lower() in grouped_sql:
+            continue
+        if projection.alias_or_name.lower() in grouped_names:
+            continue
+        for column in projection.find_all(exp.Column):
+            key = resolved.get(id(column))
+            if key is None or key in grouped or key[0] in grouped_sources:
+                continue
+            text = column.sql(dialect=DIALECT)
+            if group:
+                issues.append(f"Column '{text}' is selected but neither aggregated nor in GROUP BY.")
+            else:
+                issues.append(
+                    f"Column '{text}' is selected alongside an aggregate without GROUP BY; "
+                    "add it to GROUP BY or aggregate it."
+                )
+    return issues
+
+
+def _column_equalities(select: exp.Select, resolved: dict) -> list[tuple]:
+    """(alias, column) pairs equated by inner JOIN conditions and top-level WHERE."""
+    conditions = []
+    for join in select.args.get("joins") or []:
+        if join.side:   # LEFT / RIGHT joins do not make columns equal
+            continue
+        if join.args.get("on"):
+            conditions.append(join.args["on"])
+    if select.args.get("where"):
+        conditions.append(select.args["where"].this)
+
+    pairs = []
+    for condition in conditions:
+        for eq in condition.flatten() if isinstance(condition, exp.And) else [condition]:
+            if isinstance(eq, exp.EQ) and isinstance(eq.left, exp.Column) and isinstance(eq.right, exp.Column):
+                left, right = resolved.get(id(eq.left)), resolved.get(id(eq.right))
+                if left and right:
+                    pairs.append((left, right))
+    return pairs
+
+
+# ------------------------------------------------------------
+# JOIN keys against the foreign-key graph
+# ------------------------------------------------------------
+def _join_operand(column: exp.Column, tables: dict, schema: dict):
+    """(alias, table, column) of a JOIN ... ON operand, or None if it is not a base-table column."""
+    name = column.name.lower()
+    if column.table:
+        alias = column.table.lower()
+        return (alias, tables[alias], name) if alias in tables else None
+    owners = [a for a, t in tables.items() if name in schema.get(t, {}).get("columns", {})]
+    return (owners[0], tables[owners[0]], name) if len(owners) == 1 else None
+
+
+def _check_joins(scope: Scope, schema: dict, join_graph) -> list[str]:
+    """
+    JOINs whose ON clause links the newly joined table to the tables
+    already in scope only through columns no foreign key links, with the
+    join path the schema graph expects instead. One FK-backed equality is
+    enough: extra predicates (l.property = p.property) are not flagged.
+    """
+    select = scope.expression
+    if not isinstance(select, exp.Select):
+        return []
+    tables = {alias.lower(): source.name.lower() for alias, source in scope.sources.items()
+              if isinstance(source, exp.Table) and source.name.lower() in join_graph.paths}
+
+    from_ = select.args.get("from") or select.args.get("from_")
+    in_scope = {from_.this.alias_or_name.lower()} if from_ is not None else set()
+    issues = []
+    for join in select.args.get("joins") or []:
+        joined = join.this.alias_or_name.lower()
+        on = join.args.get("on")
+        if on is None or joined not in tables:
+            in_scope.add(joined)
+            continue
+
+        written, follows, linked = [], False, set()
+        for eq in on.find_all(exp.EQ):
+            if not (isinstance(eq.left, exp.Column) and isinstance(eq.right, exp.Column)):
+                continue
+            left = _join_operand(eq.left, tables, schema)
+            right = _join_operand(eq.right, tables, schema)
+            if not left or not right or left[1] == right[1]:
+                continue
+            if right[0] == joined:
+                left, right = right, left
+            if left[0] != joined or right[0] not in in_scope:
+                continue
+            written.append(eq.sql(dialect=DIALECT))
+            linked.add(right[1])
+            follows = follows or join_graph.joinable(left[1:], right[1:])
+        in_scope.add(joined)
+        if not written or follows:
+            continue
+
+        table = tables[joined]
+        paths = [join_graph.join_path(other, table) for other in sorted(linked)]
+        paths = [p for p in paths if p]
+        if paths:
+            nearest = min(paths, key=len)
+            expected = " then ".join(fk.condition() for fk in join_graph.join_chain([nearest[0], table]))
+            issues.append(
+                f"JOIN condition {' AND '.join(written)} does not follow a foreign key between "
+                f"{table} and {nearest[0]}. Join them through: {expected}."
+            )
+        else:
+            issues.append(
+                f"JOIN condition {' AND '.join(written)}: no foreign key path links {table} "
+                f"and {', '.join(sorted(linked))}."
+            )
+    return issues
+
+
+def check_sql(sql: str, table_metadata: list, schema: dict | None = None,
+              join_graph=None) -> list[str]:
+    """
+    Returns a list of human-readable issues for the SQL, [] if none were
+    found. The table metadata supplies the known tables and columns; pass a
+    precomputed schema_from_metadata() result to skip rebuilding it. With a
+    schema_graph.SchemaGraph, JOIN conditions are checked against its
+    foreign keys.
+    """
+    if not sql or not sql.strip():
+        return ["No SQL was generated."]
+
+    issues = _check_tokens(sql)
+    if any(i.startswith("SQL could not be tokenized") for i in issues):
+        return issues
+
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=DIALECT) if s is not None]
+    except ParseError as e:
+        if not e.errors:
+            return issues + [f"SQL syntax error: {e}"]
+        error = e.errors[0]
+        return issues + [
+            f"SQL syntax error near '{error.get('highlight', '')}' "
+            f"(line {error.get('line')}, column {error.get('col')}): {error.get('description')}"
+        ]
+
+    if schema is None:
+        schema = schema_from_metadata(table_metadata)
+    for statement in statements:
+        if not isinstance(statement, exp.Query):
+            issues.append(f"Only SELECT queries are allowed, got {statement.key.upper()}.")
+            continue
+        for scope in traverse_scope(statement):
+            issues += _check_scope(scope, schema)
+            if join_graph is not None:
+                issues += _check_joins(scope, schema, join_graph)
+
+    # Keep order, drop duplicates (the same column can be flagged in several clauses).
+    return list(dict.fromkeys(issues))
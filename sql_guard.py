@@ -0,0 +1,162 @@
+import sqlglot
+from sqlglot import exp
+from sqlglot.dialects.mysql import MySQL
+from sqlglot.errors import ParseError, TokenError
+from sqlglot.tokens import TokenType
+
+
+# ============================================================
+# PRE-EXECUTION GUARD
+# ============================================================
+# Runs in the executor right before MySQL sees the query:
+#   - only a single read-only SELECT may run
+#   - EXPLAIN estimates how many rows the plan scans and how many row
+#     combinations its joins produce; plans over budget are sent back to
+#     the generator instead of pinning the server
+#   - every statement carries a MAX_EXECUTION_TIME hint (the executor
+#     also kills it client-side if the server does not stop it)
+
+DIALECT = "mysql"
+
+DEFAULT_MAX_SCANNED_ROWS = 1_000_000
+DEFAULT_MAX_FANOUT = 1_000_000
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+# Functions that block, take locks or read server files.
+SIDE_EFFECT_FUNCTIONS = {"SLEEP", "BENCHMARK", "GET_LOCK", "RELEASE_LOCK", "LOAD_FILE"}
+
+# EXPLAIN access types that read every row of the table or index.
+FULL_SCAN_TYPES = {"ALL", "index"}
+
+
+# ------------------------------------------------------------
+# Read-only check
+# ------------------------------------------------------------
+def read_only_issues(sql: str) -> list[str]:
+    """Issues if sql is anything but one SELECT without locks, INTO or side effects."""
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=DIALECT) if s is not None]
+    except (ParseError, TokenError) as e:
+        return [f"Query could not be parsed as a single SELECT: {str(e).splitlines()[0]}"]
+
+    if len(statements) != 1:
+        return [f"Only one statement may run; found {len(statements)}."]
+    statement = statements[0]
+    if not isinstance(statement, (exp.Select, exp.SetOperation)):
+        return [f"Only read-only SELECT queries may run; found {statement.key.upper()}."]
+
+    issues = []
+    if any(statement.find_all(exp.Lock)):
+        issues.append("Locking reads (FOR UPDATE / LOCK IN SHARE MODE) are not allowed.")
+    if any(statement.find_all(exp.Into)):
+        issues.append("SELECT ... INTO is not allowed; return the rows instead.")
+    for func in statement.find_all(exp.Anonymous):
+        if str(func.this).upper() in SIDE_EFFECT_FUNCTIONS:
+            issues.append(f"Function {str(func.this).upper()}() is not allowed.")
+    return issues
+
+
+# ------------------------------------------------------------
+# Statement time limit
+# ------------------------------------------------------------
+def add_time_limit_hint(sql: str, timeout_ms: int) -> str:
+    """
+    Adds /*+ MAX_EXECUTION_TIME(ms) */ after the first top-level SELECT
+    (after any WITH clause). Queries without one, e.g. a parenthesised
+    UNION, are returned unchanged and rely on the client-side kill.
+    """
+    try:
+        tokens = MySQL().tokenize(sql)
+    except TokenError:
+        return sql
+    depth = 0
+    for token in tokens:
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+        elif token.token_type == TokenType.R_PAREN:
+            depth -= 1
+        elif token.token_type == TokenType.SELECT and depth == 0:
+            end = token.end + 1
+            return f"{sql[:end]} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{sql[end:]}"
+    return sql
+
+
+# ------------------------------------------------------------
+# EXPLAIN cost estimate
+# ------------------------------------------------------------
+def _number(value, default: float) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def estimate_plan(explain_rows: list[dict]) -> dict | None:
+    """
+    Estimates cost from MySQL's tabular EXPLAIN output. Returns None when
+    the rows do not look like MySQL EXPLAIN (other engines, errors).
+
+    Within one SELECT (same `id`) tables are joined as nested loops: each
+    table is read `rows` times per row combination produced so far, and
+    keeps `filtered` percent of what it reads.
+
+    {
+        "scanned_rows": rows read over all tables,
+        "fanout": largest row-combination count of any SELECT,
+        "tables": [{"table", "type", "rows", "key"}],
+    }
+    """
+    if not explain_rows or not all("rows" in r and "table" in r for r in explain_rows):
+        return None
+
+    scanned = 0.0
+    fanout = 0.0
+    combos = {}
+    tables = []
+    for row in explain_rows:
+        rows = max(_number(row.get("rows"), 1.0), 1.0)
+        filtered = _number(row.get("filtered"), 100.0) / 100
+        select_id = row.get("id")
+        before = combos.get(select_id, 1.0)
+        scanned += before * rows
+        combos[select_id] = max(before * rows * filtered, 1.0)
+        fanout = max(fanout, combos[select_id])
+        tables.append({
+            "table": row.get("table"),
+            "type": row.get("type"),
+            "rows": int(rows),
+            "key": row.get("key"),
+        })
+    return {"scanned_rows": scanned, "fanout": fanout, "tables": tables}
+
+
+def _format_count(value: float) -> str:
+    if value < 1e6:
+        return str(int(value))
+    return f"{value:.1e}"
+
+
+def plan_issues(plan: dict | None, max_scanned_rows: float = DEFAULT_MAX_SCANNED_ROWS,
+                max_fanout: float = DEFAULT_MAX_FANOUT) -> list[str]:
+    """Feedback for the generator when the estimated plan is over budget."""
+    if plan is None:
+        return []
+    over = []
+    if plan["scanned_rows"] > max_scanned_rows:
+        over.append(f"scans ~{_format_count(plan['scanned_rows'])} rows (limit {_format_count(max_scanned_rows)})")
+    if plan["fanout"] > max_fanout:
+        over.append(f"joins produce ~{_format_count(plan['fanout'])} row combinations (limit {_format_count(max_fanout)})")
+    if not over:
+        return []
+
+    issues = [f"Query plan is too expensive: it {' and '.join(over)}."]
+    full_scans = [t for t in plan["tables"] if t["type"] in FULL_SCAN_TYPES and t["key"] is None]
+    if len(full_scans) > 1:
+        names = ", ".join(f"{t['table']} ({t['rows']} rows)" for t in full_scans)
+        issues.append(
+            f"Tables joined without a usable key: {names}. "
+            "Check that every JOIN ... ON matches the related key columns."
+        )
+    else:
+        issues.append("Add selective WHERE filters or aggregate before joining.")
+    return issues
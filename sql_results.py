@@ -0,0 +1,105 @@
+from result_profile import StreamingProfile
+
+
+# ============================================================
+# BOUNDED RESULT ENVELOPES
+# ============================================================
+# Rows are read from an unbuffered cursor one batch at a time. Only the
+# first `max_rows` are kept; the rest are counted (up to `count_limit`)
+# so the validator sees the size of the result without the result itself.
+# The first `profile_limit` rows are profiled as they are read, not kept.
+
+DEFAULT_MAX_ROWS = 50
+DEFAULT_COUNT_LIMIT = 10000
+DEFAULT_PROFILE_LIMIT = 2000
+FETCH_BATCH_SIZE = 500
+
+
+def column_info(description, type_name=None) -> list[dict]:
+    """[{"name", "type"}] from a DB-API cursor.description."""
+    columns = []
+    for col in description or []:
+        code = col[1] if len(col) > 1 else None
+        if type_name is not None and code is not None:
+            try:
+                kind = type_name(code)
+            except Exception:
+                kind = str(code)
+        else:
+            kind = "" if code is None else str(code)
+        columns.append({"name": col[0], "type": kind})
+    return columns
+
+
+def iter_cursor_rows(cursor, batch_size: int = FETCH_BATCH_SIZE):
+    """Yields rows from an executed cursor without materialising the result."""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def build_envelope(cursor, max_rows: int = DEFAULT_MAX_ROWS,
+                   count_limit: int = DEFAULT_COUNT_LIMIT, type_name=None,
+                   profile_limit: int = 0) -> dict:
+    """
+    Reads at most count_limit rows from an executed cursor and returns:
+
+    {
+        "columns": [{"name": ..., "type": ...}],
+        "rows": first max_rows rows,
+        "row_count": rows seen,
+        "row_count_exact": False if the result has more than count_limit rows,
+        "truncated": True if rows holds fewer rows than the result,
+        "profile": per-column statistics of the first profile_limit rows
+                   (result_profile.StreamingProfile), only if profile_limit > 0,
+    }
+
+    When row_count_exact is False the cursor still has unread rows; the
+    caller decides whether to drain it or drop the connection.
+    """
+    columns = column_info(cursor.description, type_name)
+    profiler = StreamingProfile(columns) if profile_limit > 0 else None
+    rows = []
+    count = 0
+    exact = True
+    for row in iter_cursor_rows(cursor, min(FETCH_BATCH_SIZE, max(count_limit, 1))):
+        if count >= count_limit:
+            exact = False
+            break
+        if count < max_rows:
+            rows.append(row)
+        if profiler is not None and count < profile_limit:
+            profiler.add(row)
+        count += 1
+
+    envelope = {
+        "columns": columns,
+        "rows": rows,
+        "row_count": count,
+        "row_count_exact": exact,
+        "truncated": count > max_rows or not exact,
+    }
+    if profiler is not None:
+        envelope["profile"] = profiler.result()
+    return envelope
+
+
+def error_envelope(error: Exception | str) -> dict:
+    error_class = type(error).__name__ if isinstance(error, Exception) else "Error"
+    return {
+        "columns": [],
+        "rows": [{"error": str(error)}],
+        "row_count": 0,
+        "row_count_exact": True,
+        "truncated": False,
+        "error": str(error),
+        "error_class": error_class,
+    }
+
+
+def describe_row_count(envelope: dict) -> str:
+    if envelope.get("row_count_exact", True):
+        return str(envelope.get("row_count", 0))
+    return f"more than {envelope.get('row_count', 0)}"
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.healthy = True
+        self.closed = False
+        self.can_rollback = True
+
+    def is_connected(self):
+        return self.healthy
+
+    def rollback(self):
+        if not self.can_rollback:
+            raise RuntimeError("connection lost")
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.made = []
+
+    def __call__(self):
+        conn = FakeConnection(len(self.made))
+        self.made.append(conn)
+        return conn
+
+
+@pytest.fixture
+def factory():
+    return Factory()
+
+
+def test_size_must_be_positive(factory):
+    with pytest.raises(ValueError):
+        ConnectionPool(factory, size=0)
+
+
+def test_connections_are_reused(factory):
+    pool = ConnectionPool(factory, size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(factory.made) == 1
+    stats = pool.stats()
+    assert (stats["borrows"], stats["created"], stats["in_use"], stats["idle"]) == (2, 1, 0, 1)
+
+
+def test_borrow_times_out_when_exhausted(factory):
+    pool = ConnectionPool(factory, size=1)
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+    pool.release(conn)
+
+
+def test_waiting_borrower_gets_the_released_connection(factory):
+    pool = ConnectionPool(factory, size=1)
+    conn = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    pool.release(conn)
+    waiter.join(5)
+    assert got == [conn]
+    assert pool.stats()["waits"] == 1
+
+
+def test_unhealthy_connection_is_replaced(factory):
+    pool = ConnectionPool(factory, size=1)
+    with pool.connection() as conn:
+        pass
+    conn.healthy = False
+    with pool.connection() as replacement:
+        pass
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["failed_health_checks"] == 1
+
+
+def test_failed_block_discards_a_connection_that_cannot_roll_back(factory):
+    pool = ConnectionPool(factory, size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.can_rollback = False
+            raise ValueError("query failed")
+    assert conn.closed
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["in_use"] == 0
+
+
+def test_failed_block_keeps_a_connection_that_rolled_back(factory):
+    pool = ConnectionPool(factory, size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("query failed")
+    assert not conn.closed
+    assert pool.stats()["idle"] == 1
+
+
+def test_factory_failure_frees_the_slot():
+    def failing():
+        raise ConnectionError("database down")
+
+    pool = ConnectionPool(failing, size=1)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            pool.acquire(timeout=0.05)
+    assert pool.stats()["in_use"] == 0
+
+
+def test_idle_connections_are_evicted(factory):
+    pool = ConnectionPool(factory, size=2, max_idle_seconds=0.0)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.01)
+    assert pool.evict_idle() == 1
+    assert conn.closed
+
+
+def test_close_closes_idle_and_released_connections(factory):
+    pool = ConnectionPool(factory, size=2)
+    idle = pool.acquire()
+    borrowed = pool.acquire()
+    pool.release(idle)
+    pool.close()
+    assert idle.closed and not borrowed.closed
+    pool.release(borrowed)
+    assert borrowed.closed
+    with pytest.raises(RuntimeError):
+        pool.acquire()
@@ -0,0 +1,85 @@
+import pytest
+
+from example_store import ExampleStore, sql_fingerprint
+
+STOCK_SQL = "SELECT stock FROM master_product WHERE product_id = 'CH-001'"
+PRICE_SQL = "SELECT price FROM master_product WHERE product_id = 'CH-001'"
+RECIPE_SQL = "SELECT raw_material_id, recipe_percentage FROM opt_recipe WHERE scenario_id = 3"
+
+
+@pytest.fixture
+def store():
+    store = ExampleStore(":memory:", schema_hash="v1")
+    store.add("What is the stock of CH-001?", STOCK_SQL)
+    store.add("What is the price of CH-001?", PRICE_SQL)
+    store.add("Show the recipe of scenario 3", RECIPE_SQL)
+    return store
+
+
+def test_sql_fingerprint():
+    assert sql_fingerprint("SELECT  a\nFROM t;") == sql_fingerprint("select a from t")
+
+
+def test_duplicates_are_not_stored(store):
+    assert not store.add("what is the inventory of ch-001", "SELECT 1")
+    assert not store.add("stock please", STOCK_SQL.lower() + ";")
+    assert store.stats()["duplicates"] == 2
+    assert store.stats()["entries"] == 3
+
+
+def test_search_returns_the_most_similar_pairs(store):
+    examples = store.search("what is the stock of CH-002", k=2)
+    assert examples[0]["sql"] == STOCK_SQL
+    assert all(e["sql"] != RECIPE_SQL for e in examples)
+    assert examples[0]["score"] >= examples[-1]["score"]
+
+
+def test_search_with_no_similar_pairs(store):
+    assert store.search("weather limits of ankara") == []
+    assert store.search("stock of CH-001", k=0) == []
+
+
+def test_least_recently_retrieved_is_evicted(monkeypatch):
+    import example_store
+
+    clock = iter(range(100, 200))
+    monkeypatch.setattr(example_store.time, "time", lambda: next(clock))
+    store = ExampleStore(":memory:", max_entries=2)
+    store.add("stock of CH-001", STOCK_SQL)
+    store.add("price of CH-001", PRICE_SQL)
+    store.search("stock of CH-001", k=1)
+    store.add("recipe of scenario 3", RECIPE_SQL)
+    assert PRICE_SQL not in [e["sql"] for e in store.search("price of CH-001")]
+    assert store.stats()["evicted"] == 1
+
+
+def test_schema_change_drops_the_examples(tmp_path):
+    path = str(tmp_path / "examples.sqlite3")
+    ExampleStore(path, schema_hash="v1").add("stock of CH-001", STOCK_SQL)
+    assert ExampleStore(path, schema_hash="v1").stats()["entries"] == 1
+    assert ExampleStore(path, schema_hash="v2").stats()["entries"] == 0
+
+
+def test_store_without_a_schema_hash_keeps_its_examples(tmp_path):
+    path = str(tmp_path / "examples.sqlite3")
+    ExampleStore(path, schema_hash="v1").add("stock of CH-001", STOCK_SQL)
+    reopened = ExampleStore(path)
+    assert reopened.stats()["entries"] == 1
+    assert reopened.stats()["invalidated"] == 0
+
+
+def test_factory_store_survives_a_restart(tmp_path, monkeypatch):
+    import txt2sql
+
+    monkeypatch.setenv("FEW_SHOT_PATH", str(tmp_path / "examples.sqlite3"))
+    monkeypatch.setattr(txt2sql, "_example_store", None)
+    store = txt2sql.get_example_store()
+    # prepare_run() records the schema hash on every question.
+    store.set_schema_hash(txt2sql.get_registry().content_hash)
+    store.add("stock of CH-001", STOCK_SQL)
+
+    # A new process builds the store again through the factory.
+    monkeypatch.setattr(txt2sql, "_example_store", None)
+    reopened = txt2sql.get_example_store()
+    assert reopened.stats()["entries"] == 1
+    assert reopened.search("stock of CH-002")[0]["sql"] == STOCK_SQL
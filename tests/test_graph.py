@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+GOOD_SQL = "SELECT product_name, price FROM master_product;"
+FAILING_SQL = "SELECT product_name FROM master_product ORDER BY 5;"
+REJECTED_SQL = "SELECT nope FROM master_product;"
+
+
+class ScriptedLLM:
+    """Writes first_sql, rejects it in the validator, then repairs it into REJECTED_SQL."""
+
+    def __init__(self, first_sql=GOOD_SQL):
+        self.first_sql = first_sql
+        self.prompts = []
+
+    def invoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        if "expert SQL validator" in prompt:
+            return json.dumps({"valid": False, "issues": ["Prices are needed per scenario."],
+                               "regenerate_sql": True})
+        if "FAILING SQL:" in prompt:
+            return REJECTED_SQL
+        return self.first_sql
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    """txt2sql on a scripted LLM and a SQLite replica, with in-memory stores."""
+    import txt2sql
+    from backends import SQLiteReplicaBackend
+    from checkpoints import CheckpointStore
+    from example_store import ExampleStore
+    from sql_cache import QuestionCache
+
+    replica = SQLiteReplicaBackend(str(tmp_path / "replica.sqlite3"))
+    replica.load_examples()
+    monkeypatch.setenv("ENTITY_INDEX", "off")
+    monkeypatch.setattr(txt2sql, "llm", ScriptedLLM())
+    monkeypatch.setattr(txt2sql, "backend", replica)
+    monkeypatch.setattr(txt2sql, "_question_cache", QuestionCache(":memory:"))
+    monkeypatch.setattr(txt2sql, "_example_store", ExampleStore(":memory:"))
+    monkeypatch.setattr(txt2sql, "_checkpoints", CheckpointStore(":memory:"))
+    for name in ("_result_cache", "_result_store", "_app", "_resumable_app"):
+        monkeypatch.setattr(txt2sql, name, None)
+    return txt2sql
+
+
+def test_run_ending_on_a_precheck_rejection_has_no_earlier_rows(offline):
+    final = offline.invoke_graph(offline.prepare_run("List the products"))
+
+    assert final["sql_query"] == REJECTED_SQL
+    assert final["precheck_failed"]
+    assert all("product_name" not in row for row in final["sql_result"])
+    assert final["sql_result_meta"]["error_class"] == "StaticCheckError"
+    assert "nope" in final["sql_result_meta"]["error"]
+
+
+def test_repair_after_a_precheck_rejection_gets_only_its_issues(offline, monkeypatch):
+    # The first query passes the pre-check but fails in the database.
+    monkeypatch.setattr(offline, "llm", ScriptedLLM(FAILING_SQL))
+    offline.invoke_graph(offline.prepare_run("List the products"))
+
+    repairs = [p for p in offline.llm.prompts if "FAILING SQL:" in p]
+    assert len(repairs) > 1
+    assert "ORDER BY term out of range" in repairs[0]
+    # The later repairs follow pre-check rejections of REJECTED_SQL.
+    for prompt in repairs[1:]:
+        assert REJECTED_SQL in prompt
+        assert "ORDER BY term out of range" not in prompt
+        assert "MySQL error" not in prompt
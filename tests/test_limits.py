@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from limits import ConcurrencyLimit, DeadlineExceeded, run_deadline
+
+
+def slots_available(limit, wait_s=0.05):
+    """How many slots the calling context can hold at once (up to 10)."""
+    held = []
+    try:
+        for _ in range(10):
+            slot = limit.slot()
+            try:
+                with run_deadline(time.perf_counter() + wait_s):
+                    slot.__enter__()
+            except DeadlineExceeded:
+                break
+            held.append(slot)
+        return len(held)
+    finally:
+        for slot in held:
+            slot.__exit__(None, None, None)
+
+
+def test_unlimited_until_configured():
+    limit = ConcurrencyLimit("test")
+    assert limit.max_concurrency is None
+    assert slots_available(limit) == 10
+
+
+def test_limited_restores_the_process_limit():
+    limit = ConcurrencyLimit("test", 3)
+    with limit.limited(1):
+        assert limit.max_concurrency == 1
+        assert slots_available(limit) == 1
+    assert limit.max_concurrency == 3
+    assert slots_available(limit) == 3
+
+
+def test_overlapping_scopes_keep_their_own_limit():
+    limit = ConcurrencyLimit("test", 5)
+    entered = threading.Barrier(2)
+    counts = {}
+
+    def batch(name, max_concurrency):
+        with limit.limited(max_concurrency):
+            entered.wait()   # both scopes are open now
+            counts[name] = (limit.max_concurrency, slots_available(limit))
+            entered.wait()
+
+    threads = [threading.Thread(target=batch, args=("a", 1)), threading.Thread(target=batch, args=("b", 2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counts == {"a": (1, 1), "b": (2, 2)}
+    assert limit.max_concurrency == 5
+
+
+def test_limit_must_be_positive():
+    with pytest.raises(ValueError):
+        ConcurrencyLimit("test", 0)
@@ -0,0 +1,142 @@
+import time
+
+import pytest
+
+from limits import DeadlineExceeded, run_deadline
+from llm_cache import CachedLLM, LLMResponseCache, response_key
+from llm_stream import call_llm, complete_sql
+
+
+class FakeLLM:
+    model_id = "fake/model"
+
+    def __init__(self, params=None, chunks=("SELECT 1", ";", "\n\nExplanation: ...")):
+        self.params = dict(params or {"temperature": 0})
+        self.chunks = list(chunks)
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        return "".join(self.chunks)
+
+    def stream(self, prompt, **kwargs):
+        self.calls += 1
+        yield from self.chunks
+
+
+@pytest.fixture
+def cache():
+    return LLMResponseCache(":memory:")
+
+
+def test_response_key_depends_on_model_params_and_prompt():
+    key = response_key("m", {"max_new_tokens": 10}, "prompt")
+    assert key == response_key("m", {"max_new_tokens": 10}, "prompt")
+    assert key != response_key("other", {"max_new_tokens": 10}, "prompt")
+    assert key != response_key("m", {"max_new_tokens": 20}, "prompt")
+    assert key != response_key("m", {"max_new_tokens": 10}, "prompt ")
+
+
+def test_get_put_and_stats(cache):
+    assert cache.get("k") is None
+    cache.put("k", "SELECT 1;")
+    assert cache.get("k") == "SELECT 1;"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"], stats["entries"]) == (1, 1, 1, 1)
+    assert stats["bytes"] == len("SELECT 1;")
+
+
+def test_least_recently_used_is_evicted_by_bytes(monkeypatch):
+    import llm_cache
+
+    clock = iter(range(1000, 2000, 100))
+    monkeypatch.setattr(llm_cache.time, "time", lambda: next(clock))
+    cache = LLMResponseCache(":memory:", max_bytes=20)
+    cache.put("a", "x" * 8)
+    cache.put("b", "y" * 8)
+    cache.get("a")
+    cache.put("c", "z" * 8)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 8
+    assert cache.stats()["evicted"] == 1
+
+
+def test_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    LLMResponseCache(path).put("k", "SELECT 1;")
+    assert LLMResponseCache(path).get("k") == "SELECT 1;"
+
+
+def test_cached_invoke_calls_the_client_once(cache):
+    llm = FakeLLM()
+    cached = CachedLLM(llm, cache)
+    first = cached.invoke("prompt", params={"max_new_tokens": 10})
+    second = cached.invoke("prompt", params={"max_new_tokens": 10})
+    assert first == second
+    assert llm.calls == 1
+    cached.invoke("prompt", params={"max_new_tokens": 20})
+    assert llm.calls == 2
+
+
+def test_sampled_calls_are_not_cached(cache):
+    llm = FakeLLM(params={"temperature": 0.7})
+    cached = CachedLLM(llm, cache)
+    cached.invoke("prompt")
+    cached.invoke("prompt")
+    assert llm.calls == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_finished_stream_is_stored(cache):
+    llm = FakeLLM()
+    cached = CachedLLM(llm, cache)
+    assert "".join(cached.stream("prompt")) == "SELECT 1;\n\nExplanation: ..."
+    assert list(cached.stream("prompt")) == ["SELECT 1;\n\nExplanation: ..."]
+    assert llm.calls == 1
+
+
+def test_stream_closed_once_complete_is_stored_up_to_where_it_stopped(cache):
+    llm = FakeLLM()
+    cached = CachedLLM(llm, cache)
+    stream = cached.stream("prompt", complete=complete_sql)
+    assert next(stream) + next(stream) == "SELECT 1;"
+    stream.close()
+
+    assert list(cached.stream("prompt")) == ["SELECT 1;"]
+    assert llm.calls == 1
+
+
+@pytest.mark.parametrize("complete", [None, complete_sql])
+def test_stream_abandoned_before_complete_is_not_stored(cache, complete):
+    llm = FakeLLM()
+    cached = CachedLLM(llm, cache)
+    stream = cached.stream("prompt", complete=complete)
+    assert next(stream) == "SELECT 1"
+    stream.close()
+
+    assert cache.stats()["entries"] == 0
+    assert "".join(cached.stream("prompt")) == "SELECT 1;\n\nExplanation: ..."
+    assert llm.calls == 2
+
+
+def test_call_llm_cut_by_the_deadline_is_not_cached(cache):
+    class SlowLLM(FakeLLM):
+        def stream(self, prompt, **kwargs):
+            self.calls += 1
+            for chunk in self.chunks:
+                yield chunk
+                time.sleep(0.05)
+
+    llm = SlowLLM(chunks=("SELECT a ", "FROM t", ";"))
+    cached = CachedLLM(llm, cache)
+    with run_deadline(time.perf_counter() + 0.02), pytest.raises(DeadlineExceeded):
+        call_llm(cached, "prompt", "generator", complete_sql)
+    assert cache.stats()["entries"] == 0
+
+    assert call_llm(cached, "prompt", "generator", complete_sql) == "SELECT a FROM t;"
+    assert call_llm(cached, "prompt", "generator", complete_sql) == "SELECT a FROM t;"
+    assert llm.calls == 2
+
+
+def test_client_attributes_pass_through(cache):
+    assert CachedLLM(FakeLLM(), cache).model_id == "fake/model"
@@ -0,0 +1,88 @@
+import pytest
+
+from limits import DeadlineExceeded, run_deadline
+from llm_stream import call_llm, complete_json, complete_sql, node_settings
+
+
+class StreamingLLM:
+    params = {"temperature": 0}
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.sent = 0
+        self.closed = False
+        self.kwargs = None
+
+    def stream(self, prompt, **kwargs):
+        self.kwargs = kwargs
+        try:
+            for chunk in self.chunks:
+                self.sent += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+    def invoke(self, prompt, **kwargs):
+        return "".join(self.chunks)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("SELECT 1", None),
+    ("SELECT 1;", "SELECT 1;"),
+    ("SELECT 1; SELECT 2;", "SELECT 1;"),
+    ("SELECT ';' AS s", None),
+    ("SELECT ';' AS s;", "SELECT ';' AS s;"),
+    ("SELECT 'it\\'s;' AS s;", "SELECT 'it\\'s;' AS s;"),
+    ("SELECT a -- no; comment\nFROM t;", "SELECT a -- no; comment\nFROM t;"),
+    ("SELECT a /* x; */ FROM t", None),
+    ("Here you go:\n```sql\nSELECT a\nFROM t\n", None),
+    ("```sql\nSELECT a FROM t\n```\nExplanation", "SELECT a FROM t"),
+    ("```sql\nSELECT a FROM t;\nSELECT b", "SELECT a FROM t;"),
+])
+def test_complete_sql(text, expected):
+    assert complete_sql(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"valid": true', None),
+    ('{"valid": true}', '{"valid": true}'),
+    ('Result: {"issues": ["a } b"], "valid": false} trailing', '{"issues": ["a } b"], "valid": false}'),
+    ('{"issues": ["quote \\" }"]', None),
+    ('{"a": {"b": 1}}', '{"a": {"b": 1}}'),
+    ("no json here", None),
+])
+def test_complete_json(text, expected):
+    assert complete_json(text) == expected
+
+
+def test_node_settings_overrides(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_NEW_TOKENS_VALIDATOR", "64")
+    monkeypatch.setenv("LLM_STOP_VALIDATOR", '["###"]')
+    assert node_settings("validator") == {"max_new_tokens": 64, "stop": ["###"]}
+    assert node_settings("generator")["max_new_tokens"] == 1024
+
+
+def test_call_llm_stops_once_usable():
+    llm = StreamingLLM(["SELECT a ", "FROM t;", "\n\nThis query ", "selects a."])
+    assert call_llm(llm, "prompt", "generator", complete_sql) == "SELECT a FROM t;"
+    assert llm.sent == 2
+    assert llm.closed
+    assert llm.kwargs["params"]["max_new_tokens"] == node_settings("generator")["max_new_tokens"]
+
+
+def test_call_llm_returns_everything_without_a_complete_statement():
+    llm = StreamingLLM(["SELECT a ", "FROM t"])
+    assert call_llm(llm, "prompt", "generator", complete_sql) == "SELECT a FROM t"
+
+
+def test_call_llm_applies_the_detector_without_streaming():
+    llm = StreamingLLM(['{"valid": true}', " and more"])
+    assert call_llm(llm, "prompt", "validator", complete_json, streaming=False) == '{"valid": true}'
+    assert llm.sent == 0
+
+
+def test_call_llm_checks_the_deadline():
+    llm = StreamingLLM(["SELECT 1;"])
+    with run_deadline(0.0), pytest.raises(DeadlineExceeded):
+        call_llm(llm, "prompt", "generator", complete_sql)
+    assert llm.sent == 0
@@ -0,0 +1,152 @@
+import pytest
+
+from result_cache import ResultCache, canonical_sql
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, versions=None):
+        self.versions = dict(versions or {"master_product": "1"})
+        self.fail = False
+        self.polls = 0
+
+    def table_versions(self, tables):
+        self.polls += 1
+        if self.fail:
+            return {}
+        return {t: self.versions.get(t) for t in tables}
+
+
+class Executor:
+    def __init__(self, envelope=None):
+        self.envelope = envelope or {"rows": [{"product_name": "ChemAlloy B12"}], "row_count": 1}
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.envelope)
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+@pytest.fixture
+def cache():
+    return ResultCache(version_ttl_s=0)
+
+
+def test_canonical_sql_ignores_formatting_and_aliases():
+    a = canonical_sql("select p.product_name from master_product p -- names\n where p.price > 20")
+    b = canonical_sql("SELECT  prod.product_name\nFROM `MASTER_PRODUCT` AS prod WHERE prod.PRICE > 20")
+    assert a is not None and a == b
+    assert a[1] == frozenset({"master_product"})
+
+
+def test_canonical_sql_keeps_output_column_case():
+    assert canonical_sql("SELECT Price FROM master_product") != canonical_sql("SELECT price FROM master_product")
+
+
+def test_canonical_sql_rejects_uncacheable_queries():
+    assert canonical_sql("SELECT NOW()") is None
+    assert canonical_sql("SELECT RAND() FROM master_product") is None
+    assert canonical_sql("SELECT 1; SELECT 2") is None
+    assert canonical_sql("DELETE FROM master_product") is None
+
+
+def test_canonical_sql_leaves_ctes_out_of_the_tables():
+    _, tables = canonical_sql("WITH x AS (SELECT product_id FROM master_product) SELECT * FROM x")
+    assert tables == frozenset({"master_product"})
+
+
+def test_equivalent_sql_hits(cache, backend):
+    execute = Executor()
+    first = cache.get_or_execute(backend, "SELECT product_name FROM master_product", execute)
+    second = cache.get_or_execute(backend, "select product_name\n  from `MASTER_PRODUCT` -- all products", execute)
+    assert execute.calls == 1
+    assert "result_cache" not in first
+    assert second["result_cache"] == "hit"
+    assert second["rows"] == first["rows"]
+
+
+def test_execution_parameters_are_part_of_the_key(cache, backend):
+    execute = Executor()
+    cache.get_or_execute(backend, "SELECT product_name FROM master_product", execute, 100)
+    cache.get_or_execute(backend, "SELECT product_name FROM master_product", execute, 10)
+    assert execute.calls == 2
+
+
+def test_changed_table_version_invalidates(cache, backend):
+    execute = Executor()
+    cache.get_or_execute(backend, "SELECT product_name FROM master_product", execute)
+    backend.versions["master_product"] = "2"
+    cache.get_or_execute(backend, "SELECT product_name FROM master_product", execute)
+    assert execute.calls == 2
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_bump_invalidates_at_once(backend):
+    cache = ResultCache(version_ttl_s=3600)
+    execute = Executor()
+    cache.get_or_execute(backend, "SELECT product_name FROM master_product", execute)
+    cache.bump("MASTER_PRODUCT")
+    assert cache.peek(backend, "SELECT product_name FROM master_product") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_versions_are_polled_at_most_every_ttl(backend):
+    cache = ResultCache(version_ttl_s=3600)
+    execute = Executor()
+    for _ in range(3):
+        cache.get_or_execute(backend, "SELECT product_name FROM master_product", execute)
+    assert backend.polls == 1
+
+
+def test_unknown_version_is_neither_served_nor_stored(cache, backend):
+    execute = Executor()
+    sql = "SELECT product_name FROM master_product"
+    cache.get_or_execute(backend, sql, execute)
+
+    backend.versions["master_product"] = None
+    assert cache.peek(backend, sql) is None
+    cache.get_or_execute(backend, sql, execute)
+    assert execute.calls == 2
+
+    backend.versions["master_product"] = "1"
+    backend.fail = True
+    cache.get_or_execute(backend, sql, execute)
+    assert execute.calls == 3
+    stats = cache.stats()
+    assert stats["entries"] == 0
+    assert stats["unversioned"] == 2
+
+
+def test_errors_and_nondeterministic_queries_are_not_cached(cache, backend):
+    failing = Executor({"rows": [{"error": "boom"}], "error": "boom"})
+    cache.get_or_execute(backend, "SELECT product_name FROM master_product", failing)
+    cache.get_or_execute(backend, "SELECT product_name FROM master_product", failing)
+    assert failing.calls == 2
+
+    execute = Executor()
+    cache.get_or_execute(backend, "SELECT NOW() FROM master_product", execute)
+    cache.get_or_execute(backend, "SELECT NOW() FROM master_product", execute)
+    assert execute.calls == 2
+    assert cache.stats()["uncacheable"] == 2
+
+
+def test_least_recently_used_is_evicted(backend):
+    execute = Executor()
+    probe = ResultCache()
+    probe.get_or_execute(backend, "SELECT a FROM master_product", execute)
+    cache = ResultCache(max_bytes=2 * probe.bytes, version_ttl_s=3600)
+
+    cache.get_or_execute(backend, "SELECT a FROM master_product", execute)
+    cache.get_or_execute(backend, "SELECT b FROM master_product", execute)
+    cache.peek(backend, "SELECT a FROM master_product")
+    cache.get_or_execute(backend, "SELECT c FROM master_product", execute)
+
+    assert cache.stats()["evicted"] == 1
+    assert cache.peek(backend, "SELECT a FROM master_product") is not None
+    assert cache.peek(backend, "SELECT b FROM master_product") is None
@@ -0,0 +1,70 @@
+from result_store import ColumnarResult, ResultStore
+
+
+def envelope(n, value="x"):
+    return {"columns": [{"name": "id"}, {"name": "name"}],
+            "rows": [{"id": i, "name": f"{value}{i}"} for i in range(n)],
+            "row_count": n, "row_count_exact": True}
+
+
+def test_columnar_round_trip():
+    original = envelope(3)
+    result = ColumnarResult(original)
+    assert result.columns == ("id", "name")
+    assert result.data == ([0, 1, 2], ["x0", "x1", "x2"])
+    assert result.envelope() == original
+
+
+def test_ragged_rows_are_kept_as_rows():
+    original = {"rows": [{"error": "boom"}, {"id": 1}], "error": "boom"}
+    result = ColumnarResult(original)
+    assert result.columns is None
+    assert result.envelope() == original
+
+
+def test_put_get_meta_and_release():
+    store = ResultStore()
+    handle = store.put(envelope(2))
+    assert store.get(handle)["rows"] == envelope(2)["rows"]
+    assert store.meta(handle) == {k: v for k, v in envelope(2).items() if k != "rows"}
+    store.release(handle, "", "unknown")
+    assert store.get(handle) is None
+    stats = store.stats()
+    assert (stats["puts"], stats["gets"], stats["misses"], stats["released"]) == (1, 1, 1, 1)
+    assert (stats["results"], stats["bytes"]) == (0, 0)
+
+
+def test_put_under_an_existing_handle_replaces_it():
+    store = ResultStore()
+    handle = store.put(envelope(2))
+    assert store.put(envelope(5), handle) == handle
+    assert len(store.get(handle)["rows"]) == 5
+    assert store.stats()["results"] == 1
+    assert store.bytes == ColumnarResult(envelope(5)).size
+
+
+def test_least_recently_used_is_evicted():
+    size = ColumnarResult(envelope(50)).size
+    store = ResultStore(max_bytes=int(2.5 * size))
+    first = store.put(envelope(50))
+    second = store.put(envelope(50))
+    store.get(first)
+    third = store.put(envelope(50))
+
+    assert store.get(second) is None
+    assert store.get(first) is not None
+    assert store.get(third) is not None
+    assert store.stats()["evicted"] == 1
+    assert store.bytes <= store.max_bytes
+
+
+def test_newest_result_stays_even_when_over_the_bound():
+    store = ResultStore(max_bytes=1)
+    store.put(envelope(10))
+    handle = store.put(envelope(10))
+    assert store.get(handle) is not None
+    assert store.stats()["results"] == 1
+
+
+def test_size_grows_with_rows():
+    assert ColumnarResult(envelope(10_000)).size > 10 * ColumnarResult(envelope(100)).size
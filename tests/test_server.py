@@ -0,0 +1,39 @@
+import pytest
+
+import server
+from limits import check_deadline, remaining_s
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(server, "prepare_run", lambda question, *args: {"question": question})
+    monkeypatch.setattr(server, "record_answer", lambda final_state: None)
+    service = server.AgentService(max_concurrency=1, max_queue=0)
+    assert service.try_admit()
+    return service
+
+
+def test_cached_answer_lookup_runs_under_the_request_deadline(service, monkeypatch):
+    seen = []
+
+    def lookup(graph_input):
+        seen.append(remaining_s())
+        return {"question": graph_input["question"], "sql_query": "SELECT 1", "sql_result": [], "valid": True}
+
+    monkeypatch.setattr(server, "lookup_cached_answer", lookup)
+    event = service.answer({"question": "List the products", "deadline_s": 30}, lambda event: None)
+
+    assert event["event"] == "result"
+    assert seen[0] is not None and 0 < seen[0] <= 30
+    assert remaining_s() is None
+
+
+def test_cached_answer_past_the_deadline_is_a_deadline_error(service, monkeypatch):
+    def lookup(graph_input):
+        check_deadline("checking the cached SQL")
+
+    monkeypatch.setattr(server, "lookup_cached_answer", lookup)
+    event = service.answer({"question": "List the products", "deadline_s": 1e-9}, lambda event: None)
+
+    assert event["error"] == "deadline"
+    assert service.stats()["deadline_exceeded"] == 1
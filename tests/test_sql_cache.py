@@ -0,0 +1,104 @@
+import pytest
+
+from sql_cache import QuestionCache, normalize_question
+
+SQL = "SELECT stock FROM master_product WHERE product_id = 'CH-001'"
+
+
+@pytest.fixture
+def cache():
+    cache = QuestionCache(":memory:", schema_hash="v1")
+    yield cache
+    cache.close()
+
+
+def test_normalize_question():
+    assert normalize_question("What is the Inventory of CH-001?") == "what is the stock of ch-001"
+    assert normalize_question("price  >  12.5 , please.") == "price 12.5 please"
+    assert normalize_question("Show inventory", use_synonyms=False) == "show inventory"
+
+
+def test_rephrased_question_hits(cache):
+    cache.put("What is the inventory of CH-001?", SQL)
+    assert cache.get("what is the stock of ch-001") == SQL
+    assert cache.get("What is the stock of CH-002?") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_expired_entries_miss():
+    cache = QuestionCache(":memory:", ttl_seconds=-1)
+    cache.put("stock of CH-001", SQL)
+    assert cache.get("stock of CH-001") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_is_evicted(monkeypatch):
+    import sql_cache
+
+    clock = iter(range(100, 200))
+    monkeypatch.setattr(sql_cache.time, "time", lambda: next(clock))
+    cache = QuestionCache(":memory:", max_entries=2)
+    cache.put("first", "SELECT 1")
+    cache.put("second", "SELECT 2")
+    cache.get("first")
+    cache.put("third", "SELECT 3")
+    assert cache.get("second") is None
+    assert cache.get("first") == "SELECT 1"
+    assert cache.stats()["evicted"] == 1
+
+
+def test_invalidate(cache):
+    cache.put("stock of CH-001", SQL)
+    cache.put("price of CH-001", SQL)
+    cache.invalidate("Stock of CH-001")
+    assert cache.get("stock of CH-001") is None
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["invalidated"] == 2
+
+
+def test_schema_change_clears_a_persistent_cache(tmp_path):
+    path = str(tmp_path / "questions.sqlite3")
+    cache = QuestionCache(path, schema_hash="v1")
+    cache.put("stock of CH-001", SQL)
+    cache.close()
+
+    same = QuestionCache(path, schema_hash="v1")
+    assert same.get("stock of CH-001") == SQL
+    same.close()
+
+    changed = QuestionCache(path, schema_hash="v2")
+    assert changed.get("stock of CH-001") is None
+    changed.close()
+
+
+def test_cache_without_a_schema_hash_keeps_its_entries(tmp_path):
+    path = str(tmp_path / "questions.sqlite3")
+    cache = QuestionCache(path, schema_hash="v1")
+    cache.put("stock of CH-001", SQL)
+    cache.close()
+
+    reopened = QuestionCache(path)
+    assert reopened.get("stock of CH-001") == SQL
+    assert reopened.stats()["invalidated"] == 0
+    reopened.close()
+
+
+def test_factory_cache_survives_a_restart(tmp_path, monkeypatch):
+    import txt2sql
+
+    monkeypatch.setenv("SQL_CACHE_PATH", str(tmp_path / "questions.sqlite3"))
+    monkeypatch.setattr(txt2sql, "_question_cache", None)
+    cache = txt2sql.get_question_cache()
+    # prepare_run() records the schema hash on every question.
+    cache.set_schema_hash(txt2sql.get_registry().content_hash)
+    cache.put("stock of CH-001", SQL)
+    cache.close()
+
+    # A new process builds the cache again through the factory.
+    monkeypatch.setattr(txt2sql, "_question_cache", None)
+    cache = txt2sql.get_question_cache()
+    assert cache.get("stock of CH-001") == SQL
+    assert cache.stats()["invalidated"] == 0
+    cache.close()
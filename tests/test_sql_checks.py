@@ -0,0 +1,100 @@
+import pytest
+
+from schema_graph import SchemaGraph
+from schema_registry import get_registry
+from sql_checks import check_sql
+
+
+@pytest.fixture(scope="module")
+def tables():
+    return get_registry().tables
+
+
+@pytest.fixture(scope="module")
+def graph(tables):
+    return SchemaGraph(tables)
+
+
+def test_valid_query_has_no_issues(tables, graph):
+    sql = ("SELECT r.raw_material_name, o.recipe_quantity FROM master_raw_material r "
+           "JOIN opt_recipe o ON o.raw_material_id = r.raw_material_id WHERE o.scenario_id = 3")
+    assert check_sql(sql, tables, join_graph=graph) == []
+
+
+def test_empty_sql(tables):
+    assert check_sql("  ", tables) == ["No SQL was generated."]
+
+
+def test_unknown_table_lists_known_tables(tables):
+    issues = check_sql("SELECT * FROM master_prodct", tables)
+    assert len(issues) == 1
+    assert issues[0].startswith("Unknown table 'master_prodct'")
+    assert "master_product" in issues[0]
+
+
+def test_unknown_column(tables):
+    assert check_sql("SELECT product_nme FROM master_product", tables) == [
+        "Unknown column 'product_nme'; it is not in any table of the FROM clause."
+    ]
+
+
+def test_ambiguous_column(tables):
+    issues = check_sql("SELECT scenario_id FROM opt_recipe r "
+                       "JOIN opt_scenario s ON r.scenario_id = s.scenario_id", tables)
+    assert issues == ["Column 'scenario_id' is ambiguous; it exists in r, s. Qualify it with a table alias."]
+
+
+def test_missing_group_by(tables):
+    issues = check_sql("SELECT product_id, COUNT(*) FROM opt_scenario", tables)
+    assert len(issues) == 1
+    assert "without GROUP BY" in issues[0]
+
+
+def test_clause_order(tables):
+    issues = check_sql("SELECT product_id FROM opt_scenario GROUP BY product_id WHERE status = 'Optimal'", tables)
+    assert issues[0].startswith("Clause order error: WHERE appears after GROUP BY.")
+
+
+def test_only_one_select(tables):
+    assert check_sql("SELECT 1; SELECT 2", tables) == [
+        "Multiple SQL statements found. Return exactly one SELECT statement."
+    ]
+    assert check_sql("DELETE FROM master_product", tables) == ["Only SELECT queries are allowed, got DELETE."]
+
+
+def test_join_without_foreign_key_is_flagged(tables, graph):
+    issues = check_sql("SELECT r.raw_material_name FROM master_raw_material r "
+                       "JOIN opt_recipe o ON o.record_id = r.unit_cost", tables, join_graph=graph)
+    assert issues == [
+        "JOIN condition o.record_id = r.unit_cost does not follow a foreign key between "
+        "opt_recipe and master_raw_material. Join them through: "
+        "opt_recipe.raw_material_id = master_raw_material.raw_material_id."
+    ]
+
+
+def test_join_on_shared_non_key_column_is_flagged(tables, graph):
+    issues = check_sql("SELECT p.property FROM opt_recipe_properties p "
+                       "JOIN master_product_limits l ON l.property = p.property", tables, join_graph=graph)
+    assert len(issues) == 1
+    assert "does not follow a foreign key between master_product_limits and opt_recipe_properties" in issues[0]
+
+
+def test_extra_non_key_predicate_is_not_flagged(tables, graph):
+    # l is linked to s through product_id; l.property = p.property only narrows the join.
+    sql = ("SELECT p.property, l.min_limit FROM opt_recipe_properties p "
+           "JOIN opt_scenario s ON s.scenario_id = p.scenario_id "
+           "JOIN master_product_limits l ON l.product_id = s.product_id AND l.property = p.property")
+    assert check_sql(sql, tables, join_graph=graph) == []
+
+
+def test_columns_referencing_the_same_key_are_joinable(tables, graph):
+    sql = ("SELECT mp.product_name FROM master_product mp "
+           "JOIN master_product_limits l ON mp.product_id = l.product_id "
+           "JOIN opt_scenario s ON l.product_id = s.product_id")
+    assert check_sql(sql, tables, join_graph=graph) == []
+
+
+def test_joins_are_not_checked_without_a_graph(tables):
+    sql = ("SELECT r.raw_material_name FROM master_raw_material r "
+           "JOIN opt_recipe o ON o.record_id = r.unit_cost")
+    assert check_sql(sql, tables) == []
@@ -0,0 +1,70 @@
+from sql_guard import add_time_limit_hint, estimate_plan, plan_issues, read_only_issues
+
+
+def test_plain_select_is_read_only():
+    assert read_only_issues("SELECT product_name FROM master_product WHERE price > 20") == []
+    assert read_only_issues("SELECT 1 UNION SELECT 2") == []
+
+
+def test_writes_and_multiple_statements_are_rejected():
+    assert read_only_issues("DELETE FROM master_product") == [
+        "Only read-only SELECT queries may run; found DELETE."
+    ]
+    assert read_only_issues("SELECT 1; DROP TABLE master_product") == ["Only one statement may run; found 2."]
+
+
+def test_locks_into_and_side_effects_are_rejected():
+    assert read_only_issues("SELECT * FROM master_product FOR UPDATE") == [
+        "Locking reads (FOR UPDATE / LOCK IN SHARE MODE) are not allowed."
+    ]
+    assert read_only_issues("SELECT price INTO @p FROM master_product") == [
+        "SELECT ... INTO is not allowed; return the rows instead."
+    ]
+    assert read_only_issues("SELECT SLEEP(10)") == ["Function SLEEP() is not allowed."]
+
+
+def test_time_limit_hint_goes_after_the_top_level_select():
+    assert add_time_limit_hint("SELECT a FROM t", 1500) == "SELECT /*+ MAX_EXECUTION_TIME(1500) */ a FROM t"
+    sql = "WITH x AS (SELECT a FROM t) SELECT a FROM x"
+    assert add_time_limit_hint(sql, 10) == (
+        "WITH x AS (SELECT a FROM t) SELECT /*+ MAX_EXECUTION_TIME(10) */ a FROM x"
+    )
+
+
+def test_time_limit_hint_leaves_parenthesised_queries_alone():
+    sql = "(SELECT a FROM t) UNION (SELECT a FROM u)"
+    assert add_time_limit_hint(sql, 10) == sql
+
+
+def test_estimate_plan_multiplies_nested_loops():
+    plan = estimate_plan([
+        {"id": 1, "table": "s", "type": "ALL", "rows": 100, "filtered": 10.0, "key": None},
+        {"id": 1, "table": "r", "type": "ref", "rows": 5, "filtered": 100.0, "key": "scenario_id"},
+    ])
+    # s is read once (100 rows) and keeps 10; r is read 5 rows per kept row.
+    assert plan["scanned_rows"] == 150
+    assert plan["fanout"] == 50
+    assert [t["table"] for t in plan["tables"]] == ["s", "r"]
+
+
+def test_estimate_plan_needs_mysql_explain_rows():
+    assert estimate_plan([]) is None
+    assert estimate_plan([{"detail": "SCAN t"}]) is None
+
+
+def test_plan_issues_within_budget():
+    plan = {"scanned_rows": 10, "fanout": 10, "tables": []}
+    assert plan_issues(plan) == []
+    assert plan_issues(None) == []
+
+
+def test_plan_issues_name_unkeyed_full_scans():
+    plan = {
+        "scanned_rows": 5e6, "fanout": 2e6,
+        "tables": [{"table": "a", "type": "ALL", "rows": 2000, "key": None},
+                   {"table": "b", "type": "ALL", "rows": 2500, "key": None}],
+    }
+    issues = plan_issues(plan, max_scanned_rows=1e6, max_fanout=1e6)
+    assert issues[0] == ("Query plan is too expensive: it scans ~5.0e+06 rows (limit 1.0e+06) and "
+                         "joins produce ~2.0e+06 row combinations (limit 1.0e+06).")
+    assert issues[1].startswith("Tables joined without a usable key: a (2000 rows), b (2500 rows).")
@@ -0,0 +1,210 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import metrics
+
+
+# ============================================================
+# NODE TRACING AND METRICS
+# ============================================================
+# Every graph node runs inside a span. Nodes attach sizes and outcomes to
+# the current span with annotate(); finished spans feed Prometheus-style
+# aggregates and, for sampled runs, a JSON-lines log.
+#
+# TRACE_MODE=off      no spans, annotate() is a no-op
+# TRACE_MODE=sampled  aggregates for every span, JSON lines for a
+#                     TRACE_SAMPLE_RATE fraction of runs (default)
+# TRACE_MODE=on       aggregates and JSON lines for every run
+
+MODES = ("off", "sampled", "on")
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SUMMED_FIELDS = ("prompt_chars", "completion_chars", "row_count")
+
+_config = {
+    "mode": os.getenv("TRACE_MODE", "sampled"),
+    "sample_rate": float(os.getenv("TRACE_SAMPLE_RATE", "0.1")),
+    "jsonl_path": os.getenv("TRACE_JSONL_PATH", ""),
+}
+_current_span = contextvars.ContextVar("txt2sql_span", default=None)
+_lock = threading.Lock()
+_node_stats = {}
+_errors = {}
+_collectors = {}
+
+
+def configure(mode: str | None = None, sample_rate: float | None = None,
+              jsonl_path: str | None = None):
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown trace mode '{mode}'. Use one of {MODES}.")
+        _config["mode"] = mode
+    if sample_rate is not None:
+        _config["sample_rate"] = sample_rate
+    if jsonl_path is not None:
+        _config["jsonl_path"] = jsonl_path
+
+
+def is_enabled() -> bool:
+    return _config["mode"] != "off"
+
+
+def is_sampled(run_id: str) -> bool:
+    """Sampling is decided per run so a run's spans are kept or dropped together."""
+    mode = _config["mode"]
+    if mode == "on":
+        return True
+    if mode == "off":
+        return False
+    bucket = zlib.crc32(run_id.encode("utf-8")) % 10000
+    return bucket < _config["sample_rate"] * 10000
+
+
+# ------------------------------------------------------------
+# Spans
+# ------------------------------------------------------------
+@contextmanager
+def span(name: str, run_id: str = "", retry: int = 0):
+    if not is_enabled():
+        yield None
+        return
+
+    record = {"span": name, "run_id": run_id, "retry": retry, "start": time.time()}
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error_class"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        record["duration_s"] = time.perf_counter() - started
+        _observe(record)
+        if _config["jsonl_path"] and is_sampled(run_id):
+            _export_jsonl(record)
+
+
+def annotate(**fields):
+    """Adds fields to the span of the running node, if tracing is on."""
+    record = _current_span.get()
+    if record is not None:
+        record.update(fields)
+
+
+def _observe(record: dict):
+    name = record["span"]
+    with _lock:
+        stats = _node_stats.setdefault(name, {
+            "count": 0,
+            "duration_sum": 0.0,
+            "buckets": [0] * len(DURATION_BUCKETS),
+            **{field: 0 for field in SUMMED_FIELDS},
+        })
+        stats["count"] += 1
+        stats["duration_sum"] += record["duration_s"]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if record["duration_s"] <= bound:
+                stats["buckets"][i] += 1
+        for field in SUMMED_FIELDS:
+            stats[field] += record.get(field) or 0
+        if record.get("error_class"):
+            key = (name, record["error_class"])
+            _errors[key] = _errors.get(key, 0) + 1
+
+
+def _export_jsonl(record: dict):
+    line = json.dumps(record, default=str)
+    with _lock:
+        with open(_config["jsonl_path"], "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# ------------------------------------------------------------
+# Prometheus text exposition
+# ------------------------------------------------------------
+def register_collector(name: str, collect):
+    """collect() returns {metric: number}; exposed as txt2sql_<name>_<metric> gauges."""
+    _collectors[name] = collect
+
+
+def _metric_name(*parts: str) -> str:
+    return "_".join(p.strip("_") for p in parts if p).replace(".", "_").replace("-", "_")
+
+
+def render_prometheus() -> str:
+    lines = []
+    with _lock:
+        node_stats = {name: dict(stats, buckets=list(stats["buckets"])) for name, stats in _node_stats.items()}
+        errors = dict(_errors)
+
+    lines.append("# TYPE txt2sql_node_duration_seconds histogram")
+    for name, stats in sorted(node_stats.items()):
+        for bound, count in zip(DURATION_BUCKETS, stats["buckets"]):
+            lines.append(f'txt2sql_node_duration_seconds_bucket{{node="{name}",le="{bound}"}} {count}')
+        lines.append(f'txt2sql_node_duration_seconds_bucket{{node="{name}",le="+Inf"}} {stats["count"]}')
+        lines.append(f'txt2sql_node_duration_seconds_sum{{node="{name}"}} {stats["duration_sum"]}')
+        lines.append(f'txt2sql_node_duration_seconds_count{{node="{name}"}} {stats["count"]}')
+    for field in SUMMED_FIELDS:
+        lines.append(f"# TYPE txt2sql_node_{field}_total counter")
+        for name, stats in sorted(node_stats.items()):
+            lines.append(f'txt2sql_node_{field}_total{{node="{name}"}} {stats[field]}')
+    lines.append("# TYPE txt2sql_node_errors_total counter")
+    for (name, error_class), count in sorted(errors.items()):
+        lines.append(f'txt2sql_node_errors_total{{node="{name}",error_class="{error_class}"}} {count}')
+
+    for counter, value in sorted(metrics.get_counters().items()):
+        metric = _metric_name("txt2sql", counter)
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    for name, collect in sorted(_collectors.items()):
+        try:
+            values = collect()
+        except Exception:
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metric = _metric_name("txt2sql", name, key)
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def dump_prometheus(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+
+
+def start_metrics_server(port: int = 9464, host: str = "127.0.0.1"):
+    """Serves render_prometheus() at /metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="txt2sql-metrics").start()
+    return server
+
+
+def reset():
+    with _lock:
+        _node_stats.clear()
+        _errors.clear()
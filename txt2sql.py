@@ -1,36 +1,116 @@
-from langgraph.graph import StateGraph, END
-from pydantic import BaseModel
-from langchain_ibm import WatsonxLLM
-from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
-from dotenv import load_dotenv
 import os
 import json
-import mysql.connector
+import time
+import functools
+import logging
+import uuid
 import re
+import threading
+from dataclasses import dataclass, field, replace
+
+
+
+from db_pool import ConnectionPool
+from sql_results import DEFAULT_COUNT_LIMIT, DEFAULT_MAX_ROWS, DEFAULT_PROFILE_LIMIT, describe_row_count, error_envelope
+from backends import DEFAULT_REPLICA_PATH, ExecutionBackend, MySQLBackend, SQLiteReplicaBackend
+from result_profile import DEFAULT_SAMPLE_ROWS, profile_result, sample_rows
+from schema_registry import DEFAULT_PROMPT_FORMAT, get_registry, registry_for
+from schema_retrieval import SchemaIndex
+from schema_graph import DEFAULT_JOIN_PATH_MAX_TABLES, SchemaGraph
+from sql_cache import QuestionCache, DEFAULT_CACHE_PATH
+from example_store import DEFAULT_EXAMPLES_PATH, ExampleStore
+from result_store import DEFAULT_MAX_BYTES as DEFAULT_RESULT_STORE_BYTES, ResultStore
+from result_cache import DEFAULT_MAX_BYTES as DEFAULT_RESULT_CACHE_BYTES, DEFAULT_VERSION_TTL_SECONDS, ResultCache
+from entity_index import DEFAULT_MIN_SCORE as DEFAULT_ENTITY_MIN_SCORE, DEFAULT_REFRESH_SECONDS, EntityIndex, RefreshingEntityIndex
+import metrics
+from metrics import estimate_tokens
+import tracing
+from limits import bounded_timeout, llm_limit, db_limit
+from relevance import RULES, fast_validate, schema_rules
+from speculative import race
+from llm_cache import DEFAULT_LLM_CACHE_PATH, DEFAULT_MAX_BYTES, CachedLLM, LLMResponseCache
+from llm_stream import call_llm, complete_json, complete_sql, streaming_stats
+from checkpoints import (
+    DEFAULT_CHECKPOINT_PATH, DEFAULT_DONE_RETENTION_SECONDS, DEFAULT_RETENTION_SECONDS, CheckpointStore,
+)
 
+logger = logging.getLogger("txt2sql")
 
+# Importing this module has no side effects. dotenv, langchain/Watsonx,
+# langgraph and mysql-connector are imported by the factories below, and
+# the LLM client, DB pool and compiled graph are built on first use.
+_factory_lock = threading.RLock()
 
-from data import get_table_metadata
 
-load_dotenv()
-wx_api = os.getenv("APIKEY")
-project_id = os.getenv("PROJECT_ID")
+@functools.cache
+def load_environment():
+    """Loads .env once, before the first client or run reads configuration."""
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # ============================================================
 # 1. GRAPH STATE
 # ============================================================
-class GraphState(BaseModel):
+# Slotted and small: LangGraph rebuilds the state at every node transition
+# and checkpoints it, so the schema and the result rows are referenced by
+# handle instead of carried by value:
+#   schema_hash + tables  -> shared SchemaRegistry (schema_registry.registry_for)
+#   result_handle         -> ResultStore (result_store.py)
+@dataclass(slots=True)
+class GraphState:
+    run_id: str = ""
     question: str = ""
-    full_metadata: list = []
+    schema_hash: str = ""           # content hash of the registry holding the tables
+    tables: list[str] = field(default_factory=list)   # relevant tables, by name
+    full_metadata: list = field(default_factory=list)  # only for metadata outside the registry
     sql_query: str = ""
-    sql_result: list | None = None
+    result_handle: str = ""         # last execution result, in the result store
     attempts: int = 0
 
-    
     valid: bool = False
-    issues: list[str] = []
+    issues: list[str] = field(default_factory=list)
     regenerate_sql: bool = False
     previous_sql: str = ""
+    precheck_failed: bool = False   # rejected before execution (pre-check or guard)
+    timings: dict = field(default_factory=dict)
+    few_shot_examples: list[dict] = field(default_factory=list)   # similar accepted question/SQL pairs
+    resolved_values: list[dict] = field(default_factory=list)     # question mentions matched to stored values
+
+    # Speculative mode (per request): N concurrent candidates, optional time budget
+    speculative_candidates: int = 1
+    speculative_budget_s: float = 0.0
+    winning_candidate: int | None = None
+    speculative_saved_s: float = 0.0
+
+    def metadata(self) -> list:
+        """full_metadata entries of the relevant tables."""
+        if self.full_metadata:
+            return self.full_metadata
+        try:
+            registry = registry_for(self.schema_hash)
+        except KeyError:
+            # Resumed after the metadata changed: use the current schema.
+            registry = get_registry()
+        return registry.select(self.tables)
+
+    def result(self) -> tuple[list, dict]:
+        """(rows, envelope metadata) of the last execution; see state_result()."""
+        return state_result(self)
+
+    def result_meta(self) -> dict:
+        """Envelope metadata of the last execution (row count, columns, profile, error)."""
+        if not self.result_handle:
+            return {}
+        meta = get_result_store().meta(self.result_handle)
+        return meta if meta is not None else state_result(self)[1]
+
+
+GRAPH_STATE_FIELDS = frozenset(GraphState.__dataclass_fields__)
+
+
+def state_dict(state: GraphState) -> dict:
+    """Field values of the state, shallow (no deep copy like dataclasses.asdict)."""
+    return {name: getattr(state, name) for name in GRAPH_STATE_FIELDS}
 
 
 
@@ -38,34 +118,311 @@ class GraphState(BaseModel):
 # ============================================================
 # 2. CONFIGURE WATSONX LLM
 # ============================================================
-llm = WatsonxLLM(
-    model_id="mistralai/mistral-medium-2505",
-    url="https://us-south.ml.cloud.ibm.com",
-    apikey=wx_api,
-    project_id=project_id,
-    params={
-        GenParams.MAX_NEW_TOKENS: 3000,
-        GenParams.TEMPERATURE: 0,
-    },
-)
+# Built by get_llm(); tests and the benchmark may assign a stub instead.
+llm = None
+
+
+def build_llm():
+    load_environment()
+    from langchain_ibm import WatsonxLLM
+    from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
+
+    watsonx_llm = WatsonxLLM(
+        model_id="mistralai/mistral-medium-2505",
+        url="https://us-south.ml.cloud.ibm.com",
+        apikey=os.getenv("APIKEY"),
+        project_id=os.getenv("PROJECT_ID"),
+        params={
+            GenParams.MAX_NEW_TOKENS: 3000,
+            GenParams.TEMPERATURE: 0,
+        },
+    )
 
+    # Identical prompts are answered from disk (LLM_CACHE=off disables)
+    if os.getenv("LLM_CACHE", "on").lower() == "off":
+        return watsonx_llm
+    return CachedLLM(watsonx_llm, LLMResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", DEFAULT_LLM_CACHE_PATH),
+        max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+    ))
+
+
+def llm_streaming() -> bool:
+    """Agents stream completions and stop at the first complete SQL/JSON (LLM_STREAMING=off disables)."""
+    return os.getenv("LLM_STREAMING", "on").lower() != "off"
+
+
+def get_llm():
+    global llm
+    if llm is None:
+        with _factory_lock:
+            if llm is None:
+                llm = build_llm()
+    return llm
+
+
+# ============================================================
+# 3. MYSQL CONNECTION POOL
+# ============================================================
+def mysql_connection_factory():
+    import mysql.connector
+
+    load_environment()
+    return mysql.connector.connect(
+        host=os.getenv("MYSQL_HOST"),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASS"),
+        database=os.getenv("MYSQL_DB"),
+        port=os.getenv("MYSQL_PORT"),
+        # Pooled connections are reused; autocommit stops a long-lived
+        # REPEATABLE READ snapshot from serving stale rows.
+        autocommit=True,
+    )
+
+
+# Built by get_db_pool(); tests and the benchmark may assign their own pool.
+db_pool = None
+
+
+def get_db_pool() -> ConnectionPool:
+    global db_pool
+    if db_pool is None:
+        with _factory_lock:
+            if db_pool is None:
+                load_environment()
+                db_pool = ConnectionPool(
+                    mysql_connection_factory,
+                    size=int(os.getenv("MYSQL_POOL_SIZE", "5")),
+                    max_idle_seconds=float(os.getenv("MYSQL_POOL_MAX_IDLE", "300")),
+                    borrow_timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", "30")),
+                )
+    return db_pool
+
+
+def execute_sql_query(sql_query: str, pool: ConnectionPool | None = None) -> list[dict]:
+    """
+    Rows of the query, at most SQL_RESULT_MAX_ROWS, or [{"error": ...}].
+    Kept for callers of the old API: runs through guarded_sql_envelope(),
+    like the executor node.
+    """
+    envelope, issues = guarded_sql_envelope(sql_query, pool)
+    if issues:
+        return error_envelope("; ".join(issues))["rows"]
+    return envelope["rows"]
+
+
+def statement_timeout() -> float:
+    from sql_guard import DEFAULT_TIMEOUT_SECONDS
+    return float(os.getenv("SQL_STATEMENT_TIMEOUT", DEFAULT_TIMEOUT_SECONDS))
+
+
+# ============================================================
+# 3b. EXECUTION BACKEND
+# ============================================================
+# EXECUTION_BACKEND=mysql (default) runs queries on the MySQL pool;
+# EXECUTION_BACKEND=sqlite runs them on the local replica at
+# SQLITE_REPLICA_PATH (build it with `python backends.py`). See backends.py.
+
+# Built by get_backend(); tests and the benchmark may assign their own backend.
+backend = None
+
+
+def build_backend() -> ExecutionBackend:
+    load_environment()
+    kind = os.getenv("EXECUTION_BACKEND", "mysql").lower()
+    if kind == "sqlite":
+        return SQLiteReplicaBackend(os.getenv("SQLITE_REPLICA_PATH", DEFAULT_REPLICA_PATH))
+    if kind != "mysql":
+        raise ValueError(f"Unknown EXECUTION_BACKEND {kind!r}; expected mysql or sqlite")
+    return MySQLBackend(get_db_pool(), mysql_connection_factory)
+
+
+def get_backend() -> ExecutionBackend:
+    global backend
+    if backend is None:
+        with _factory_lock:
+            if backend is None:
+                backend = build_backend()
+    return backend
+
+
+def _backend_for(pool: ConnectionPool | None) -> ExecutionBackend:
+    return MySQLBackend(pool, mysql_connection_factory) if pool is not None else get_backend()
+
+
+_result_cache = None
+
+
+def get_result_cache() -> ResultCache | None:
+    """In-memory result cache; None when RESULT_CACHE_MAX_BYTES=0."""
+    global _result_cache
+    max_bytes = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(DEFAULT_RESULT_CACHE_BYTES)))
+    if max_bytes <= 0:
+        return None
+    if _result_cache is None:
+        with _factory_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(
+                    max_bytes=max_bytes,
+                    version_ttl_s=float(os.getenv("RESULT_CACHE_VERSION_TTL_S", str(DEFAULT_VERSION_TTL_SECONDS))),
+                )
+    return _result_cache
+
+
+def _envelope_limits(max_rows: int | None = None, count_limit: int | None = None) -> tuple:
+    """(max_rows, count_limit, profile_limit): everything that shapes an envelope."""
+    return (
+        max_rows if max_rows is not None else int(os.getenv("SQL_RESULT_MAX_ROWS", DEFAULT_MAX_ROWS)),
+        count_limit if count_limit is not None else int(os.getenv("SQL_RESULT_COUNT_LIMIT", DEFAULT_COUNT_LIMIT)),
+        int(os.getenv("SQL_RESULT_PROFILE_LIMIT", DEFAULT_PROFILE_LIMIT)),
+    )
+
+
+def cached_sql_envelope(sql_query: str, pool: ConnectionPool | None = None) -> dict | None:
+    """The result cache's envelope for the query, or None if it has to run."""
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    envelope = cache.peek(_backend_for(pool), sql_query, *_envelope_limits())
+    if envelope is not None:
+        tracing.annotate(result_cache="hit")
+    return envelope
+
+
+def execute_sql_envelope(sql_query: str, max_rows: int | None = None,
+                         count_limit: int | None = None,
+                         pool: ConnectionPool | None = None,
+                         timeout_s: float | None = None) -> dict:
+    """
+    Executes the query on the execution backend (or on `pool`, if given)
+    and returns a bounded result envelope (see sql_results.build_envelope)
+    instead of every row. Statements running longer than timeout_s
+    (default SQL_STATEMENT_TIMEOUT, less if the run's deadline is closer)
+    are cancelled. Results of deterministic
+    SELECTs are served from and stored in the result cache.
+    """
+    max_rows, count_limit, profile_limit = _envelope_limits(max_rows, count_limit)
+    timeout_s = bounded_timeout(timeout_s if timeout_s is not None else statement_timeout())
+    target = _backend_for(pool)
+    tracing.annotate(backend=target.name)
+
+    def execute():
+        return target.execute(sql_query, max_rows, count_limit, timeout_s, profile_limit=profile_limit)
+
+    cache = get_result_cache()
+    if cache is None:
+        return execute()
+    return cache.get_or_execute(target, sql_query, execute, max_rows, count_limit, profile_limit)
+
+
+def guarded_sql_envelope(sql_query: str, pool: ConnectionPool | None = None) -> tuple[dict | None, list[str]]:
+    """
+    (envelope, []) for a query the guard lets through, run under the DB
+    concurrency limit unless the result cache has it; (None, issues) when
+    the guard rejects it.
+    """
+    # A cached result passed the guard when it was first executed.
+    envelope = cached_sql_envelope(sql_query, pool)
+    if envelope is not None:
+        return envelope, []
+    with db_limit.slot():
+        issues = guard_sql(sql_query, pool)
+        if issues:
+            return None, issues
+        return execute_sql_envelope(sql_query, pool=pool), []
+
+
+# ------------------------------------------------------------
+# Results out of band: GraphState holds a handle into the result store
+# ------------------------------------------------------------
+_result_store = None
+
+
+def get_result_store() -> ResultStore:
+    global _result_store
+    if _result_store is None:
+        with _factory_lock:
+            if _result_store is None:
+                _result_store = ResultStore(
+                    int(os.getenv("RESULT_STORE_MAX_BYTES", str(DEFAULT_RESULT_STORE_BYTES)))
+                )
+    return _result_store
+
+
+def clean_sql(sql_query: str) -> str:
+    return sql_query.replace("```sql", "").replace("```", "").strip()
+
+
+def state_result(state: GraphState) -> tuple[list, dict]:
+    """
+    (rows, envelope metadata) behind state.result_handle. A result the
+    store no longer has (evicted, or stored before a restart and resumed
+    from a checkpoint) is executed again under the same handle, through
+    the guard, the DB concurrency limit and the statement timeout like the
+    executor; a query the guard now rejects gets an error envelope instead.
+    """
+    if not state.result_handle:
+        return [], {}
+    store = get_result_store()
+    envelope = store.get(state.result_handle)
+    if envelope is None:
+        if state.precheck_failed or not state.sql_query:
+            return [], {}
+        metrics.increment("result_store_reexecutions")
+        envelope, issues = guarded_sql_envelope(clean_sql(state.sql_query))
+        if issues:
+            envelope = error_envelope("; ".join(issues))
+        store.put(envelope, state.result_handle)
+    meta = {k: v for k, v in envelope.items() if k != "rows"}
+    return envelope["rows"], meta
+
+
+def materialize_result(final_state: dict) -> dict:
+    """
+    The final state with "sql_result" (rows) and "sql_result_meta" read
+    from the result store, which then releases the result.
+    """
+    state = GraphState(**{k: v for k, v in final_state.items() if k in GRAPH_STATE_FIELDS})
+    rows, meta = state_result(state)
+    get_result_store().release(state.result_handle)
+    return {**final_state, "sql_result": rows, "sql_result_meta": meta}
+
+
+def explain_sql(sql_query: str, pool: ConnectionPool | None = None) -> list[dict] | None:
+    """Rows of EXPLAIN for the query, or None if EXPLAIN fails or the backend has none."""
+    return _backend_for(pool).explain(sql_query)
 
-def execute_sql_query(sql_query: str):
-    try:
-        conn = mysql.connector.connect(
-            host=os.getenv("MYSQL_HOST"),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASS"),
-            database=os.getenv("MYSQL_DB"),
-            port=os.getenv("MYSQL_PORT")
-        )
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        return rows
-    except Exception as e:
-        # Return list even on error
-        return [{"error": str(e)}]
+
+def guard_sql(sql_query: str, pool: ConnectionPool | None = None) -> list[str]:
+    """
+    Pre-execution guard: issues if the query is not a single read-only
+    SELECT or its EXPLAIN plan is over SQL_GUARD_MAX_SCANNED_ROWS /
+    SQL_GUARD_MAX_FANOUT. Empty list means the query may run.
+    """
+    from sql_guard import (
+        DEFAULT_MAX_FANOUT, DEFAULT_MAX_SCANNED_ROWS, estimate_plan, plan_issues, read_only_issues,
+    )
+
+    issues = read_only_issues(sql_query)
+    if issues:
+        return issues
+    plan = estimate_plan(explain_sql(sql_query, pool))
+    if plan is not None:
+        tracing.annotate(estimated_rows=plan["scanned_rows"], estimated_fanout=plan["fanout"])
+    return plan_issues(
+        plan,
+        max_scanned_rows=float(os.getenv("SQL_GUARD_MAX_SCANNED_ROWS", DEFAULT_MAX_SCANNED_ROWS)),
+        max_fanout=float(os.getenv("SQL_GUARD_MAX_FANOUT", DEFAULT_MAX_FANOUT)),
+    )
+
+
+def stream_sql_query(sql_query: str, batch_size: int = 500,
+                     pool: ConnectionPool | None = None):
+    """
+    Generator over every row of the query, read in batches. On MySQL the
+    pooled connection is held until the generator is exhausted or closed.
+    """
+    yield from _backend_for(pool).stream(sql_query, batch_size)
 
 
 def extract_sql_block(text: str) -> str:
@@ -103,35 +460,117 @@ def route_validator(state: GraphState):
     return "retry"
 
 
+def timed_node(name: str, node):
+    """
+    Wraps a node in a tracing span and adds its wall time to
+    state.timings[name].
+    """
+    @functools.wraps(node)
+    def wrapper(state: GraphState) -> dict:
+        started = time.perf_counter()
+        with tracing.span(name, state.run_id, state.attempts):
+            update = node(state)
+        timings = dict(state.timings)
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started)
+        return {**update, "timings": timings}
+    return wrapper
+
+
+def route_precheck(state: GraphState):
+    if not state.precheck_failed:
+        return "execute"
+    return route_validator(state)
+
+
+def route_executor(state: GraphState):
+    if not state.precheck_failed:
+        return "validate"
+    return route_validator(state)
+
+
+def render_metadata(table_metadata: list) -> str:
+    """Precomputed prompt text for the selected tables (see schema_registry)."""
+    return get_registry().render(
+        table_metadata, os.getenv("SCHEMA_PROMPT_FORMAT", DEFAULT_PROMPT_FORMAT)
+    )
+
+
+def get_schema_graph() -> SchemaGraph:
+    """Foreign-key graph of the registered schema, built once per registry."""
+    return get_registry().derived("schema_graph", lambda r: SchemaGraph(r.tables))
+
+
+def render_join_path(table_metadata: list) -> str:
+    """
+    Prompt section with the JOIN chain connecting the tables. Empty for a
+    single table, for tables the foreign keys do not connect, for more
+    than JOIN_PATH_MAX_TABLES tables and for the full-schema fallback,
+    where a chain through every table would only mislead the generator.
+    """
+    graph = get_schema_graph()
+    names = list(dict.fromkeys(m["table_name"] for m in table_metadata))
+    max_tables = int(os.getenv("JOIN_PATH_MAX_TABLES", DEFAULT_JOIN_PATH_MAX_TABLES))
+    if len(names) > max_tables or set(graph.tables) <= set(names) or not graph.connects(names):
+        return ""
+    chain = graph.render_join_chain(names)
+    if not chain:
+        return ""
+    return f"\nJOIN PATH (foreign keys that connect these tables; join only the ones your query needs):\n{chain}\n"
+
+
 # ============================================================
 # SQL GENERATOR AGENT
 # ============================================================
-def sql_generator_agent(state: GraphState) -> dict:
-    print("SQL Generator Agent generating SQL...")
-
+# Extra instructions that make speculative candidates differ from each
+# other; candidate 0 uses the plain prompt.
+PROMPT_VARIANTS = [
+    "",
+    "Start the FROM clause at the table that holds the entity filtered in the question, then JOIN outward.",
+    "Aggregate in a subquery or derived table before joining when totals are needed.",
+    "Prefer the smallest set of tables and return descriptive name columns alongside ids.",
+]
+
+
+def render_examples(examples: list[dict]) -> str:
+    """Prompt section with the retrieved question/SQL pairs, empty when there are none."""
+    if not examples:
+        return ""
+    blocks = [f"USER QUERY: {e['question']}\nSQL Query:\n{e['sql']}" for e in examples]
+    return "\nSIMILAR QUESTIONS ALREADY ANSWERED (validated SQL):\n" + "\n\n".join(blocks) + "\n"
+
+
+def render_resolved_values(resolved: list[dict]) -> str:
+    """Prompt section with the question's mentions resolved to stored values, empty when there are none."""
+    if not resolved:
+        return ""
+    lines = []
+    for r in resolved:
+        line = f'- "{r["mention"]}" → {r["table"]}.{r["column"]} = {sql_literal(r["value"])}'
+        key = ", ".join(f"{pk} = {sql_literal(v)}" for pk, v in r["key"].items())
+        lines.append(f"{line} ({key})" if key else line)
+    return "\nRESOLVED VALUES (exact database values; filter with = / IN):\n" + "\n".join(lines) + "\n"
+
+
+def sql_literal(value) -> str:
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def build_generator_prompt(state: GraphState, variant: int = 0) -> str:
     # If validator gave issues, show them to the LLM
     issues = state.issues or []
 
     issues_text = "\n".join(f"- {i}" for i in issues) if issues else "None"
 
+    hint = PROMPT_VARIANTS[variant % len(PROMPT_VARIANTS)]
+    variant_text = f"ADDITIONAL GUIDANCE:\n{hint}\n" if hint else ""
 
+    # Static rules and the schema come first and the per-question parts
+    # last, so consecutive prompts share the longest possible prefix.
     prompt = f"""
 You are a senior SQL architect.
 
-You are given:
-
-1. USER QUERY:
-{state.question}
-
-2. FULL TABLE METADATA (JSON):
-{json.dumps(state.full_metadata, indent=4)}
-
-3. PREVIOUS SQL QUERY (Fix errors or improve it):
-{state.previous_sql}
-
-4. VALIDATION FEEDBACK (Fix ALL issues listed):
-{issues_text}
-
 IMPORTANT:
 Based on the table and column descriptions You must deduce which tables are needed.
 Do NOT assume all tables are required.
@@ -164,18 +603,18 @@ When summing across joined tables:
 
 
 ### WHERE
-### 1. Fuzzy matching for categorical values
-NEVER use exact matches (=) for text fields.
+### 1. Matching categorical values
+Values listed under RESOLVED VALUES are the exact values stored in the database:
+filter them with = (or IN for several), using the value exactly as listed.
 
-Whenever the user mentions category labels like product names, supplier names etc :
-Use:
+For other category labels the user mentions (product names, supplier names etc.)
+that are NOT listed there, use:
     column LIKE '%value%'
-NOT EXACT MATCHES.
 
 Examples:
-- "Chem Alloy" →  column LIKE '%Chem Alloy%'
-- "H1" → column LIKE '%H1%'
-- "Ankara" → column LIKE '%Ankara%'
+- RESOLVED VALUES lists "chem alloy" → master_product.product_name = 'ChemAlloy B12'
+  → WHERE product_name = 'ChemAlloy B12'
+- "Ankara" not listed → column LIKE '%Ankara%'
 
 ### OUTPUT FORMAT
 Return ONLY valid SQL.
@@ -208,33 +647,176 @@ GROUP BY
 HAVING
 	m.stock_quantity < SUM(r.recipe_quantity);
 
-    
+TABLE METADATA:
+{render_metadata(state.metadata())}
+{render_join_path(state.metadata())}{render_examples(state.few_shot_examples)}{render_resolved_values(state.resolved_values)}
+USER QUERY:
+{state.question}
+
+PREVIOUS SQL QUERY (Fix errors or improve it):
+{state.previous_sql}
+
+VALIDATION FEEDBACK (Fix ALL issues listed):
+{issues_text}
+
+{variant_text}
 GENERATE THE SQL NOW:
 """
+    return prompt
+
 
-    sql = llm.invoke(prompt).strip()
-    sql = extract_sql_block(sql)
+def repair_issues(state: GraphState) -> list[str]:
+    """
+    Validator / pre-check issues plus the MySQL error, if it is not among
+    them. SQL rejected before it ran has no MySQL error: its envelope
+    only repeats the issues.
+    """
+    issues = list(state.issues or [])
+    meta = {} if state.precheck_failed else state.result_meta()
+    error = meta.get("error")
+    if error and not any(error in i for i in issues):
+        issues.insert(0, f"MySQL error ({meta.get('error_class', 'Error')}): {error}")
+    return issues or ["The query did not answer the question."]
+
+
+def build_repair_prompt(state: GraphState) -> str:
+    """
+    Retry prompt: the failing SQL, its issues and the metadata of the tables
+    it (or the issues) mention, instead of the full generation prompt.
+    """
+    registry = get_registry()
+    issues = repair_issues(state)
+    tables = registry.mentioned_tables(state.previous_sql, *issues) or state.metadata()
+    issues_text = "\n".join(f"- {i}" for i in issues)
+
+    prompt = f"""
+You are a senior SQL architect. Repair a MySQL query that failed validation.
+Change only what is needed to fix ALL listed issues; use JOIN keys and columns from the metadata.
+Return ONLY the corrected SQL. No explanation. No comments. No markdown.
+
+TABLE METADATA (tables the query uses):
+{render_metadata(tables)}
+{render_join_path(tables)}
+USER QUERY:
+{state.question}
+
+FAILING SQL:
+{state.previous_sql}
+
+ISSUES:
+{issues_text}
+
+CORRECTED SQL:
+"""
+    return prompt
 
-    print(sql)
+
+def use_repair_prompt(state: GraphState) -> bool:
+    return (state.attempts > 0 and bool(state.previous_sql.strip())
+            and os.getenv("SQL_REPAIR_MODE", "on").lower() != "off")
+
+
+def generate_sql(state: GraphState, variant: int = 0) -> str:
+    # First attempts get the full prompt; retries only repair the failing SQL.
+    mode = "repair" if use_repair_prompt(state) else "first"
+    prompt = build_repair_prompt(state) if mode == "repair" else build_generator_prompt(state, variant)
+    started = time.perf_counter()
+    with llm_limit.slot():
+        response = call_llm(get_llm(), prompt, "repair" if mode == "repair" else "generator",
+                            complete_sql, streaming=llm_streaming()).strip()
+    elapsed = time.perf_counter() - started
+    sql = extract_sql_block(response)
+
+    # Tracked per mode so retry savings show up next to first attempts.
+    metrics.increment(f"sql_generation_{mode}_calls")
+    metrics.increment(f"sql_generation_{mode}_seconds", elapsed)
+    metrics.increment(f"sql_generation_{mode}_prompt_tokens", estimate_tokens(prompt))
+    metrics.increment(f"sql_generation_{mode}_completion_tokens", estimate_tokens(response))
+    tracing.annotate(generation_mode=mode, prompt_chars=len(prompt), completion_chars=len(response))
+    return sql
+
+
+def sql_generator_agent(state: GraphState) -> dict:
+    logger.debug("SQL Generator Agent generating SQL (attempt %d)", state.attempts + 1)
+
+    sql = generate_sql(state)
+
+    logger.debug("Generated SQL:\n%s", sql)
     return {"sql_query": sql}
 
 
 
+# ============================================================
+# STATIC SQL PRE-VALIDATION NODE
+# ============================================================
+def rejected_sql(state: GraphState, issues: list[str], error_class: str) -> dict:
+    """
+    State update for SQL refused before it ran (pre-check or guard). The
+    previous attempt's result is released and replaced by an error
+    envelope, so neither the final answer nor the repair prompt sees the
+    rows or MySQL error of other SQL.
+    """
+    envelope = error_envelope("; ".join(issues))
+    envelope["error_class"] = error_class
+    store = get_result_store()
+    store.release(state.result_handle)
+    return {
+        "result_handle": store.put(envelope),
+        "precheck_failed": True,
+        "valid": False,
+        "issues": issues,
+        "regenerate_sql": True,
+        "attempts": state.attempts + 1,
+        "previous_sql": state.sql_query,
+    }
+
+
+def sql_precheck_node(state: GraphState) -> dict:
+    """
+    Checks the generated SQL against the full schema without touching MySQL
+    or the LLM. Issues go straight back to the generator.
+    """
+    from sql_checks import check_sql, schema_from_metadata
+
+    registry = get_registry()
+    sql_schema = registry.derived("sql_schema", lambda r: schema_from_metadata(r.tables))
+    issues = check_sql(state.sql_query, registry.tables, schema=sql_schema,
+                       join_graph=get_schema_graph())
+    if not issues:
+        return {"precheck_failed": False}
+
+    logger.info("Static pre-validation failed: %s", issues)
+    tracing.annotate(issue_count=len(issues), error_class="StaticCheckError")
+    # Each rejection here saves one MySQL round trip and one validator LLM call.
+    metrics.increment("llm_validator_calls_saved")
+    return rejected_sql(state, issues, "StaticCheckError")
+
+
 # ============================================================
 # 5. SQL EXECUTOR NODE
 # ============================================================
+def reject_before_execution(state: GraphState, issues: list[str]) -> dict:
+    """The guard refused to run the SQL; its issues go straight back to the generator."""
+    logger.info("SQL guard rejected the query: %s", issues)
+    tracing.annotate(issue_count=len(issues), error_class="SQLGuardError")
+    metrics.increment("sql_guard_rejections")
+    return rejected_sql(state, issues, "SQLGuardError")
+
+
 def sql_executor_node(state: GraphState):
-    print("\nExecuting SQL...\n")
+    logger.debug("Executing SQL")
 
-    sql_cleaned = (
-        state.sql_query.replace("```sql", "")
-                       .replace("```", "")
-                       .strip()
-    )
+    sql_cleaned = clean_sql(state.sql_query)
 
-    result = execute_sql_query(sql_cleaned)
-    print(result)
-    return {"sql_result": result}
+    envelope, issues = guarded_sql_envelope(sql_cleaned)
+    if issues:
+        return reject_before_execution(state, issues)
+    tracing.annotate(row_count=envelope["row_count"], error_class=envelope.get("error_class"))
+    logger.debug("Rows: %s (showing %d)", describe_row_count(envelope), len(envelope["rows"]))
+    # The previous attempt's result is no longer needed.
+    store = get_result_store()
+    store.release(state.result_handle)
+    return {"result_handle": store.put(envelope)}
 
 
 
@@ -244,29 +826,48 @@ def sql_executor_node(state: GraphState):
 # ============================================================
 
 def validator_agent(state: GraphState) -> dict:
-    print("\nValidator Agent checking results...\n")
+    logger.debug("Validator Agent checking results")
 
     user_query = state.question
     sql = state.sql_query
-    result = state.sql_result or []
-    metadata = state.full_metadata
+    result, result_meta = state.result()
+    metadata = state.metadata()
+
+    # Clearly good results are accepted without an LLM call
+    rules = get_registry().derived("relevance_rules", lambda r: RULES + schema_rules(r.tables))
+    accepted, reason = fast_validate(user_query, result, result_meta, rules)
+    if accepted:
+        logger.debug("Validator fast path: %s", reason)
+        metrics.increment("validator_fast_path_hits")
+        tracing.annotate(fast_path=True, valid=True, issue_count=0)
+        return {
+            "valid": True,
+            "issues": [],
+            "regenerate_sql": False,
+            "attempts": state.attempts + 1,
+            "previous_sql": state.sql_query
+        }
+    metrics.increment("validator_llm_calls")
+    logger.debug("Validator needs the LLM: %s", reason)
+
+    # Fixed-size summary: per-column statistics and a few sample rows,
+    # however many rows the query returned.
+    rows = [] if result_meta.get("error") else result
+    profile = result_meta.get("profile") or profile_result(rows, result_meta.get("columns"))
+    result_summary = {
+        "row_count": describe_row_count(result_meta) if result_meta else len(rows),
+        "profiled_rows": profile["profiled_rows"],
+        "columns": profile["columns"],
+        "sample_rows": sample_rows(rows, int(os.getenv("VALIDATOR_SAMPLE_ROWS", DEFAULT_SAMPLE_ROWS))),
+    }
+    if result_meta.get("error"):
+        result_summary["error"] = result_meta["error"]
 
+    # Static checklist and schema first, per-question parts last (see
+    # build_generator_prompt).
     prompt = f"""
 You are an expert SQL validator.
 
-You are given:
-USER QUERY:
-{user_query}
-
-SQL QUERY:
-{sql}
-
-SQL RESULT:
-{json.dumps(result, indent=4)}
-
-TABLE METADATA:
-{json.dumps(metadata, indent=4)}
-
 You must check ALL of the following:
 
 ### 1. SQL SYNTAX / EXECUTION ISSUES
@@ -293,11 +894,25 @@ If any required fields are **missing**, you must mark SQL as invalid.
   "regenerate_sql": true/false
 }}
 
+TABLE METADATA:
+{render_metadata(metadata)}
+
+USER QUERY:
+{user_query}
+
+SQL QUERY:
+{sql}
+
+SQL RESULT (row count, per-column null/distinct counts, min/max and top values, sample rows):
+{json.dumps(result_summary, separators=(",", ":"), default=str)}
+
 OUTPUT JSON:
 """
 
-    response = llm.invoke(prompt)
-    print("\n[Validator LLM raw response]\n", response)
+    with llm_limit.slot():
+        response = call_llm(get_llm(), prompt, "validator", complete_json, streaming=llm_streaming())
+    tracing.annotate(prompt_chars=len(prompt), completion_chars=len(response))
+    logger.debug("Validator LLM raw response:\n%s", response)
 
 
     clean = extract_json_block(response)
@@ -311,14 +926,16 @@ OUTPUT JSON:
         regenerate = bool(parsed.get("regenerate_sql", parsed.get("regenerate", False)))
 
     except Exception as e:
-        print("Validator parse error:", e)
-        print("Raw response:", response)
+        logger.warning("Validator parse error: %s. Raw response: %r", e, response)
+        tracing.annotate(error_class=type(e).__name__)
 
         # Force retry
         valid = False
         issues = ["Validator returned invalid JSON."]
         regenerate = True
 
+    tracing.annotate(valid=valid, issue_count=len(issues))
+
     # ---------------------------
     # ALWAYS RETURN CLEAN KEYS
     # ---------------------------
@@ -333,75 +950,543 @@ OUTPUT JSON:
 
 
 
+# ============================================================
+# SPECULATIVE CANDIDATES NODE
+# ============================================================
+def run_candidate(state: GraphState, variant: int, cancelled) -> dict:
+    """
+    Generate -> pre-check -> execute -> validate for one prompt variant.
+    Stops between stages once another candidate has won.
+    """
+    sql = generate_sql(state, variant)
+    candidate = replace(state, sql_query=sql)
+    if cancelled.is_set():
+        return {"sql_query": sql, "valid": False, "issues": ["cancelled"]}
+
+    precheck = sql_precheck_node(candidate)
+    if precheck["precheck_failed"]:
+        return {"sql_query": sql, **precheck}
+
+    executed = sql_executor_node(candidate)
+    if executed.get("precheck_failed"):
+        return {"sql_query": sql, **executed}
+    candidate = replace(candidate, **executed)
+    if cancelled.is_set():
+        get_result_store().release(executed["result_handle"])
+        return {"sql_query": sql, "valid": False, "issues": ["cancelled"]}
+
+    validated = validator_agent(candidate)
+    if cancelled.is_set():
+        # Lost the race while validating: the race no longer collects this
+        # candidate, so nobody will read its result.
+        get_result_store().release(executed["result_handle"])
+    return {"sql_query": sql, **executed, **validated}
+
+
+def speculative_node(state: GraphState) -> dict:
+    """
+    Races state.speculative_candidates prompt variants on the first
+    attempt. The first candidate the validator accepts wins; if none does
+    within the time budget, the lowest-numbered finished one is kept and the
+    normal retry loop takes over from its issues.
+    """
+    n = max(1, state.speculative_candidates)
+    outcome = race(
+        lambda variant, cancelled: run_candidate(state, variant, cancelled),
+        n,
+        time_budget_s=state.speculative_budget_s or None,
+    )
+    result = outcome["result"] or {
+        "sql_query": "", "valid": False,
+        "issues": [f"No SQL candidate finished within {state.speculative_budget_s}s"],
+    }
+    winner = outcome["winner"]
+    logger.info("Speculative candidates: %d, winner: %s, saved %.2fs", n, winner, outcome["saved_s"])
+    metrics.increment("speculative_runs")
+    metrics.increment("speculative_saved_seconds", outcome["saved_s"])
+    if winner is not None:
+        metrics.increment("speculative_wins")
+    tracing.annotate(candidates=n, finished=len(outcome["finished"]), winner=winner,
+                     saved_s=outcome["saved_s"])
+
+    # Results of the candidates that were not kept are dropped.
+    handle = result.get("result_handle", "")
+    get_result_store().release(*(r.get("result_handle", "") for r in outcome["finished"].values()
+                                 if r.get("result_handle") != handle))
+
+    sql = result.get("sql_query", "")
+    return {
+        "sql_query": sql,
+        "result_handle": handle,
+        "valid": bool(result.get("valid")),
+        "issues": result.get("issues", []),
+        "regenerate_sql": not result.get("valid"),
+        # A candidate rejected before execution has no result to re-run.
+        "precheck_failed": bool(result.get("precheck_failed", False)),
+        "attempts": state.attempts + 1,
+        "previous_sql": sql,
+        "winning_candidate": winner,
+        "speculative_saved_s": outcome["saved_s"],
+    }
+
+
+def route_entry(state: GraphState):
+    if state.speculative_candidates > 1 and state.attempts == 0:
+        return "speculative"
+    return "generate"
+
 
 
 # ============================================================
 # 4. BUILD LANGGRAPH WORKFLOW
 # ============================================================
-workflow = StateGraph(GraphState)
-workflow.add_node("sql_agent", sql_generator_agent)
-workflow.add_node("executor", sql_executor_node)
-workflow.add_node("validator", validator_agent)
-
-
-workflow.set_entry_point("sql_agent")
-workflow.add_edge("sql_agent", "executor")  
-workflow.add_edge("executor", "validator")
-# If invalid, loop back to SQL agent
-
-workflow.add_conditional_edges(
-    source="validator",
-    path=route_validator,  
-    path_map={
-        "retry": "sql_agent",
-        "done": END
-    }
+def build_app(checkpointer=None, interrupt_before=None):
+    """
+    Compiles the LangGraph workflow. With a checkpointer, GraphState is
+    saved after every node and runs need run_config(run_id).
+    """
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(GraphState)
+    workflow.add_node("sql_agent", timed_node("sql_agent", sql_generator_agent))
+    workflow.add_node("precheck", timed_node("precheck", sql_precheck_node))
+    workflow.add_node("executor", timed_node("executor", sql_executor_node))
+    workflow.add_node("validator", timed_node("validator", validator_agent))
+    workflow.add_node("speculative", timed_node("speculative", speculative_node))
+
+    # Speculative mode races several candidates before falling back to the loop
+    workflow.set_conditional_entry_point(
+        route_entry,
+        {
+            "speculative": "speculative",
+            "generate": "sql_agent"
+        }
+    )
+    workflow.add_edge("sql_agent", "precheck")
+    # Static issues skip MySQL and the LLM validator
+    workflow.add_conditional_edges(
+        source="precheck",
+        path=route_precheck,
+        path_map={
+            "execute": "executor",
+            "retry": "sql_agent",
+            "done": END
+        }
+    )
+    # Queries the executor's guard refused go back to the generator
+    workflow.add_conditional_edges(
+        source="executor",
+        path=route_executor,
+        path_map={
+            "validate": "validator",
+            "retry": "sql_agent",
+            "done": END
+        }
+    )
+    # If invalid, loop back to SQL agent
+
+    workflow.add_conditional_edges(
+        source="validator",
+        path=route_validator,  
+        path_map={
+            "retry": "sql_agent",
+            "done": END
+        }
+    )
+
+    workflow.add_conditional_edges(
+        source="speculative",
+        path=route_validator,
+        path_map={
+            "retry": "sql_agent",
+            "done": END
+        }
+    )
+
+    return workflow.compile(checkpointer=checkpointer, interrupt_before=interrupt_before)
+
+
+_app = None
+_resumable_app = None
+_checkpoints = None
+
+
+def get_checkpoint_store() -> CheckpointStore | None:
+    """Store for resumable runs; None when CHECKPOINTS=off."""
+    global _checkpoints
+    if _checkpoints is None and os.getenv("CHECKPOINTS", "on").lower() != "off":
+        with _factory_lock:
+            if _checkpoints is None:
+                load_environment()
+                _checkpoints = CheckpointStore(
+                    path=os.getenv("CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH),
+                    retention_s=float(os.getenv("CHECKPOINT_RETENTION_S", DEFAULT_RETENTION_SECONDS)),
+                    done_retention_s=float(os.getenv("CHECKPOINT_DONE_RETENTION_S", DEFAULT_DONE_RETENTION_SECONDS)),
+                )
+    return _checkpoints
+
+
+def get_app():
+    """The compiled graph, built on first use."""
+    global _app
+    if _app is None:
+        with _factory_lock:
+            if _app is None:
+                load_environment()
+                _app = build_app()
+    return _app
+
+
+def get_resumable_app():
+    """
+    The graph compiled with the checkpoint store (get_app() when
+    CHECKPOINTS=off). Invoke it with run_config(graph_input).
+    """
+    global _resumable_app
+    store = get_checkpoint_store()
+    if store is None:
+        return get_app()
+    if _resumable_app is None:
+        with _factory_lock:
+            if _resumable_app is None:
+                _resumable_app = build_app(checkpointer=store.saver)
+    return _resumable_app
+
+
+def run_config(graph_input: dict) -> dict:
+    """
+    Config for invoking or streaming get_resumable_app() on graph_input:
+    registers the run with the checkpoint store so it can be resumed under
+    its run_id.
+    """
+    store = get_checkpoint_store()
+    if store is None:
+        return {}
+    store.start(graph_input["run_id"], graph_input["question"])
+    return CheckpointStore.config(graph_input["run_id"])
+
+
+def invoke_graph(graph_input: dict) -> dict:
+    """Runs the graph to the end; the final state includes sql_result and sql_result_meta."""
+    return materialize_result(get_resumable_app().invoke(graph_input, run_config(graph_input)))
+
+
+def resume_run(run_id: str) -> dict:
+    """
+    Continues a checkpointed run after its last completed node and returns
+    its final state; a run that already finished is returned as is.
+    """
+    store = get_checkpoint_store()
+    if store is None:
+        raise RuntimeError("Checkpoints are disabled (CHECKPOINTS=off); runs cannot be resumed.")
+    app = get_resumable_app()
+    config = CheckpointStore.config(run_id)
+    snapshot = app.get_state(config)
+    if not snapshot.values:
+        raise KeyError(f"No checkpoints for run {run_id}")
+    if not snapshot.next:
+        return materialize_result(snapshot.values)
+    logger.info("Resuming run %s at %s (attempt %d)", run_id, ", ".join(snapshot.next),
+                snapshot.values.get("attempts", 0))
+    metrics.increment("runs_resumed")
+    return materialize_result(app.invoke(None, config))
+
+
+def __getattr__(name):
+    # `txt2sql.app` / `from txt2sql import app` still work, lazily.
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+
+# ============================================================
+# QUESTION -> SQL CACHE
+# ============================================================
+_question_cache = None
+
+
+def get_question_cache() -> QuestionCache:
+    global _question_cache
+    if _question_cache is None:
+        with _factory_lock:
+            if _question_cache is None:
+                _question_cache = QuestionCache(
+                    path=os.getenv("SQL_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    schema_hash=get_registry().content_hash,
+                    max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000")),
+                    ttl_seconds=float(os.getenv("SQL_CACHE_TTL", str(7 * 24 * 3600))),
+                )
+    return _question_cache
+
+
+_example_store = None
+
+
+def get_example_store() -> ExampleStore:
+    global _example_store
+    if _example_store is None:
+        with _factory_lock:
+            if _example_store is None:
+                _example_store = ExampleStore(
+                    path=os.getenv("FEW_SHOT_PATH", DEFAULT_EXAMPLES_PATH),
+                    schema_hash=get_registry().content_hash,
+                    max_entries=int(os.getenv("FEW_SHOT_MAX_ENTRIES", "500")),
+                )
+    return _example_store
+
+
+_entity_index = None
+
+
+def _entity_index_holder() -> RefreshingEntityIndex | None:
+    global _entity_index
+    if os.getenv("ENTITY_INDEX", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    if _entity_index is None:
+        with _factory_lock:
+            if _entity_index is None:
+                _entity_index = RefreshingEntityIndex(
+                    lambda: EntityIndex.from_backend(
+                        get_backend(), get_registry().tables,
+                        max_values=int(os.getenv("ENTITY_INDEX_MAX_VALUES", "10000")),
+                        timeout_s=statement_timeout(),
+                        slot=db_limit.slot,
+                    ),
+                    refresh_s=float(os.getenv("ENTITY_INDEX_REFRESH_S", str(DEFAULT_REFRESH_SECONDS))),
+                )
+    return _entity_index
+
+
+def get_entity_index() -> EntityIndex | None:
+    """
+    Distinct categorical values read through the execution backend, built
+    and rebuilt every ENTITY_INDEX_REFRESH_S seconds in the background.
+    None when ENTITY_INDEX=off, before the first build finishes or when it
+    failed; questions are then answered without resolved values.
+    """
+    holder = _entity_index_holder()
+    return holder.get() if holder is not None else None
+
+
+def warm_entity_index(wait_s: float | None = 0.0) -> EntityIndex | None:
+    """Starts the first entity index build and waits up to wait_s (None: until done) for it."""
+    holder = _entity_index_holder()
+    if holder is None:
+        return None
+    holder.get()
+    return holder.wait(wait_s) if wait_s != 0 else holder.index
+
+
+def few_shot_stats() -> dict:
+    """
+    Store counters, mean attempts per question with retrieval enabled and
+    with FEW_SHOT_K=0 (disabled), and the share of enabled runs that found
+    examples.
+    """
+    counters = metrics.get_counters()
+    stats = get_example_store().stats() if _example_store is not None else {}
+    for arm in ("enabled", "disabled"):
+        runs = counters.get(f"few_shot_{arm}_runs", 0)
+        stats[f"{arm}_runs"] = runs
+        stats[f"{arm}_attempts_avg"] = counters.get(f"few_shot_{arm}_attempts", 0) / runs if runs else 0.0
+    enabled_runs = stats["enabled_runs"]
+    stats["examples_found_rate"] = (counters.get("few_shot_runs_with_examples", 0) / enabled_runs
+                                    if enabled_runs else 0.0)
+    return stats
+
+
+def validator_fast_path_hit_rate() -> float:
+    """Share of validations decided by the rule-based fast path."""
+    counters = metrics.get_counters()
+    hits = counters.get("validator_fast_path_hits", 0)
+    total = hits + counters.get("validator_llm_calls", 0)
+    return hits / total if total else 0.0
+
+
+def generation_stats() -> dict:
+    """Calls, mean prompt tokens and mean seconds of first-attempt vs repair generation."""
+    counters = metrics.get_counters()
+    stats = {}
+    for mode in ("first", "repair"):
+        calls = counters.get(f"sql_generation_{mode}_calls", 0)
+        stats[f"{mode}_calls"] = calls
+        stats[f"{mode}_prompt_tokens_avg"] = counters.get(f"sql_generation_{mode}_prompt_tokens", 0) / calls if calls else 0.0
+        stats[f"{mode}_seconds_avg"] = counters.get(f"sql_generation_{mode}_seconds", 0) / calls if calls else 0.0
+    return stats
+
+
+tracing.register_collector("sql_generation", generation_stats)
+tracing.register_collector("validator", lambda: {"fast_path_hit_rate": validator_fast_path_hit_rate()})
+tracing.register_collector("db_pool", lambda: db_pool.stats() if db_pool is not None else {})
+tracing.register_collector("question_cache", lambda: get_question_cache().stats())
+tracing.register_collector("few_shot", few_shot_stats)
+tracing.register_collector(
+    "entity_index", lambda: _entity_index.index.stats() if _entity_index is not None and _entity_index.index else {}
 )
+tracing.register_collector("result_store", lambda: _result_store.stats() if _result_store is not None else {})
+tracing.register_collector("result_cache", lambda: _result_cache.stats() if _result_cache is not None else {})
+tracing.register_collector("checkpoints", lambda: _checkpoints.stats() if _checkpoints is not None else {})
+tracing.register_collector("llm_streaming", streaming_stats)
+tracing.register_collector("llm_cache", lambda: llm.cache.stats() if isinstance(llm, CachedLLM) else {})
 
-app = workflow.compile()
 
+def run_cached_sql(graph_input: dict, sql: str) -> dict | None:
+    """
+    Runs previously validated SQL through the executor only. Returns None
+    (and drops the cache entry) if the query no longer executes cleanly.
+    """
+    state = GraphState(**{k: v for k, v in graph_input.items() if k in GRAPH_STATE_FIELDS}, sql_query=sql)
+    update = sql_executor_node(state)
+    final_state = materialize_result({**state_dict(state), **update, "valid": True, "issues": []})
+    result = final_state["sql_result"]
+    if update.get("precheck_failed") or (result and isinstance(result[0], dict) and "error" in result[0]):
+        get_question_cache().invalidate(graph_input["question"])
+        return None
+    return final_state
 
 
 # ============================================================
 # 5. RUN APP
 # ============================================================
-def run_agentic_app(question: str):
-    print("\nRunning Agentic SQL Workflow...\n")
-
+def prepare_run(question: str, speculative_candidates: int = 1,
+                time_budget_s: float = 0.0) -> dict:
+    """
+    Builds the graph input: the question and the metadata of its relevant
+    tables. speculative_candidates > 1 races that many SQL candidates on
+    the first attempt, within time_budget_s seconds (0 = no budget).
+    """
     # ----------------------------------------------------------
-    # Load full table descriptions
+    # Full table descriptions, parsed once per process
     # ----------------------------------------------------------
-    raw_metadata = get_table_metadata()
-    table_desc = json.loads(raw_metadata) if isinstance(raw_metadata, str) else raw_metadata
+    load_environment()
+    registry = get_registry()
+    get_question_cache().set_schema_hash(registry.content_hash)
 
     # ----------------------------------------------------------
-    # Build combined metadata for all tables
+    # Mentions of stored values (names, cities, ids), so the SQL can
+    # filter with = / IN and retrieval keeps the tables they live in
+    # (ENTITY_INDEX=off disables)
     # ----------------------------------------------------------
-    all_table_metadata = []
-
-    for tbl, meta in table_desc.items():
-        all_table_metadata.append({
-            "table_name": tbl,
-            "table_description": meta.get("description", ""),
-            "columns": meta.get("columns", []),     # columns already included
-            "relationships": meta.get("relationships", {}),
-            "examples": meta.get("examples", []),
-            "usuage": meta.get("usuage", [])
+    mentions = []
+    entities = get_entity_index()
+    if entities is not None:
+        min_score = float(os.getenv("ENTITY_MIN_SCORE", str(DEFAULT_ENTITY_MIN_SCORE)))
+        mentions = entities.resolve(question, min_score)
 
-        })
+    # ----------------------------------------------------------
+    # Keep only the tables relevant to the question (falls back to all
+    # tables when retrieval is not confident or misses question terms)
+    # ----------------------------------------------------------
+    index = registry.derived("schema_index", lambda r: SchemaIndex(r.tables))
+    relevant_metadata = index.retrieve(question, mentions=mentions)
+    logger.info("Tables selected: %s", [m["table_name"] for m in relevant_metadata])
+    selected = {m["table_name"] for m in relevant_metadata}
+    resolved = [r for r in mentions if r["table"] in selected]
+    if entities is not None:
+        logger.info("Resolved values: %s", [(r["mention"], r["value"]) for r in resolved])
 
     # ----------------------------------------------------------
-    # RUN SQL AGENT
+    # Similar questions the validator accepted before (FEW_SHOT_K=0 disables)
     # ----------------------------------------------------------
-    final_state = app.invoke({"question": question,
-        "full_metadata": all_table_metadata
-    })
+    examples = []
+    top_k = int(os.getenv("FEW_SHOT_K", "3"))
+    if top_k > 0:
+        store = get_example_store()
+        store.set_schema_hash(registry.content_hash)
+        examples = store.search(question, top_k, float(os.getenv("FEW_SHOT_MIN_SCORE", "0.2")))
+        logger.info("Few-shot examples: %s", [e["question"] for e in examples])
+
+    return {
+        "run_id": uuid.uuid4().hex,
+        "question": question,
+        "schema_hash": registry.content_hash,
+        "tables": [m["table_name"] for m in relevant_metadata],
+        "few_shot_examples": examples,
+        "resolved_values": resolved,
+        "speculative_candidates": speculative_candidates,
+        "speculative_budget_s": time_budget_s,
+    }
+
+
+def lookup_cached_answer(graph_input: dict) -> dict | None:
+    """Final state for a question whose validated SQL is cached, else None."""
+    question = graph_input["question"]
+    cached_sql = get_question_cache().get(question)
+    if not cached_sql:
+        return None
+    logger.info("Question cache hit, skipping SQL generation.")
+    return run_cached_sql(graph_input, cached_sql)
+
+
+def record_answer(final_state: dict):
+    """
+    Caches the SQL of a run the validator accepted and adds it to the
+    few-shot store; counts the run's attempts by whether examples were used
+    and marks its checkpoints finished.
+    """
+    if _checkpoints is not None and final_state.get("run_id"):
+        _checkpoints.finish(final_state["run_id"])
+    # Arms are retrieval enabled vs FEW_SHOT_K=0, not "examples found":
+    # questions with similar stored examples are the easier ones.
+    enabled = int(os.getenv("FEW_SHOT_K", "3")) > 0
+    arm = "enabled" if enabled else "disabled"
+    metrics.increment(f"few_shot_{arm}_runs")
+    metrics.increment(f"few_shot_{arm}_attempts", final_state.get("attempts", 0))
+    if final_state.get("few_shot_examples"):
+        metrics.increment("few_shot_runs_with_examples")
+    if final_state["valid"]:
+        get_question_cache().put(final_state["question"], final_state["sql_query"])
+        if enabled:
+            get_example_store().add(final_state["question"], final_state["sql_query"])
+
+
+def run_agentic_app(question: str, speculative_candidates: int = 1, time_budget_s: float = 0.0,
+                    resume_run_id: str | None = None):
+    print("\nRunning Agentic SQL Workflow...\n")
+
+    cache = get_question_cache()
+    if resume_run_id:
+        # ----------------------------------------------------------
+        # RESUME AN INTERRUPTED RUN from its last checkpoint
+        # ----------------------------------------------------------
+        final_state = resume_run(resume_run_id)
+        record_answer(final_state)
+    else:
+        graph_input = prepare_run(question, speculative_candidates, time_budget_s)
+
+        # ----------------------------------------------------------
+        # RUN SQL AGENT (skipped when a validated SQL is cached)
+        # ----------------------------------------------------------
+        final_state = lookup_cached_answer(graph_input)
+        if final_state is None:
+            try:
+                final_state = invoke_graph(graph_input)
+            except Exception:
+                if get_checkpoint_store() is not None:
+                    logger.error("Run %s failed; resume it with RESUME_RUN_ID=%s",
+                                 graph_input["run_id"], graph_input["run_id"])
+                raise
+            record_answer(final_state)
+
+    logger.info("Question cache: %s", cache.stats())
+    if isinstance(llm, CachedLLM):
+        logger.info("LLM response cache: %s", llm.cache.stats())
+    counters = metrics.get_counters()
+    logger.info("LLM validator calls saved by static checks: %d",
+                int(counters.get("llm_validator_calls_saved", 0)))
+    logger.info("Validator fast-path hit rate: %.0f%%", 100 * validator_fast_path_hit_rate())
+    logger.info("SQL generation, first attempt vs repair: %s", generation_stats())
+    logger.info("Few-shot examples: %s", few_shot_stats())
+    logger.info("LLM streaming: %s", streaming_stats())
+    if _entity_index is not None and _entity_index.index is not None:
+        logger.info("Entity index: %s", _entity_index.index.stats())
 
     print("\n==============================")
     print(" GENERATED SQL QUERY")
     print("==============================")
-    sql=final_state["sql_query"]
-    
+    print(final_state["sql_query"])
+
     print("\n==============================")
     print(" SQL EXECUTION RESULT")
     print("==============================")
@@ -412,6 +1497,9 @@ def run_agentic_app(question: str):
     print("==============================")
     print("Valid:", final_state["valid"])
     print("Issues:", final_state["issues"])
+    if final_state.get("winning_candidate") is not None:
+        print(f"Winning candidate: {final_state['winning_candidate']} "
+              f"(saved {final_state['speculative_saved_s']:.2f}s)")
 
     print("\nDone.\n")
 
@@ -423,4 +1511,14 @@ def run_agentic_app(question: str):
 
 
 if __name__ == "__main__":
-    run_agentic_app("create an alert if CH-001 exceeds the price 20 dollar ")
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    load_environment()
+    # A one-off question has no warm-up phase; wait for the value index.
+    warm_entity_index(wait_s=None)
+    run_agentic_app(
+        "create an alert if CH-001 exceeds the price 20 dollar ",
+        speculative_candidates=int(os.getenv("SPECULATIVE_CANDIDATES", "1")),
+        time_budget_s=float(os.getenv("SPECULATIVE_BUDGET_S", "0")),
+        resume_run_id=os.getenv("RESUME_RUN_ID") or None,
+    )